@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Compara el motor NumPy del benchmark con el bucle de diccionarios.
+
+Genera diagnósticos sintéticos (69 preguntas, ~10% incompletos) y mide, para
+10k y 100k diagnósticos:
+
+    dict loop      promedio por dimensión de cada diagnóstico y agregación en
+                   Python (el bucle que hacía database_pg antes de src.scoring)
+    numpy build    construcción de la matriz densa desde las mismas filas
+    numpy stats    estadísticas por dimensión sobre la matriz ya construida
+
+No necesita base de datos. Uso, desde la raíz del repositorio:
+
+    python -m benchmarks.numpy_engine [tamaño ...]
+"""
+import random
+import sys
+import time
+from collections import defaultdict
+
+from src.benchmark_numpy import ResponseMatrix
+from src.question_catalog import DIMENSION_MAPPING, QUESTION_IDS
+
+DEFAULT_SIZES = (10_000, 100_000)
+INDUSTRIES = ['retail', 'banca', 'servicios', 'salud', 'tecnologia', None]
+COMPANY_SIZES = ['startup', 'pyme', 'grande', None]
+
+
+def generate_rows(count, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for diagnostic_id in range(1, count + 1):
+        if rng.random() < 0.1:
+            questions = rng.sample(QUESTION_IDS, rng.randint(1, len(QUESTION_IDS)))
+        else:
+            questions = QUESTION_IDS
+        responses = {question_id: rng.randint(1, 5) for question_id in questions}
+        score = sum(responses.values()) / len(responses)
+        rows.append((diagnostic_id, responses, score,
+                     rng.choice(INDUSTRIES), rng.choice(COMPANY_SIZES)))
+    return rows
+
+
+def dict_loop_stats(rows):
+    """Bucle de diccionarios: mismo resultado que ResponseMatrix.dimension_stats"""
+    dimension_scores = defaultdict(list)
+    total = 0
+    for _, responses, _, _, _ in rows:
+        dimension_responses = defaultdict(list)
+        for key, value in responses.items():
+            dim_id = key.split('.')[0] if '.' in key else None
+            if dim_id and dim_id in DIMENSION_MAPPING:
+                dimension_responses[dim_id].append(value)
+        if dimension_responses:
+            total += 1
+        for dim_id, values in dimension_responses.items():
+            dimension_scores[DIMENSION_MAPPING[dim_id]].append(sum(values) / len(values))
+
+    dimensions = {}
+    for name, scores in dimension_scores.items():
+        dimensions[name] = {
+            'count': len(scores),
+            'average': sum(scores) / len(scores),
+            'minimum': min(scores),
+            'maximum': max(scores),
+            'sum': sum(scores),
+            'sum_squares': sum(s * s for s in scores)
+        }
+    return {'total_diagnostics': total, 'dimensions': dimensions}
+
+
+def best_of(func, repeat=3):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def check_same(expected, actual):
+    assert expected['total_diagnostics'] == actual['total_diagnostics']
+    assert set(expected['dimensions']) == set(actual['dimensions'])
+    for name, dim in expected['dimensions'].items():
+        for field, value in dim.items():
+            assert abs(value - actual['dimensions'][name][field]) <= 1e-6 * max(1.0, abs(value)), \
+                (name, field, value, actual['dimensions'][name][field])
+
+
+def main(sizes):
+    print(f"{'diagnósticos':>12} {'dict loop':>10} {'np build':>10} {'np stats':>10} "
+          f"{'speedup':>8} {'speedup*':>9}")
+    for size in sizes:
+        rows = generate_rows(size)
+        loop_time, expected = best_of(lambda: dict_loop_stats(rows))
+        build_time, matrix = best_of(lambda: ResponseMatrix.from_rows(rows))
+
+        def stats():
+            matrix._dimension_scores = None
+            return matrix.dimension_stats()
+        stats_time, actual = best_of(stats)
+        check_same(expected, actual)
+
+        print(f"{size:>12,} {loop_time:>9.3f}s {build_time:>9.3f}s {stats_time:>9.4f}s "
+              f"{loop_time / (build_time + stats_time):>7.1f}x {loop_time / stats_time:>8.0f}x")
+    print("speedup = dict loop / (build + stats); speedup* = dict loop / stats (matriz ya cargada)")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compara el formato binario de response_codec con el JSON de las respuestas.
+
+Con los mismos diagnósticos sintéticos que benchmarks.numpy_engine mide:
+
+    tamaño         bytes por diagnóstico en JSON (texto de la columna
+                   responses) y empaquetado (responses_packed)
+    decode         json.loads de cada fila frente a decode_responses
+    puntuar        json.loads + promedios por dimensión frente a packed_scores
+    matriz         ResponseMatrix.from_rows desde JSON frente a desde bytes
+
+No necesita base de datos. Uso, desde la raíz del repositorio:
+
+    python -m benchmarks.response_codec [tamaño ...]
+"""
+import json
+import sys
+from collections import defaultdict
+
+from src.benchmark_numpy import ResponseMatrix
+from src.question_catalog import DIMENSION_MAPPING
+from src.response_codec import decode_responses, pack_responses, packed_scores
+
+from benchmarks.numpy_engine import best_of, generate_rows
+
+DEFAULT_SIZES = (10_000, 100_000)
+
+
+def json_scores(document):
+    """Lo que hace hoy la lectura para puntuar: parsear el JSON y agrupar por dimensión"""
+    responses = json.loads(document)
+    dimension_responses = defaultdict(list)
+    for key, value in responses.items():
+        dimension_responses[key.split('.')[0]].append(value)
+    averages = {
+        DIMENSION_MAPPING[dim_id]: sum(values) / len(values)
+        for dim_id, values in dimension_responses.items()
+    }
+    return sum(responses.values()) / len(responses), averages, len(responses)
+
+
+def main(sizes):
+    print(f"{'diagnósticos':>12} {'json B/fila':>11} {'packed B/fila':>13} "
+          f"{'decode json':>11} {'decode bin':>10} {'score json':>10} {'score bin':>9} "
+          f"{'matriz json':>11} {'matriz bin':>10}")
+    for size in sizes:
+        rows = generate_rows(size)
+        documents = [json.dumps(responses) for _, responses, _, _, _ in rows]
+        packed = [pack_responses(responses) for _, responses, _, _, _ in rows]
+        assert all(p is not None for p in packed)
+        json_size = sum(len(d.encode('utf-8')) for d in documents) / size
+        packed_size = sum(len(p) for p in packed) / size
+
+        decode_json, decoded = best_of(lambda: [json.loads(d) for d in documents])
+        decode_bin, unpacked = best_of(lambda: [decode_responses(p) for p in packed])
+        assert decoded == unpacked
+
+        score_json, expected = best_of(lambda: [json_scores(d) for d in documents])
+        score_bin, actual = best_of(lambda: [packed_scores(p) for p in packed])
+        for (score, averages, answered), (p_score, p_averages, p_answered) in zip(expected, actual):
+            assert answered == p_answered and abs(score - p_score) < 1e-9
+            assert all(abs(averages[name] - p_averages[name]) < 1e-9 for name in averages)
+
+        json_rows = [(r[0], d, r[2], r[3], r[4]) for r, d in zip(rows, documents)]
+        packed_rows = [(r[0], p, r[2], r[3], r[4]) for r, p in zip(rows, packed)]
+        matrix_json, from_json = best_of(lambda: ResponseMatrix.from_rows(json_rows))
+        matrix_bin, from_packed = best_of(lambda: ResponseMatrix.from_rows(packed_rows))
+        assert from_json.values.tobytes() == from_packed.values.tobytes()
+
+        print(f"{size:>12,} {json_size:>11.0f} {packed_size:>13.0f} "
+              f"{decode_json:>10.3f}s {decode_bin:>9.3f}s {score_json:>9.3f}s {score_bin:>8.3f}s "
+              f"{matrix_json:>10.3f}s {matrix_bin:>9.3f}s")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Coste de puntuar un guardado con src.scoring frente al cálculo anterior.
+
+    anterior       media con sum/len, nivel con la cadena de if de la ruta y
+                   promedios por dimensión con split('.') por clave (dos
+                   pasadas: la ruta y database_pg)
+    score          scoring.score_responses (una pasada, índice del catálogo)
+    batch dict     scoring.score_batch sobre diccionarios, por diagnóstico
+    batch packed   scoring.score_batch sobre bytes de responses_packed
+
+Mide un cuestionario completo (69 respuestas) y uno a medias (20). No necesita
+base de datos. Uso, desde la raíz del repositorio:
+
+    python -m benchmarks.scoring [repeticiones]
+"""
+import random
+import sys
+import timeit
+from collections import defaultdict
+
+from src.question_catalog import DIMENSION_MAPPING, QUESTION_IDS
+from src.response_codec import pack_responses
+from src.scoring import score_batch, score_responses
+
+DEFAULT_NUMBER = 20_000
+BATCH_SIZE = 1_000
+
+
+def previous_scoring(responses):
+    """Lo que hacían save-responses y database_pg antes de src.scoring"""
+    avg_score = sum(responses.values()) / len(responses)
+    if avg_score >= 4.5:
+        level = 'optimizado'
+    elif avg_score >= 3.5:
+        level = 'avanzado'
+    elif avg_score >= 2.5:
+        level = 'intermedio'
+    elif avg_score >= 1.5:
+        level = 'basico'
+    else:
+        level = 'inicial'
+
+    dimension_responses = defaultdict(list)
+    for key, value in responses.items():
+        dim_id = key.split('.')[0] if isinstance(key, str) and '.' in key else None
+        if dim_id and dim_id in DIMENSION_MAPPING:
+            dimension_responses[dim_id].append(value)
+    averages = {
+        DIMENSION_MAPPING[dim_id]: sum(values) / len(values)
+        for dim_id, values in dimension_responses.items()
+    }
+    return avg_score, level, len(responses), averages
+
+
+def check_same(responses):
+    score, level, answered_count, averages = previous_scoring(responses)
+    scored = score_responses(responses)
+    assert (score, level, answered_count) == (scored.score, scored.level, scored.answered_count)
+    assert averages.keys() == scored.dimension_scores.keys()
+    assert all(abs(averages[name] - scored.dimension_scores[name]) < 1e-12 for name in averages)
+
+
+def per_call_us(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e6
+
+
+def main(number):
+    rng = random.Random(42)
+    print(f"{'respuestas':>10} {'anterior':>10} {'score':>10} {'batch dict':>11} {'batch packed':>13}")
+    for answered in (len(QUESTION_IDS), 20):
+        documents = [
+            {question_id: rng.randint(1, 5) for question_id in rng.sample(QUESTION_IDS, answered)}
+            for _ in range(BATCH_SIZE)
+        ]
+        for responses in documents[:50]:
+            check_same(responses)
+        packed = [pack_responses(responses) for responses in documents]
+        responses = documents[0]
+
+        previous = per_call_us(lambda: previous_scoring(responses), number)
+        current = per_call_us(lambda: score_responses(responses), number)
+        batch_number = max(1, number // BATCH_SIZE)
+        batch_dict = per_call_us(lambda: score_batch(documents), batch_number) / BATCH_SIZE
+        batch_packed = per_call_us(lambda: score_batch(packed), batch_number) / BATCH_SIZE
+
+        print(f"{answered:>10} {previous:>8.1f}us {current:>8.1f}us {batch_dict:>9.1f}us "
+              f"{batch_packed:>11.1f}us")
+    print("tiempos por diagnóstico")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUMBER)
@@ -0,0 +1,224 @@
+"""
+Agregados incrementales del benchmark.
+
+Por cada dimensión se guarda la suma, la suma de cuadrados y el número de
+diagnósticos que la contestaron (usando el promedio del diagnóstico en esa
+dimensión). Cada guardado anota solo la diferencia entre las respuestas
+anteriores y las nuevas del usuario en benchmark_deltas, dentro de su
+transacción; es un INSERT, así que los autoguardados concurrentes no esperan
+unos a otros por las mismas filas de agregados. La publicación del benchmark
+(el trabajo benchmark_publish, que se encola al completar un cuestionario o
+al borrar) suma los deltas pendientes a benchmark_aggregates y
+benchmark_histograms y publica, en O(dimensiones + deltas pendientes) sin
+importar cuántos diagnósticos existan. La reconstrucción completa queda como
+reparación para el admin.
+"""
+from psycopg2.extras import execute_values
+
+from .db_pool import get_connection
+
+# Advisory lock que serializa a quienes escriben benchmark_stats (publicación y reconstrucción)
+BENCHMARK_PUBLISH_LOCK_CLASS = 7303
+
+
+def create_benchmark_tables(cursor):
+    """Crear las tablas del benchmark si no existen"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS benchmark_stats (
+            id SERIAL PRIMARY KEY,
+            dimension VARCHAR(50) NOT NULL,
+            avg_score FLOAT,
+            total_diagnostics INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS benchmark_aggregates (
+            dimension VARCHAR(50) PRIMARY KEY,
+            sum_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_squares DOUBLE PRECISION NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Versión del benchmark publicado: cambia en cada publicación o reconstrucción
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS benchmark_meta (
+            id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('INSERT INTO benchmark_meta (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING')
+
+
+def dimension_delta(old_dimensions, new_dimensions):
+    """Diferencia (suma, suma de cuadrados, conteo) por dimensión entre dos diagnósticos"""
+    rows = []
+    for dim_name in set(old_dimensions) | set(new_dimensions):
+        old = old_dimensions.get(dim_name)
+        new = new_dimensions.get(dim_name)
+        if old == new:
+            continue
+        delta_sum = (new or 0.0) - (old or 0.0)
+        delta_squares = (new or 0.0) ** 2 - (old or 0.0) ** 2
+        delta_count = (new is not None) - (old is not None)
+        rows.append((dim_name, delta_sum, delta_squares, delta_count))
+    return rows
+
+
+def create_benchmark_delta_table(cursor):
+    """Migración: deltas de los guardados pendientes de sumar a los agregados.
+
+    bucket NULL es un delta de benchmark_aggregates; si no, count es el
+    delta del bucket en benchmark_histograms.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS benchmark_deltas (
+            id BIGSERIAL PRIMARY KEY,
+            dimension VARCHAR(50) NOT NULL,
+            bucket SMALLINT,
+            sum_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+            sum_squares DOUBLE PRECISION NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def aggregate_delta_rows(changes):
+    """Filas (dimension, suma, suma_cuadrados, conteo) de los cambios [(old_dimensions, new_dimensions), ...]"""
+    totals = {}
+    for old_dimensions, new_dimensions in changes:
+        for dim_name, delta_sum, delta_squares, delta_count in dimension_delta(old_dimensions, new_dimensions):
+            total = totals.setdefault(dim_name, [0.0, 0.0, 0])
+            total[0] += delta_sum
+            total[1] += delta_squares
+            total[2] += delta_count
+    return sorted((dim_name, *total) for dim_name, total in totals.items())
+
+
+def queue_benchmark_deltas(cursor, aggregate_rows, histogram_rows):
+    """Anotar los deltas de un guardado (dentro de la transacción del llamador).
+
+    aggregate_rows son filas de aggregate_delta_rows e histogram_rows filas
+    (dimension, bucket, delta) de histogram_delta_rows.
+    """
+    rows = [(dim_name, None, delta_sum, delta_squares, delta_count)
+            for dim_name, delta_sum, delta_squares, delta_count in aggregate_rows]
+    rows += [(dim_name, bucket, 0.0, 0.0, delta) for dim_name, bucket, delta in histogram_rows]
+    if not rows:
+        return
+    execute_values(cursor, '''
+        INSERT INTO benchmark_deltas (dimension, bucket, sum_score, sum_squares, count)
+        VALUES %s
+    ''', rows, page_size=len(rows))
+
+
+# Un DELETE ... RETURNING toma los deltas confirmados; dos publicaciones
+# simultáneas no suman dos veces la misma fila (la segunda ya no la encuentra)
+FOLD_BENCHMARK_DELTAS_SQL = '''
+    WITH folded AS (
+        DELETE FROM benchmark_deltas
+        RETURNING dimension, bucket, sum_score, sum_squares, count
+    ), aggregates AS (
+        INSERT INTO benchmark_aggregates (dimension, sum_score, sum_squares, count)
+        SELECT dimension, SUM(sum_score), SUM(sum_squares), SUM(count)
+        FROM folded
+        WHERE bucket IS NULL
+        GROUP BY dimension
+        ON CONFLICT (dimension) DO UPDATE
+        SET sum_score = benchmark_aggregates.sum_score + EXCLUDED.sum_score,
+            sum_squares = benchmark_aggregates.sum_squares + EXCLUDED.sum_squares,
+            count = benchmark_aggregates.count + EXCLUDED.count,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    INSERT INTO benchmark_histograms (dimension, bucket, count)
+    SELECT dimension, bucket, SUM(count)
+    FROM folded
+    WHERE bucket IS NOT NULL
+    GROUP BY dimension, bucket
+    HAVING SUM(count) <> 0
+    ON CONFLICT (dimension, bucket) DO UPDATE
+    SET count = benchmark_histograms.count + EXCLUDED.count
+'''
+
+
+def fold_benchmark_deltas(cursor):
+    """Sumar los deltas pendientes a agregados e histogramas (dentro de la transacción del llamador)"""
+    cursor.execute(FOLD_BENCHMARK_DELTAS_SQL)
+
+
+def replace_benchmark_aggregates(cursor, totals):
+    """Sustituir todos los agregados; totals = {dimension: (suma, suma_cuadrados, conteo)}"""
+    cursor.execute('DELETE FROM benchmark_aggregates')
+    if totals:
+        execute_values(cursor, '''
+            INSERT INTO benchmark_aggregates (dimension, sum_score, sum_squares, count)
+            VALUES %s
+        ''', [(dim, s, sq, n) for dim, (s, sq, n) in sorted(totals.items())])
+
+
+def lock_benchmark_aggregates(cursor):
+    """Bloquear agregados, histogramas y deltas mientras se reconstruyen.
+
+    Los guardados concurrentes esperan a que termine la reconstrucción para
+    anotar su delta. Los deltas pendientes se descartan: sus guardados ya
+    están confirmados en diagnostics, que es lo que lee la reconstrucción.
+    """
+    cursor.execute('LOCK TABLE benchmark_aggregates, benchmark_histograms, benchmark_deltas IN EXCLUSIVE MODE')
+    cursor.execute('DELETE FROM benchmark_deltas')
+
+
+def publish_benchmark_stats_with_cursor(cursor):
+    """Sumar los deltas pendientes, copiar los agregados a benchmark_stats (la
+    tabla que leen los resultados) e incrementar la versión del benchmark"""
+    # Dos publicaciones simultáneas podrían insertar dos veces la misma dimensión
+    cursor.execute('SELECT pg_advisory_xact_lock(%s, 0)', (BENCHMARK_PUBLISH_LOCK_CLASS,))
+    fold_benchmark_deltas(cursor)
+    cursor.execute('''
+        UPDATE benchmark_stats b
+        SET avg_score = a.sum_score / a.count,
+            total_diagnostics = a.count,
+            updated_at = CURRENT_TIMESTAMP
+        FROM benchmark_aggregates a
+        WHERE b.dimension = a.dimension AND a.count > 0
+    ''')
+    cursor.execute('''
+        INSERT INTO benchmark_stats (dimension, avg_score, total_diagnostics, updated_at)
+        SELECT a.dimension, a.sum_score / a.count, a.count, CURRENT_TIMESTAMP
+        FROM benchmark_aggregates a
+        WHERE a.count > 0
+          AND NOT EXISTS (SELECT 1 FROM benchmark_stats b WHERE b.dimension = a.dimension)
+    ''')
+    cursor.execute('''
+        DELETE FROM benchmark_stats b
+        WHERE NOT EXISTS (
+            SELECT 1 FROM benchmark_aggregates a
+            WHERE a.dimension = b.dimension AND a.count > 0
+        )
+    ''')
+    cursor.execute('''
+        UPDATE benchmark_meta
+        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1
+    ''')
+
+
+def publish_benchmark_stats():
+    """Sumar los deltas pendientes y publicar el benchmark a partir de los agregados"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        publish_benchmark_stats_with_cursor(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return {'success': True, 'message': 'Benchmark publicado desde agregados'}
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        print(f"Error publicando benchmark: {e}")
+        return {'success': False, 'message': f'Error: {str(e)}'}
+
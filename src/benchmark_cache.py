@@ -0,0 +1,69 @@
+"""
+Caché por worker del benchmark publicado.
+
+benchmark_meta.version se incrementa cada vez que se publica o reconstruye el
+benchmark. Cada worker guarda el JSON ya serializado de la última versión que
+leyó, así que una visita repetida a la página de resultados cuesta una consulta
+de versión (y un 304 si el navegador ya tiene esa versión) en lugar de leer las
+estadísticas y volver a serializarlas.
+"""
+import json
+import threading
+
+from .database_pg import read_benchmark_stats
+from .db_pool import get_connection
+
+_lock = threading.Lock()
+_cached_version = None
+_cached_body = None
+
+
+def get_benchmark_version():
+    """Versión actual del benchmark publicado"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT version FROM benchmark_meta WHERE id = 1')
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def benchmark_etag(version):
+    return f'benchmark-v{version}'
+
+
+def benchmark_payload(stats):
+    """Respuesta de /api/user/benchmark-stats a partir de las estadísticas"""
+    if not stats or stats.get('total_diagnostics', 0) == 0:
+        # Si no hay datos, retornar N/A
+        return {
+            'dimensiones': [],
+            'total_diagnostics': 0
+        }
+    return stats
+
+
+def get_benchmark_body(version):
+    """JSON serializado del benchmark para `version`, leído de la BD solo si no está en caché"""
+    global _cached_version, _cached_body
+
+    with _lock:
+        if _cached_version == version and _cached_body is not None:
+            return _cached_body
+
+    conn = get_connection()
+    try:
+        stats = read_benchmark_stats(conn)
+    finally:
+        conn.close()
+
+    body = json.dumps(benchmark_payload(stats), sort_keys=True, separators=(',', ':'))
+    with _lock:
+        _cached_version = version
+        _cached_body = body
+    return body
+
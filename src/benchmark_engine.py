@@ -0,0 +1,85 @@
+"""
+Motor de agregación del benchmark ejecutado dentro de PostgreSQL.
+
+Las puntuaciones por dimensión de cada diagnóstico se guardan al escribirlo
+en columnas de diagnostics (estrategia_cx … governance_cx); la agregación las
+lee directamente. Solo las filas anteriores a esas columnas que aún no se han
+rellenado (answered_count IS NULL) se calculan desde jsonb_each_text(responses)
+agrupando por split_part(key, '.', 1). Por la red solo viajan unas pocas filas
+por dimensión.
+"""
+
+from .question_catalog import DIMENSION_MAPPING
+
+# Puntuación de cada diagnóstico por dimensión desde las columnas guardadas
+STORED_PER_DIAGNOSTIC_SQL = f'''
+    SELECT d.id, v.dim_id, v.score
+    FROM diagnostics d
+    CROSS JOIN LATERAL (VALUES {', '.join(f"('{dim_id}', d.{name})" for dim_id, name in DIMENSION_MAPPING.items())}
+    ) AS v(dim_id, score)
+    WHERE d.answered_count IS NOT NULL
+      AND v.score IS NOT NULL
+'''
+
+# Lo mismo desde diagnostics.responses, para las filas aún sin columnas rellenadas
+PENDING_RESPONSES_PER_DIAGNOSTIC_SQL = r'''
+    SELECT d.id, split_part(r.key, '.', 1) AS dim_id, AVG(r.value::float8) AS score
+    FROM diagnostics d
+    CROSS JOIN LATERAL jsonb_each_text(d.responses) AS r
+    WHERE d.answered_count IS NULL
+      AND d.responses IS NOT NULL
+      AND jsonb_typeof(d.responses) = 'object'
+      AND position('.' in r.key) > 0
+      AND r.value ~ '^[0-9]+(\.[0-9]+)?$'
+    GROUP BY d.id, split_part(r.key, '.', 1)
+'''
+
+PER_DIAGNOSTIC_SQL = STORED_PER_DIAGNOSTIC_SQL + 'UNION ALL' + PENDING_RESPONSES_PER_DIAGNOSTIC_SQL
+
+def dimension_stats_sql(per_diagnostic_sql=PER_DIAGNOSTIC_SQL):
+    """Consulta única: conteo, promedio, mínimo, máximo, suma y suma de cuadrados por dimensión.
+
+    Cada fila es (dim_id, count, average, minimum, maximum, sum, sum_squares, total),
+    donde total es el número de diagnósticos con alguna puntuación.
+    """
+    return f'''
+        WITH per_diagnostic AS ({per_diagnostic_sql})
+        SELECT dim_id,
+               COUNT(*) AS count,
+               AVG(score) AS average,
+               MIN(score) AS minimum,
+               MAX(score) AS maximum,
+               SUM(score) AS sum,
+               SUM(score * score) AS sum_squares,
+               (SELECT COUNT(DISTINCT id) FROM per_diagnostic) AS total
+        FROM per_diagnostic
+        GROUP BY dim_id
+        ORDER BY dim_id
+    '''
+
+
+def rows_to_dimension_stats(rows):
+    """Convertir las filas de dimension_stats_sql en un diccionario por dimensión.
+
+    Los ids numéricos se traducen a nombres y los ids desconocidos se descartan.
+    """
+    dimensions = {}
+    total = 0
+    for dim_id, count, average, minimum, maximum, dim_sum, sum_squares, total in rows:
+        if dim_id not in DIMENSION_MAPPING:
+            continue
+        dimensions[DIMENSION_MAPPING[dim_id]] = {
+            'count': count,
+            'average': float(average),
+            'minimum': float(minimum),
+            'maximum': float(maximum),
+            'sum': float(dim_sum),
+            'sum_squares': float(sum_squares)
+        }
+    return {'total_diagnostics': total, 'dimensions': dimensions}
+
+
+def fetch_dimension_stats(cursor):
+    """Ejecutar la agregación sobre diagnostics con un cursor psycopg2 de tuplas"""
+    cursor.execute(dimension_stats_sql())
+    return rows_to_dimension_stats(cursor.fetchall())
@@ -0,0 +1,178 @@
+"""
+Histogramas de puntuaciones del benchmark.
+
+Las respuestas van de 1 a 5, así que cualquier puntuación (promedio de un
+diagnóstico en una dimensión, o la puntuación general) cae en uno de 401
+buckets de 0.01 entre 1.00 y 5.00. Por cada dimensión y para la puntuación
+general ('overall') se guarda el número de diagnósticos en cada bucket. El
+guardado de un diagnóstico anota el cambio de bucket en benchmark_deltas y
+la publicación del benchmark lo suma (ver benchmark_aggregates); mínimo,
+máximo, percentiles y rango percentil se responden en O(buckets) sin leer la
+tabla diagnostics. El benchmark publicado incluye los BENCHMARK_PERCENTILES
+y /api/user/my-diagnostic el rango percentil de la puntuación del usuario.
+
+Los resultados van cuantizados a 0.01: mínimo, máximo y percentiles son el
+valor del bucket (la puntuación redondeada a 0.01) y el rango percentil
+cuenta como iguales las puntuaciones del mismo bucket.
+"""
+from psycopg2.extras import execute_values
+
+from .benchmark_engine import PER_DIAGNOSTIC_SQL
+from .question_catalog import DIMENSION_MAPPING
+from .response_codec import HAS_RESPONSES_SQL
+
+OVERALL = 'overall'
+MIN_SCORE = 1.0
+MAX_SCORE = 5.0
+BUCKET_WIDTH = 0.01
+NUM_BUCKETS = int(round((MAX_SCORE - MIN_SCORE) / BUCKET_WIDTH)) + 1
+
+# Percentiles publicados con el benchmark
+BENCHMARK_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def score_bucket(score):
+    """Índice de bucket de una puntuación (misma regla que bucket_sql)"""
+    bucket = int(round((score - MIN_SCORE) / BUCKET_WIDTH))
+    return min(max(bucket, 0), NUM_BUCKETS - 1)
+
+
+def bucket_score(bucket):
+    """Puntuación representada por un bucket"""
+    return round(MIN_SCORE + bucket * BUCKET_WIDTH, 2)
+
+
+def bucket_sql(expression):
+    """Expresión SQL equivalente a score_bucket() (ROUND de float8 redondea igual que round())"""
+    return (f'LEAST(GREATEST(ROUND(({expression} - {MIN_SCORE}) / {BUCKET_WIDTH}), 0), '
+            f'{NUM_BUCKETS - 1})::int')
+
+
+class ScoreHistogram:
+    """Conteo de diagnósticos por bucket de puntuación"""
+
+    def __init__(self, counts=None):
+        self.counts = [0] * NUM_BUCKETS
+        for bucket, count in (counts or {}).items():
+            self.counts[bucket] += count
+        self.total = sum(self.counts)
+
+    def minimum(self):
+        for bucket, count in enumerate(self.counts):
+            if count > 0:
+                return bucket_score(bucket)
+        return None
+
+    def maximum(self):
+        for bucket in range(NUM_BUCKETS - 1, -1, -1):
+            if self.counts[bucket] > 0:
+                return bucket_score(bucket)
+        return None
+
+    def percentile(self, p):
+        """Puntuación del percentil p (0-100), método del rango más cercano"""
+        if not self.total:
+            return None
+        target = max(1, -(-p * self.total // 100))
+        cumulative = 0
+        for bucket, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bucket_score(bucket)
+        return self.maximum()
+
+    def percentiles(self, ps=BENCHMARK_PERCENTILES):
+        """{p: puntuación} para cada percentil de ps"""
+        return {p: self.percentile(p) for p in ps}
+
+    def percentile_rank(self, score):
+        """Porcentaje de diagnósticos en buckets por debajo del de score (puntuación menor
+        que score redondeada a 0.01)"""
+        if not self.total:
+            return None
+        below = sum(self.counts[:score_bucket(score)])
+        return round(below / self.total * 100, 1)
+
+
+def create_histogram_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS benchmark_histograms (
+            dimension VARCHAR(50) NOT NULL,
+            bucket SMALLINT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, bucket)
+        )
+    ''')
+
+
+def histogram_delta(old_scores, new_scores):
+    """Filas (dimension, bucket, delta) para pasar un diagnóstico de old_scores a new_scores"""
+    changes = {}
+    for scores, sign in ((old_scores, -1), (new_scores, 1)):
+        for dimension, score in scores.items():
+            if score is None:
+                continue
+            key = (dimension, score_bucket(score))
+            changes[key] = changes.get(key, 0) + sign
+    return sorted((dim, bucket, delta) for (dim, bucket), delta in changes.items() if delta)
+
+
+def histogram_delta_rows(changes):
+    """Filas (dimension, bucket, delta) de los cambios [(old_scores, new_scores), ...]"""
+    totals = {}
+    for old_scores, new_scores in changes:
+        for dimension, bucket, delta in histogram_delta(old_scores, new_scores):
+            totals[(dimension, bucket)] = totals.get((dimension, bucket), 0) + delta
+    return sorted((dim, bucket, delta) for (dim, bucket), delta in totals.items() if delta)
+
+
+def rebuild_histograms(cursor):
+    """Recalcular todos los histogramas desde diagnostics (reparación del admin)"""
+    cursor.execute(f'''
+        WITH per_diagnostic AS ({PER_DIAGNOSTIC_SQL})
+        SELECT dim_id, {bucket_sql('score')} AS bucket, COUNT(*)
+        FROM per_diagnostic
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT '{OVERALL}', {bucket_sql('score')} AS bucket, COUNT(*)
+        FROM diagnostics
+        WHERE {HAS_RESPONSES_SQL} AND score IS NOT NULL
+        GROUP BY 2
+    ''')
+    rows = []
+    for dim_id, bucket, count in cursor.fetchall():
+        if dim_id == OVERALL:
+            rows.append((OVERALL, bucket, count))
+        elif dim_id in DIMENSION_MAPPING:
+            rows.append((DIMENSION_MAPPING[dim_id], bucket, count))
+    replace_histograms(cursor, rows)
+
+
+def replace_histograms(cursor, rows):
+    """Sustituir todos los histogramas por las filas (dimension, bucket, count)"""
+    cursor.execute('DELETE FROM benchmark_histograms')
+    if rows:
+        execute_values(cursor, '''
+            INSERT INTO benchmark_histograms (dimension, bucket, count)
+            VALUES %s
+        ''', rows)
+
+
+def load_histograms(cursor, dimension=None):
+    """Todos los histogramas, o solo el de dimension: {dimension: ScoreHistogram} (cursor de tuplas)"""
+    if dimension is None:
+        cursor.execute('''
+            SELECT dimension, bucket, count
+            FROM benchmark_histograms
+            WHERE count > 0
+        ''')
+    else:
+        cursor.execute('''
+            SELECT dimension, bucket, count
+            FROM benchmark_histograms
+            WHERE dimension = %s AND count > 0
+        ''', (dimension,))
+    buckets = {}
+    for dimension, bucket, count in cursor.fetchall():
+        buckets.setdefault(dimension, {})[bucket] = count
+    return {dimension: ScoreHistogram(counts) for dimension, counts in buckets.items()}
@@ -0,0 +1,266 @@
+"""
+Motor vectorizado del benchmark sobre una matriz densa diagnósticos × preguntas.
+
+Todos los diagnósticos se cargan en una matriz float32 con una fila por
+diagnóstico y una columna por pregunta ('1.1.1' … las 69 del cuestionario), con
+NaN en las preguntas sin responder. Las columnas están ordenadas por dimensión,
+así que las puntuaciones por dimensión salen de un np.add.reduceat, y medias,
+desviaciones, cuantiles, agrupaciones por industria/tamaño y correlaciones se
+calculan sin recorrer los diagnósticos en Python.
+
+Las filas con responses_packed (response_codec) se cargan de golpe con
+np.frombuffer sin decodificar JSON; solo las que aún no lo tienen se leen
+desde el diccionario de respuestas.
+
+Pensado para análisis offline y reconstrucciones grandes. Con
+BENCHMARK_BACKEND=numpy, recalculate_benchmark_stats usa este motor en lugar de
+la agregación en PostgreSQL. Las claves que no son preguntas del cuestionario
+se ignoran.
+"""
+import json
+import warnings
+
+import numpy as np
+
+from .benchmark_histograms import OVERALL, MIN_SCORE, BUCKET_WIDTH, NUM_BUCKETS
+from .question_catalog import CATALOG, CURRENT_VERSION, QUESTION_IDS
+from .response_codec import HAS_RESPONSES_SQL, PACKED_SIZE, UNANSWERED, responses_json_sql
+
+DIMENSION_IDS = list(CATALOG.dimension_mapping)
+DIMENSION_NAMES = CATALOG.dimension_columns
+# Primera columna de cada dimensión
+DIMENSION_STARTS = np.array(CATALOG.dimension_starts)
+
+# Los bytes solo sirven si se guardaron con las posiciones del catálogo actual
+LOAD_SQL = f'''
+    SELECT d.id,
+           CASE WHEN d.catalog_version = {CURRENT_VERSION} THEN d.responses_packed END,
+           CASE WHEN d.responses_packed IS NULL OR d.catalog_version <> {CURRENT_VERSION}
+                THEN {responses_json_sql('d')} END AS responses,
+           d.score, u.industry, u.company_size
+    FROM diagnostics d
+    LEFT JOIN users u ON u.id = d.user_id
+    WHERE (d.responses_packed IS NOT NULL OR jsonb_typeof(d.responses) = 'object')
+    ORDER BY d.id
+'''
+
+NO_DATA_LABEL = 'sin_dato'
+
+
+def _to_float(value):
+    """Respuesta como número, o NaN si no es numérica"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _pairwise_corrcoef(x, present):
+    """Correlación de Pearson entre columnas usando las filas donde ambas tienen dato"""
+    mask = present.astype(np.float64)
+    filled = np.where(present, x, 0.0).astype(np.float64)
+    n = mask.T @ mask
+    sum_x = filled.T @ mask          # suma de x_i donde x_j también tiene dato
+    sum_y = sum_x.T
+    sum_xx = (filled * filled).T @ mask
+    sum_yy = sum_xx.T
+    sum_xy = filled.T @ filled
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x * sum_x / n
+        var_y = sum_yy - sum_y * sum_y / n
+        corr = cov / np.sqrt(var_x * var_y)
+    return np.clip(corr, -1.0, 1.0)
+
+
+class ResponseMatrix:
+    """Respuestas de todos los diagnósticos como matriz densa float32"""
+
+    def __init__(self, values, diagnostic_ids, scores=None, industries=None, company_sizes=None):
+        self.values = values
+        self.diagnostic_ids = np.asarray(diagnostic_ids, dtype=np.int64)
+        n = len(self.diagnostic_ids)
+        self.scores = (np.asarray(scores, dtype=np.float64) if scores is not None
+                       else np.full(n, np.nan))
+        self.industries = industries if industries is not None else [None] * n
+        self.company_sizes = company_sizes if company_sizes is not None else [None] * n
+        self._dimension_scores = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Construir desde filas (id, responses, score, industry, company_size).
+
+        responses es el diccionario de respuestas (o su JSON) o los bytes de
+        responses_packed.
+        """
+        rows = list(rows)
+        diagnostic_ids, scores, industries, company_sizes = [], [], [], []
+        packed_positions, packed = [], []
+        dict_positions, answers = [], []
+        nan = float('nan')
+
+        for position, (diagnostic_id, responses, score, industry, company_size) in enumerate(rows):
+            if isinstance(responses, (bytes, memoryview)):
+                packed_positions.append(position)
+                packed.append(responses)
+            else:
+                if isinstance(responses, str):
+                    responses = json.loads(responses)
+                get = responses.get
+                dict_positions.append(position)
+                answers.append([get(question_id, nan) for question_id in QUESTION_IDS])
+            diagnostic_ids.append(diagnostic_id)
+            scores.append(nan if score is None else score)
+            industries.append(industry)
+            company_sizes.append(company_size)
+
+        values = np.full((len(rows), len(QUESTION_IDS)), np.nan, dtype=np.float32)
+        if packed:
+            # Todas las filas binarias de una vez, sin pasar por Python
+            raw = np.frombuffer(b''.join(packed), dtype=np.uint8).reshape(len(packed), PACKED_SIZE)
+            values[packed_positions] = np.where(raw == UNANSWERED, np.nan, raw)
+        if answers:
+            try:
+                # Una sola conversión para todas las filas JSON
+                block = np.array(answers, dtype=np.float32)
+            except (TypeError, ValueError):
+                block = np.array([[_to_float(value) for value in row] for row in answers],
+                                 dtype=np.float32)
+            values[dict_positions] = block.reshape(len(answers), len(QUESTION_IDS))
+        return cls(values, diagnostic_ids, scores, industries, company_sizes)
+
+    @classmethod
+    def load(cls, cursor):
+        """Cargar todos los diagnósticos con un cursor psycopg2 de tuplas"""
+        cursor.execute(LOAD_SQL)
+        return cls.from_rows(
+            (diagnostic_id, packed if packed is not None else responses, score, industry, company_size)
+            for diagnostic_id, packed, responses, score, industry, company_size in cursor.fetchall()
+        )
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def dimension_scores(self):
+        """Matriz (diagnósticos × dimensiones) con el promedio de cada dimensión, NaN sin respuestas"""
+        if self._dimension_scores is None:
+            answered = ~np.isnan(self.values)
+            filled = np.where(answered, self.values, 0).astype(np.float64)
+            sums = np.add.reduceat(filled, DIMENSION_STARTS, axis=1)
+            counts = np.add.reduceat(answered.astype(np.int32), DIMENSION_STARTS, axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self._dimension_scores = sums / counts
+        return self._dimension_scores
+
+    def dimension_stats(self):
+        """Mismo formato que benchmark_engine.fetch_dimension_stats"""
+        scores = self.dimension_scores()
+        present = ~np.isnan(scores)
+        counts = present.sum(axis=0)
+        filled = np.where(present, scores, 0.0)
+        sums = filled.sum(axis=0)
+        sum_squares = (filled * filled).sum(axis=0)
+        minimums = np.where(present, scores, np.inf).min(axis=0)
+        maximums = np.where(present, scores, -np.inf).max(axis=0)
+
+        dimensions = {}
+        for j, name in enumerate(DIMENSION_NAMES):
+            if not counts[j]:
+                continue
+            dimensions[name] = {
+                'count': int(counts[j]),
+                'average': float(sums[j] / counts[j]),
+                'minimum': float(minimums[j]),
+                'maximum': float(maximums[j]),
+                'sum': float(sums[j]),
+                'sum_squares': float(sum_squares[j])
+            }
+        return {
+            'total_diagnostics': int(present.any(axis=1).sum()),
+            'dimensions': dimensions
+        }
+
+    def summary(self, percentiles=(10, 25, 50, 75, 90)):
+        """Conteo, media, desviación estándar, mínimo, máximo y percentiles por dimensión y general"""
+        columns = np.column_stack([self.dimension_scores(), self.scores])
+        present = ~np.isnan(columns)
+        with warnings.catch_warnings():
+            # Columnas sin ningún dato: nan* avisa y devuelve NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            means = np.nanmean(columns, axis=0)
+            stds = np.nanstd(columns, axis=0)
+            minimums = np.nanmin(columns, axis=0)
+            maximums = np.nanmax(columns, axis=0)
+            quantiles = np.nanquantile(columns, np.asarray(percentiles) / 100.0, axis=0)
+
+        summary = {}
+        for j, name in enumerate(DIMENSION_NAMES + [OVERALL]):
+            count = int(present[:, j].sum())
+            if not count:
+                continue
+            summary[name] = {
+                'count': count,
+                'mean': float(means[j]),
+                'std': float(stds[j]),
+                'minimum': float(minimums[j]),
+                'maximum': float(maximums[j]),
+                'percentiles': {p: float(quantiles[k, j]) for k, p in enumerate(percentiles)}
+            }
+        return summary
+
+    def group_by(self, field):
+        """Media por dimensión agrupando por 'industry' o 'company_size'"""
+        if field == 'industry':
+            labels = self.industries
+        elif field == 'company_size':
+            labels = self.company_sizes
+        else:
+            raise ValueError(f'Unknown group field: {field}')
+
+        keys, inverse = np.unique(
+            np.array([label or NO_DATA_LABEL for label in labels], dtype=object),
+            return_inverse=True
+        )
+        scores = self.dimension_scores()
+        present = ~np.isnan(scores)
+        sums = np.zeros((len(keys), scores.shape[1]))
+        counts = np.zeros((len(keys), scores.shape[1]), dtype=np.int64)
+        np.add.at(sums, inverse, np.where(present, scores, 0.0))
+        np.add.at(counts, inverse, present)
+        sizes = np.bincount(inverse, minlength=len(keys))
+
+        groups = {}
+        for g, key in enumerate(keys):
+            groups[key] = {
+                'count': int(sizes[g]),
+                'dimensions': {
+                    name: float(sums[g, j] / counts[g, j])
+                    for j, name in enumerate(DIMENSION_NAMES)
+                    if counts[g, j]
+                }
+            }
+        return groups
+
+    def correlation(self, by='dimension'):
+        """Matriz de correlación por pares completos: (etiquetas, ndarray)"""
+        if by == 'dimension':
+            x, labels = self.dimension_scores(), DIMENSION_NAMES
+        elif by == 'question':
+            x, labels = self.values, QUESTION_IDS
+        else:
+            raise ValueError(f'Unknown correlation level: {by}')
+        return list(labels), _pairwise_corrcoef(x, ~np.isnan(x))
+
+    def histogram_rows(self):
+        """Filas (dimension, bucket, count) de benchmark_histograms"""
+        rows = []
+        columns = [(name, self.dimension_scores()[:, j]) for j, name in enumerate(DIMENSION_NAMES)]
+        columns.append((OVERALL, self.scores))
+        for name, scores in columns:
+            scores = scores[~np.isnan(scores)]
+            if not len(scores):
+                continue
+            buckets = np.clip(np.rint((scores - MIN_SCORE) / BUCKET_WIDTH), 0, NUM_BUCKETS - 1)
+            counts = np.bincount(buckets.astype(np.int64), minlength=NUM_BUCKETS)
+            rows.extend((name, int(bucket), int(counts[bucket])) for bucket in np.flatnonzero(counts))
+        return rows
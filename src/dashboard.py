@@ -0,0 +1,126 @@
+"""
+Estadísticas del panel de administración (/api/admin/dashboard).
+
+Una sola consulta lee users y diagnostics una vez cada una y cuenta todo con
+FILTER: usuarios, activos, diagnósticos, completados (answered_count que
+cubre el catálogo, la misma regla que invalida la caché al guardar),
+usuarios con diagnóstico, reparto por nivel y actividad reciente.
+
+El resultado se guarda en cada worker durante DASHBOARD_TTL segundos. Las
+escrituras del propio worker que cambian los recuentos (altas, borrados, el
+primer guardado de un diagnóstico y los cuestionarios completos) llaman a
+invalidate_dashboard; el resto de autoguardados y las escrituras de otros
+workers se ven al caducar el TTL.
+
+Configuración por variables de entorno:
+    DASHBOARD_TTL  segundos que se reutiliza el resultado (default 30)
+"""
+import os
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+from .db_pool import get_connection
+from .question_catalog import CATALOG
+from .scoring import MATURITY_LEVELS, LOWEST_LEVEL
+
+DASHBOARD_TTL = float(os.getenv('DASHBOARD_TTL', '30'))
+
+LEVELS = [level for _, level in MATURITY_LEVELS] + [LOWEST_LEVEL]
+
+# Ventanas de la actividad reciente: nombre -> intervalo
+RECENT_WINDOWS = {'last_24h': '1 day', 'last_7d': '7 days', 'last_30d': '30 days'}
+
+DASHBOARD_SQL = f'''
+    WITH user_counts AS (
+        SELECT COUNT(*) FILTER (WHERE is_admin = FALSE) AS total_users,
+               COUNT(*) FILTER (WHERE is_admin = FALSE AND is_active = TRUE) AS active_users,
+               {', '.join(
+                   f"COUNT(*) FILTER (WHERE is_admin = FALSE AND created_at >= "
+                   f"CURRENT_TIMESTAMP - INTERVAL '{interval}') AS new_users_{name}"
+                   for name, interval in RECENT_WINDOWS.items()
+               )}
+        FROM users
+    ), diagnostic_counts AS (
+        SELECT COUNT(*) AS total_diagnostics,
+               COUNT(*) FILTER (WHERE answered_count >= {len(CATALOG)}) AS completed_diagnostics,
+               -- UNIQUE (user_id): un diagnóstico por usuario
+               COUNT(user_id) AS users_with_diagnostics,
+               {', '.join(
+                   f"COUNT(*) FILTER (WHERE level = '{level}') AS level_{level}" for level in LEVELS
+               )},
+               {', '.join(
+                   f"COUNT(*) FILTER (WHERE completed_at >= "
+                   f"CURRENT_TIMESTAMP - INTERVAL '{interval}') AS saved_{name}"
+                   for name, interval in RECENT_WINDOWS.items()
+               )},
+               MAX(completed_at) AS last_saved_at
+        FROM diagnostics
+    )
+    SELECT * FROM user_counts, diagnostic_counts
+'''
+
+_lock = threading.Lock()
+_cached_stats = None
+_cached_at = 0.0
+_generation = 0
+
+
+def invalidate_dashboard():
+    """Descartar las estadísticas en caché de este worker (tras una escritura)"""
+    global _cached_stats, _generation
+    with _lock:
+        _cached_stats = None
+        _generation += 1
+
+
+def _read_dashboard_stats():
+    conn = get_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        cursor.execute(DASHBOARD_SQL)
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+    total_diagnostics = row['total_diagnostics']
+    completion_rate = 0
+    if total_diagnostics > 0:
+        completion_rate = (row['completed_diagnostics'] / total_diagnostics) * 100
+
+    return {
+        'total_users': row['total_users'],
+        'active_users': row['active_users'],
+        'total_diagnostics': total_diagnostics,
+        'completed_diagnostics': row['completed_diagnostics'],
+        'users_with_diagnostics': row['users_with_diagnostics'],
+        'completion_rate': round(completion_rate, 1),
+        'level_distribution': {level: row[f'level_{level}'] for level in LEVELS},
+        'recent_activity': {
+            **{f'new_users_{name}': row[f'new_users_{name}'] for name in RECENT_WINDOWS},
+            **{f'saved_{name}': row[f'saved_{name}'] for name in RECENT_WINDOWS},
+            'last_saved_at': row['last_saved_at']
+        }
+    }
+
+
+def get_dashboard_stats():
+    """Estadísticas del panel, de la caché del worker si no han caducado"""
+    global _cached_stats, _cached_at
+
+    with _lock:
+        if _cached_stats is not None and time.monotonic() - _cached_at < DASHBOARD_TTL:
+            return _cached_stats
+        generation = _generation
+
+    stats = _read_dashboard_stats()
+
+    with _lock:
+        # Una escritura durante la lectura invalida este resultado
+        if generation == _generation:
+            _cached_stats = stats
+            _cached_at = time.monotonic()
+    return stats
@@ -99,15 +99,14 @@ def generate_username(company_name):
     if len(clean_name) < 3:
         clean_name = 'user'
     
-    # Generar número único
+    # Generar número único: una sola consulta con los nombres ya usados
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        for _ in range(100):  # Máximo 100 intentos
-            num = random.randint(100, 999)
-            username = f"{clean_name}{num}"
-            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-            if cursor.fetchone() is None:
-                return username
+        cursor.execute("SELECT username FROM users WHERE username LIKE ?", (f"{clean_name}___",))
+        taken = {row[0] for row in cursor.fetchall()}
+        free = [num for num in range(100, 1000) if f"{clean_name}{num}" not in taken]
+        if free:
+            return f"{clean_name}{random.choice(free)}"
     
     # Fallback con timestamp
     timestamp = str(int(datetime.now().timestamp()))[-4:]
@@ -396,6 +395,3 @@ def get_user_stats():
             'total_diagnostics': 0,
             'completion_rate': 0
         }
-
-# Inicializar la base de datos al importar el módulo
-init_database()
@@ -1,79 +1,61 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import os
 from datetime import datetime
 import random
 import string
 
+from .db_pool import get_connection as _get_pooled_connection
+from .benchmark_aggregates import (
+    aggregate_delta_rows, queue_benchmark_deltas, replace_benchmark_aggregates,
+    lock_benchmark_aggregates, publish_benchmark_stats_with_cursor
+)
+from .benchmark_engine import fetch_dimension_stats
+from .dashboard import invalidate_dashboard
+from .benchmark_histograms import (
+    OVERALL, histogram_delta_rows, rebuild_histograms,
+    replace_histograms, load_histograms
+)
+from .diagnostic_history import (
+    RETURNING_SQL as HISTORY_RETURNING_SQL, next_snapshot_revision_sql, append_version_sql
+)
+from .migrations import BACKFILL_PENDING_SQL
+from .pagination import InvalidCursor, page_size, decode_cursor, page_of, estimated_count
+from .search import normalize_search, like_pattern, search_limit
+from .question_catalog import (
+    CATALOG, CURRENT_VERSION, DIMENSION_MAPPING, DIMENSION_COLUMNS
+)
+from .response_codec import pack_responses, responses_json_sql, set_bytes_sql, stored_responses
+from .scoring import maturity_level, score_responses, score_batch
+
 # PostgreSQL connection string from environment variable
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# Motor de la reconstrucción del benchmark: 'sql' (en PostgreSQL) o 'numpy'
+BENCHMARK_BACKEND = os.getenv('BENCHMARK_BACKEND', 'sql')
+
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is required")
 
 def get_connection():
-    """Get a PostgreSQL database connection"""
-    return psycopg2.connect(DATABASE_URL)
+    """Get a PostgreSQL connection from the shared process-wide pool.
 
-def init_db():
-    """Initialize the database with tables and admin user"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            password VARCHAR(100) NOT NULL,
-            company_name VARCHAR(200) NOT NULL,
-            contact_person VARCHAR(200),
-            email VARCHAR(200),
-            phone VARCHAR(50),
-            industry VARCHAR(100),
-            company_size VARCHAR(50),
-            notes TEXT,
-            is_admin BOOLEAN DEFAULT FALSE,
-            is_active BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create diagnostics table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS diagnostics (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id),
-            responses JSONB,
-            score FLOAT,
-            level VARCHAR(50),
-            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Check if admin user exists
-    cursor.execute("SELECT id FROM users WHERE username = 'admin'")
-    if not cursor.fetchone():
-        # Create admin user
-        cursor.execute('''
-            INSERT INTO users (username, password, company_name, is_admin, is_active)
-            VALUES (%s, %s, %s, %s, %s)
-        ''', ('admin', 'clientship2024', 'Clientship', True, True))
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+    Calling close() on the returned connection hands it back to the pool.
+    """
+    return _get_pooled_connection()
+
+AUTHENTICATE_USER_SQL = '''
+    SELECT id, username, company_name, is_admin, is_active
+    FROM users
+    WHERE username = %s AND password = %s
+'''
 
 def authenticate_user(username, password):
     """Authenticate a user"""
     conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
-    cursor.execute('''
-        SELECT id, username, company_name, is_admin, is_active
-        FROM users
-        WHERE username = %s AND password = %s
-    ''', (username, password))
+    cursor.execute(AUTHENTICATE_USER_SQL, (username, password))
     
     user = cursor.fetchone()
     cursor.close()
@@ -83,165 +65,723 @@ def authenticate_user(username, password):
         return dict(user)
     return None
 
-def generate_username(company_name):
-    """Generate a unique username from company name"""
-    # Take first 6 letters of company name, remove spaces and special chars
+def username_base(company_name):
+    """First 6 letters/digits of the company name, lowercased"""
     base = ''.join(c for c in company_name.lower() if c.isalnum())[:6]
-    if not base:
-        base = 'empres'
+    return base or 'empres'
+
+USERNAMES_TAKEN_SQL = 'SELECT username FROM users WHERE username = ANY(%s)'
+
+def assign_usernames(conn, company_names, reserved=()):
+    """Pick a free username (base + random digits) for each company name.
     
-    # Add 3 random digits
-    suffix = ''.join(random.choices(string.digits, k=3))
-    return f"{base}{suffix}"
+    Each round draws a few random candidates per base, more than it needs,
+    and checks them all in one indexed query against users.username; names
+    already handed out in the batch (and `reserved`) are skipped. A base
+    whose 3-digit space runs short moves on to 4 digits, and so on, so a
+    normal cohort is resolved with a single SELECT.
+    """
+    usernames = [None] * len(company_names)
+    taken = set(reserved)
+    pending = list(range(len(company_names)))
+    digits = 3
+    cursor = conn.cursor()
+    
+    try:
+        while pending:
+            positions_by_base = {}
+            for position in pending:
+                positions_by_base.setdefault(username_base(company_names[position]), []).append(position)
+            
+            suffixes = range(10 ** (digits - 1), 10 ** digits)
+            candidates = {
+                base: [f"{base}{suffix}" for suffix in random.sample(suffixes, min(len(suffixes), 2 * len(positions) + 8))]
+                for base, positions in positions_by_base.items()
+            }
+            cursor.execute(USERNAMES_TAKEN_SQL, ([
+                candidate for names in candidates.values() for candidate in names if candidate not in taken
+            ],))
+            taken.update(row[0] for row in cursor.fetchall())
+            
+            pending = []
+            for base, positions in positions_by_base.items():
+                free = [candidate for candidate in candidates[base] if candidate not in taken]
+                for position in positions:
+                    if free:
+                        usernames[position] = free.pop()
+                        taken.add(usernames[position])
+                    else:
+                        pending.append(position)
+            digits += 1
+        return usernames
+    finally:
+        cursor.close()
+
+def generate_username(company_name):
+    """Generate a unique username from company name"""
+    conn = get_connection()
+    try:
+        return assign_usernames(conn, [company_name])[0]
+    finally:
+        conn.close()
 
 def generate_password():
     """Generate a random password"""
     return 'cx' + ''.join(random.choices(string.digits, k=3))
 
-def create_user(company_name, contact_person, email, phone, industry, company_size, notes=''):
-    """Create a new user"""
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+# Columns of a new client, in insert order, and their defaults
+CLIENT_FIELDS = ('company_name', 'contact_person', 'email', 'phone', 'industry', 'company_size', 'notes')
+CLIENT_DEFAULTS = {'contact_person': '', 'email': '', 'phone': '', 'industry': 'servicios',
+                   'company_size': 'startup', 'notes': ''}
+# VARCHAR limits of those columns in users (notes is TEXT)
+CLIENT_FIELD_LENGTHS = {'company_name': 200, 'contact_person': 200, 'email': 200, 'phone': 50,
+                        'industry': 100, 'company_size': 50}
+
+# A username taken between assign_usernames and the insert (a concurrent
+# create) skips the row instead of aborting the batch; it gets a new name.
+INSERT_USERS_SQL = f'''
+    INSERT INTO users (username, password, {', '.join(CLIENT_FIELDS)})
+    VALUES %s
+    ON CONFLICT (username) DO NOTHING
+    RETURNING id, username
+'''
+
+# Rounds of renaming after conflicts before giving up
+INSERT_USERS_ATTEMPTS = 5
+
+def create_users(clients):
+    """Create many client users in one transaction.
+    
+    clients is a list of dicts with company_name and optionally the other
+    CLIENT_FIELDS. Usernames are resolved for the whole list at once and the
+    rows are inserted with execute_values. Returns {'success', 'users'}
+    with each user's id, username, password and fields, in input order.
+    """
+    clients = [{**CLIENT_DEFAULTS, **{k: v for k, v in client.items() if v is not None}} for client in clients]
+    if not clients:
+        return {'success': True, 'users': []}
     
-    # Generate unique username
-    username = generate_username(company_name)
-    password = generate_password()
+    conn = get_connection()
+    cursor = conn.cursor()
     
     try:
-        cursor.execute('''
-            INSERT INTO users (username, password, company_name, contact_person, email, phone, industry, company_size, notes)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        ''', (username, password, company_name, contact_person, email, phone, industry, company_size, notes))
+        passwords = [generate_password() for _ in clients]
+        user_ids = [None] * len(clients)
+        usernames = [None] * len(clients)
+        pending = list(range(len(clients)))
         
-        user_id = cursor.fetchone()['id']
-        conn.commit()
+        for _ in range(INSERT_USERS_ATTEMPTS):
+            names = assign_usernames(conn, [clients[i]['company_name'] for i in pending], reserved=filter(None, usernames))
+            position_by_username = dict(zip(names, pending))
+            rows = execute_values(cursor, INSERT_USERS_SQL, [
+                (name, passwords[i], *[clients[i][field] for field in CLIENT_FIELDS])
+                for name, i in position_by_username.items()
+            ], page_size=len(pending), fetch=True)
+            for user_id, username in rows:
+                position = position_by_username.pop(username)
+                user_ids[position], usernames[position] = user_id, username
+            pending = sorted(position_by_username.values())
+            if not pending:
+                break
+        else:
+            raise RuntimeError('No se pudieron asignar nombres de usuario libres')
         
+        conn.commit()
+        invalidate_dashboard()
         cursor.close()
         conn.close()
-        
         return {
             'success': True,
-            'username': username,
-            'password': password,
-            'user_id': user_id
+            'users': [
+                {'user_id': user_id, 'username': username, 'password': password, **client}
+                for user_id, username, password, client in zip(user_ids, usernames, passwords, clients)
+            ]
         }
     except Exception as e:
         conn.rollback()
         cursor.close()
         conn.close()
+        print(f"Error bulk creating users: {e}")
+        return {'success': False, 'message': f'Error: {str(e)}'}
+
+def create_user(company_name, contact_person, email, phone, industry, company_size, notes=''):
+    """Create a new user"""
+    result = create_users([{
+        'company_name': company_name, 'contact_person': contact_person, 'email': email,
+        'phone': phone, 'industry': industry, 'company_size': company_size, 'notes': notes
+    }])
+    if not result['success']:
         return {
             'success': False,
-            'error': str(e)
+            'error': result['message']
         }
+    
+    user = result['users'][0]
+    return {
+        'success': True,
+        'username': user['username'],
+        'password': user['password'],
+        'user_id': user['user_id']
+    }
+
+# Admin listings, newest first, one keyset page at a time (see pagination).
+# The cursor is NULL on the first page; the values are inlined client-side,
+# so the planner folds the OR away and walks users_clients_recent / the
+# diagnostics primary key from the cursor on. LIMIT NULL reads everything.
+# Diagnostics go by id: completed_at moves on every autosave.
+USERS_PAGE_SQL = '''
+    SELECT id, username, company_name, contact_person, email, phone, industry, company_size, is_active, created_at
+    FROM users
+    WHERE is_admin = FALSE
+      AND (%(after_at)s::timestamp IS NULL OR (created_at, id) < (%(after_at)s, %(after_id)s))
+    ORDER BY created_at DESC, id DESC
+    LIMIT %(limit)s
+'''
 
-def get_all_users():
-    """Get all users"""
+DIAGNOSTICS_PAGE_SQL = f'''
+    SELECT d.id, d.score, d.level, d.completed_at, d.answered_count,
+           {', '.join(f'd.{name}' for name in DIMENSION_COLUMNS)},
+           u.username, u.company_name
+    FROM diagnostics d
+    JOIN users u ON d.user_id = u.id
+    WHERE %(after_id)s::integer IS NULL OR d.id < %(after_id)s
+    ORDER BY d.id DESC
+    LIMIT %(limit)s
+'''
+
+def _list_page(sql, listing, sort_key, table, limit, after):
+    """Read one keyset page: (rows, next cursor, estimated table rows).
+    
+    Without limit and cursor the whole listing comes back in one page.
+    """
+    paginated = limit is not None or bool(after)
+    limit = page_size(limit)
+    after_at, after_id = decode_cursor(listing, after) or (None, None)
+    if after and (after_at is None) != (sort_key is None):
+        raise InvalidCursor('Cursor de paginación no válido para este listado')
+    
     conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
-    cursor.execute('''
-        SELECT id, username, company_name, contact_person, email, phone, industry, company_size, is_active, created_at
-        FROM users
-        WHERE is_admin = FALSE
-        ORDER BY created_at DESC
-    ''')
+    try:
+        # One extra row tells whether there is a next page
+        cursor.execute(sql, {'after_at': after_at, 'after_id': after_id,
+                             'limit': limit + 1 if paginated else None})
+        rows = [dict(row) for row in cursor.fetchall()]
+        next_cursor = None
+        if paginated:
+            rows, next_cursor = page_of(rows, limit, listing, sort_key)
+        total_estimate = estimated_count(conn, table)
+    finally:
+        cursor.close()
+        conn.close()
     
-    users = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    return rows, next_cursor, total_estimate
+
+def get_users_page(limit=None, after=None):
+    """Get one page of non-admin users, newest first.
     
-    return [dict(user) for user in users]
+    after is the `next` cursor of the previous page; raises InvalidCursor
+    when it is malformed. Without limit and after, all users.
+    """
+    users, next_cursor, total_estimate = _list_page(
+        USERS_PAGE_SQL, 'users', 'created_at', 'users', limit, after
+    )
+    return {'users': users, 'next': next_cursor, 'total_estimate': total_estimate}
+
+def get_diagnostics_page(limit=None, after=None):
+    """Get one page of diagnostics with user information, most recently created first"""
+    diagnostics, next_cursor, total_estimate = _list_page(
+        DIAGNOSTICS_PAGE_SQL, 'diagnostics', None, 'diagnostics', limit, after
+    )
+    return {'diagnostics': diagnostics, 'next': next_cursor, 'total_estimate': total_estimate}
+
+# Ranked admin search (see search): substring hits first, then by word
+# similarity. Both conditions are served by users_search_trgm.
+SEARCH_MATCH_SQL = '(u.search_text LIKE %(pattern)s OR %(term)s <%% u.search_text)'
+SEARCH_RANK_SQL = '(u.search_text LIKE %(pattern)s) DESC, word_similarity(%(term)s, u.search_text) DESC'
+
+SEARCH_USERS_SQL = f'''
+    SELECT u.id, u.username, u.company_name, u.contact_person, u.email, u.phone, u.industry,
+           u.company_size, u.is_active, u.created_at
+    FROM users u
+    WHERE u.is_admin = FALSE AND {SEARCH_MATCH_SQL}
+    ORDER BY {SEARCH_RANK_SQL}, u.created_at DESC, u.id DESC
+    LIMIT %(limit)s
+'''
+
+SEARCH_DIAGNOSTICS_SQL = f'''
+    SELECT d.id, d.score, d.level, d.completed_at, d.answered_count,
+           {', '.join(f'd.{name}' for name in DIMENSION_COLUMNS)},
+           u.username, u.company_name
+    FROM users u
+    JOIN diagnostics d ON d.user_id = u.id
+    WHERE {SEARCH_MATCH_SQL}
+    ORDER BY {SEARCH_RANK_SQL}, d.completed_at DESC, d.id DESC
+    LIMIT %(limit)s
+'''
 
-def get_all_diagnostics():
-    """Get all diagnostics with user information"""
+def _search(sql, term, limit):
+    """Run a ranked search for an already normalized term"""
     conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
-    cursor.execute('''
-        SELECT d.id, d.score, d.level, d.completed_at,
-               u.username, u.company_name
-        FROM diagnostics d
-        JOIN users u ON d.user_id = u.id
-        ORDER BY d.completed_at DESC
-    ''')
+    try:
+        cursor.execute(sql, {'term': term, 'pattern': like_pattern(term), 'limit': search_limit(limit)})
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+def search_users(search, limit=None):
+    """Search non-admin users by username, company, contact or email.
     
-    diagnostics = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    Terms too short for the trigram index return the first listing page.
+    """
+    term = normalize_search(search)
+    if term is None:
+        return get_users_page(limit)
+    return {'users': _search(SEARCH_USERS_SQL, term, limit), 'next': None}
+
+def search_diagnostics(search, limit=None):
+    """Search diagnostics by their user's username, company, contact or email"""
+    term = normalize_search(search)
+    if term is None:
+        return get_diagnostics_page(limit)
+    return {'diagnostics': _search(SEARCH_DIAGNOSTICS_SQL, term, limit), 'next': None}
+
+# Advisory lock namespace serializing writes to one user's diagnostic
+DIAGNOSTIC_LOCK_CLASS = 7301
+
+# Columns describing a diagnostic's benchmark scores (see stored_scores).
+# The responses JSON only comes back for rows not yet backfilled.
+STORED_SCORES_SQL = f'''
+    score, answered_count,
+    CASE WHEN answered_count IS NULL THEN responses END AS pending_responses,
+    {', '.join(DIMENSION_COLUMNS)}
+'''
+
+# Single round trip: the advisory lock makes the following statement's
+# snapshot see any concurrent save of the same user, the "previous" and
+# "prior" CTEs read the row as it was before the upsert (same snapshot), the
+# upsert relies on the UNIQUE (user_id) constraint and "history" appends the
+# new version.
+UPSERT_DIAGNOSTIC_SQL = f'''
+    SELECT pg_advisory_xact_lock(%(lock_class)s, %(user_id)s);
+    WITH previous AS (
+        SELECT {STORED_SCORES_SQL} FROM diagnostics WHERE user_id = %(user_id)s
+    ), prior AS (
+        SELECT {responses_json_sql('diagnostics')} AS responses FROM diagnostics WHERE user_id = %(user_id)s
+    ), saved AS (
+        INSERT INTO diagnostics (user_id, responses, responses_packed, catalog_version, score, level,
+                                 answered_count, revision, history_snapshot_revision,
+                                 {', '.join(DIMENSION_COLUMNS)})
+        VALUES (%(user_id)s, %(responses)s, %(responses_packed)s, {CURRENT_VERSION}, %(score)s, %(level)s,
+                %(answered_count)s, 1, 1, {', '.join(f'%({name})s' for name in DIMENSION_COLUMNS)})
+        ON CONFLICT (user_id) DO UPDATE
+        SET responses = EXCLUDED.responses,
+            responses_packed = EXCLUDED.responses_packed,
+            catalog_version = EXCLUDED.catalog_version,
+            revision = diagnostics.revision + 1,
+            score = EXCLUDED.score,
+            level = EXCLUDED.level,
+            answered_count = EXCLUDED.answered_count,
+            history_snapshot_revision = {next_snapshot_revision_sql('diagnostics')},
+            {', '.join(f'{name} = EXCLUDED.{name}' for name in DIMENSION_COLUMNS)},
+            completed_at = CURRENT_TIMESTAMP
+        RETURNING {HISTORY_RETURNING_SQL}, (xmax = 0) AS inserted
+    ), history AS (
+        {append_version_sql('saved LEFT JOIN prior ON TRUE', 'saved', old='prior.responses')}
+    )
+    SELECT saved.id, saved.revision, saved.inserted, previous.*
+    FROM saved LEFT JOIN previous ON TRUE
+'''
+
+def _packed_param(responses):
+    """responses_packed value for a save: the encoded bytes, or NULL if they do not fit"""
+    packed = pack_responses(responses)
+    return psycopg2.Binary(packed) if packed is not None else None
+
+def _responses_params(responses):
+    """(responses, responses_packed) values for a save.
+
+    The JSON column is only written when the answers do not fit the packed
+    format; otherwise it is cleared.
+    """
+    packed = _packed_param(responses)
+    return (psycopg2.extras.Json(responses) if packed is None else None), packed
+
+def upsert_diagnostic(cursor, user_id, responses, score, level):
+    """Upsert a user's diagnostic and keep benchmark aggregates and histograms in step.
+
+    Runs inside the caller's transaction. Returns (diagnostic id, new
+    revision, whether the row was inserted).
+    """
+    scored = score_responses(responses)
+    averages = scored.dimension_scores
+    responses_json, responses_packed = _responses_params(responses)
+    params = {
+        'lock_class': DIAGNOSTIC_LOCK_CLASS,
+        'user_id': user_id,
+        'responses': responses_json,
+        'responses_packed': responses_packed,
+        'score': score,
+        'level': level,
+        'answered_count': scored.answered_count if responses is not None else None
+    }
+    params.update({name: averages.get(name) for name in DIMENSION_COLUMNS})
+    cursor.execute(UPSERT_DIAGNOSTIC_SQL, params)
+    diagnostic_id, revision, inserted, *previous = cursor.fetchone()
     
-    return [dict(diag) for diag in diagnostics]
+    # A fresh insert means there was no row to replace
+    old_scores = {} if inserted else stored_scores(previous)
+    new_scores = dict(averages) if responses else {}
+    if responses and score is not None:
+        new_scores[OVERALL] = score
+    update_benchmark_store(cursor, old_scores, new_scores)
+    return diagnostic_id, revision, inserted
 
-def get_stats():
-    """Get dashboard statistics"""
+def _dashboard_changed(inserted, answered_count):
+    """Whether a save should drop the cached dashboard stats.
+    
+    New diagnostics and complete questionnaires change its counts; the score
+    and level drift of ordinary autosaves shows up when DASHBOARD_TTL expires.
+    """
+    return inserted or (answered_count or 0) >= len(CATALOG)
+
+def save_diagnostic(user_id, responses, score, level):
+    """Save or update a diagnostic result. Returns the new revision, or False on error"""
     conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor = conn.cursor()
     
-    # Count users (excluding admin)
-    cursor.execute("SELECT COUNT(*) as total FROM users WHERE is_admin = FALSE")
-    total_users = cursor.fetchone()['total']
+    try:
+        _, revision, inserted = upsert_diagnostic(cursor, user_id, responses, score, level)
+        
+        conn.commit()
+        if _dashboard_changed(inserted, len(responses) if isinstance(responses, dict) else 0):
+            invalidate_dashboard()
+        cursor.close()
+        conn.close()
+        return revision
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        print(f"Error saving diagnostic: {e}")
+        return False
+
+# Batched upsert of many users' diagnostics (write-behind flushes). A row
+# only replaces the stored one if it is newer, so flushes from different
+# workers cannot bring back an older save.
+BATCH_UPSERT_DIAGNOSTICS_SQL = f'''
+    WITH incoming (user_id, responses, responses_packed, score, level, answered_count,
+                   {', '.join(DIMENSION_COLUMNS)}, saved_at) AS (
+        VALUES %s
+    ), previous AS (
+        SELECT user_id, {STORED_SCORES_SQL}
+        FROM diagnostics
+        WHERE user_id IN (SELECT user_id FROM incoming)
+    ), prior AS (
+        SELECT user_id, {responses_json_sql('diagnostics')} AS responses
+        FROM diagnostics
+        WHERE user_id IN (SELECT user_id FROM incoming)
+    ), saved AS (
+        INSERT INTO diagnostics (user_id, responses, responses_packed, catalog_version, score, level,
+                                 answered_count, revision, history_snapshot_revision,
+                                 {', '.join(DIMENSION_COLUMNS)}, completed_at)
+        SELECT user_id, responses, responses_packed, {CURRENT_VERSION}, score, level, answered_count, 1, 1,
+               {', '.join(DIMENSION_COLUMNS)}, saved_at
+        FROM incoming
+        ON CONFLICT (user_id) DO UPDATE
+        SET responses = EXCLUDED.responses,
+            responses_packed = EXCLUDED.responses_packed,
+            catalog_version = EXCLUDED.catalog_version,
+            revision = diagnostics.revision + 1,
+            score = EXCLUDED.score,
+            level = EXCLUDED.level,
+            answered_count = EXCLUDED.answered_count,
+            history_snapshot_revision = {next_snapshot_revision_sql('diagnostics')},
+            {', '.join(f'{name} = EXCLUDED.{name}' for name in DIMENSION_COLUMNS)},
+            completed_at = EXCLUDED.completed_at
+        WHERE diagnostics.completed_at IS NULL
+           OR diagnostics.completed_at <= EXCLUDED.completed_at
+        RETURNING user_id, {HISTORY_RETURNING_SQL}, (xmax = 0) AS inserted
+    ), history AS (
+        {append_version_sql('saved LEFT JOIN prior ON prior.user_id = saved.user_id', 'saved',
+                            old='prior.responses')}
+    )
+    SELECT saved.user_id, saved.inserted, previous.*
+    FROM saved LEFT JOIN previous ON previous.user_id = saved.user_id
+'''
+
+BATCH_UPSERT_TEMPLATE = (
+    '(%s, %s::jsonb, %s::bytea, %s::float8, %s, %s::smallint'
+    + ', %s::float8' * len(DIMENSION_COLUMNS)
+    + ', (%s::timestamptz)::timestamp)'
+)
+
+def save_diagnostics_batch(saves):
+    """Upsert many diagnostics in one transaction and one statement.
     
-    cursor.execute("SELECT COUNT(*) as active FROM users WHERE is_admin = FALSE AND is_active = TRUE")
-    active_users = cursor.fetchone()['active']
+    saves is a list of (user_id, responses, score, level, saved_at) with at
+    most one entry per user; saved_at is an aware datetime. Returns the
+    number of rows written (older saves than the stored ones are skipped).
+    Errors propagate so the caller can keep the saves for a retry.
+    """
+    if not saves:
+        return 0
     
-    # Count diagnostics
-    cursor.execute("SELECT COUNT(*) as total FROM diagnostics")
-    total_diagnostics = cursor.fetchone()['total']
+    values = []
+    new_scores = {}
+    answered = {}
+    for user_id, responses, score, level, saved_at in saves:
+        scored = score_responses(responses)
+        answered[user_id] = scored.answered_count
+        averages = scored.dimension_scores
+        values.append((user_id, *_responses_params(responses),
+                       score, level, scored.answered_count, *[averages.get(name) for name in DIMENSION_COLUMNS], saved_at))
+        scores = dict(averages) if responses else {}
+        if responses and score is not None:
+            scores[OVERALL] = score
+        new_scores[user_id] = scores
     
-    cursor.execute("SELECT COUNT(*) as completed FROM diagnostics WHERE score IS NOT NULL")
-    completed_diagnostics = cursor.fetchone()['completed']
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    cursor.close()
-    conn.close()
+    try:
+        # Same per-user locks as the single save, taken in id order
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(%s, u) FROM unnest(%s::int[]) AS u',
+            (DIAGNOSTIC_LOCK_CLASS, sorted(new_scores))
+        )
+        rows = execute_values(cursor, BATCH_UPSERT_DIAGNOSTICS_SQL, values,
+                              template=BATCH_UPSERT_TEMPLATE, page_size=len(values), fetch=True)
+        update_benchmark_store_batch(cursor, [
+            ({} if inserted else stored_scores(previous[1:]), new_scores[user_id])
+            for user_id, inserted, *previous in rows
+        ])
+        conn.commit()
+        if any(_dashboard_changed(inserted, answered[user_id]) for user_id, inserted, *_ in rows):
+            invalidate_dashboard()
+        return len(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+# Lock the user's diagnostic and read only what a delta save needs: the
+# stored scores, the previous values of the changed keys and how many
+# answers each dimension has.
+READ_FOR_CHANGES_SQL = f'''
+    SELECT pg_advisory_xact_lock(%(lock_class)s, %(user_id)s);
+    SELECT id, revision, {STORED_SCORES_SQL},
+           (SELECT jsonb_object_agg(r.key, r.value)
+            FROM jsonb_each(stored.document) AS r
+            WHERE r.key = ANY(%(keys)s)) AS replaced,
+           (SELECT jsonb_object_agg(c.dim_id, c.answered)
+            FROM (SELECT split_part(k, '.', 1) AS dim_id, COUNT(*) AS answered
+                  FROM jsonb_object_keys(stored.document) AS k
+                  WHERE position('.' in k) > 0
+                  GROUP BY 1) AS c) AS dimension_counts
+    FROM diagnostics
+    CROSS JOIN LATERAL (SELECT {responses_json_sql('diagnostics')} AS document) AS stored
+    WHERE user_id = %(user_id)s
+'''
+
+# {packed} is the set_byte expression for the changes (response_codec.set_bytes_sql),
+# or NULL when they do not fit. Bytes packed with an older catalog have other
+# positions and are dropped too. Without new bytes the merged document is
+# written as JSON (and the backfill repacks it with the current catalog);
+# with them the JSON column is cleared.
+APPLY_CHANGES_SQL = f'''
+    WITH saved AS (
+    UPDATE diagnostics
+    SET responses = CASE WHEN catalog_version <> {CURRENT_VERSION} OR {{packed}} IS NULL
+                         THEN {responses_json_sql('diagnostics')} || %(changes)s END,
+        responses_packed = CASE WHEN catalog_version = {CURRENT_VERSION} THEN {{packed}} END,
+        catalog_version = {CURRENT_VERSION},
+        score = %(score)s,
+        level = %(level)s,
+        answered_count = %(answered_count)s,
+        {', '.join(f'{name} = %({name})s' for name in DIMENSION_COLUMNS)},
+        history_snapshot_revision = {next_snapshot_revision_sql('diagnostics')},
+        revision = revision + 1,
+        completed_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s
+    RETURNING {HISTORY_RETURNING_SQL}
+    ), history AS (
+        {append_version_sql('saved', 'saved', delta='%(changes)s')}
+    )
+    SELECT revision FROM saved
+'''
+
+def _merge_changes(row, changes):
+    """Scores after applying changes, updated incrementally from the stored ones.
+
+    row comes from READ_FOR_CHANGES_SQL. Returns (overall score, answered
+    count, {dimension: average}). Answers are integers, so sums rebuilt from
+    average × count are exact after rounding.
+    """
+    score, answered_count, pending_responses = row[2:5]
+    averages = dict(zip(DIMENSION_COLUMNS, row[5:5 + len(DIMENSION_COLUMNS)]))
+    replaced, dimension_counts = row[-2] or {}, row[-1] or {}
     
-    completion_rate = 0
-    if total_diagnostics > 0:
-        completion_rate = (completed_diagnostics / total_diagnostics) * 100
+    if answered_count is None:
+        # Saved before the dimension columns existed: recompute once from the JSON
+        merged = dict(pending_responses or {})
+        merged.update(changes)
+        scored = score_responses(merged)
+        return scored.score, scored.answered_count, scored.dimension_scores
     
-    return {
-        'total_users': total_users,
-        'active_users': active_users,
-        'total_diagnostics': total_diagnostics,
-        'completion_rate': round(completion_rate, 1)
-    }
+    total = round(score * answered_count) if answered_count else 0
+    sums = {}
+    counts = {}
+    for dim_id, name in DIMENSION_MAPPING.items():
+        counts[name] = dimension_counts.get(dim_id, 0)
+        sums[name] = round(averages[name] * counts[name]) if averages[name] is not None else 0
+    
+    for key, value in changes.items():
+        name = CATALOG.dimension_for_key(key)
+        if key in replaced:
+            total -= replaced[key]
+            if name:
+                sums[name] -= replaced[key]
+        else:
+            answered_count += 1
+            if name:
+                counts[name] += 1
+        total += value
+        if name:
+            sums[name] += value
+    
+    averages = {name: sums[name] / counts[name] for name in DIMENSION_COLUMNS if counts[name]}
+    return total / answered_count, answered_count, averages
 
-def save_diagnostic(user_id, responses, score, level):
-    """Save or update a diagnostic result"""
+def apply_response_changes(user_id, base_revision, changes):
+    """Merge only the changed answers into a user's diagnostic (delta autosave).
+
+    changes maps question keys to integer answers. The save only applies if
+    the stored revision is still base_revision; otherwise nothing is written
+    and the current revision and responses come back so the client can
+    reconcile. Returns a dict with 'success' and, on success, the new
+    revision, score, level and answered count.
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        # Check if diagnostic exists for this user
-        cursor.execute('SELECT id FROM diagnostics WHERE user_id = %s', (user_id,))
-        existing = cursor.fetchone()
+        cursor.execute(READ_FOR_CHANGES_SQL, {
+            'lock_class': DIAGNOSTIC_LOCK_CLASS,
+            'user_id': user_id,
+            'keys': list(changes)
+        })
+        row = cursor.fetchone()
+        current_revision = row[1] if row else 0
         
-        if existing:
-            # Update existing diagnostic
-            cursor.execute('''
-                UPDATE diagnostics 
-                SET responses = %s, score = %s, level = %s, completed_at = CURRENT_TIMESTAMP
-                WHERE user_id = %s
-            ''', (psycopg2.extras.Json(responses), score, level, user_id))
+        if current_revision != base_revision:
+            cursor.execute(
+                'SELECT responses_packed, responses, catalog_version FROM diagnostics WHERE user_id = %s',
+                (user_id,)
+            )
+            current = cursor.fetchone()
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return {
+                'success': False,
+                'conflict': True,
+                'revision': current_revision,
+                'responses': stored_responses(*current) if current else {}
+            }
+        
+        if row is None:
+            # First save of this user: the changes are the whole document
+            scored = score_responses(changes)
+            score, level, answered_count = scored.score, scored.level, scored.answered_count
+            _, revision, inserted = upsert_diagnostic(cursor, user_id, changes, score, level)
         else:
-            # Insert new diagnostic
-            cursor.execute('''
-                INSERT INTO diagnostics (user_id, responses, score, level)
-                VALUES (%s, %s, %s, %s)
-            ''', (user_id, psycopg2.extras.Json(responses), score, level))
+            score, answered_count, averages = _merge_changes(row, changes)
+            level = maturity_level(score)
+            inserted = False
+            params = {
+                'id': row[0],
+                'changes': psycopg2.extras.Json(changes),
+                'score': score,
+                'level': level,
+                'answered_count': answered_count
+            }
+            params.update({name: averages.get(name) for name in DIMENSION_COLUMNS})
+            # set_byte keeps NULL as NULL: rows stored as JSON stay JSON
+            packed = set_bytes_sql('responses_packed', changes) or 'NULL'
+            cursor.execute(APPLY_CHANGES_SQL.format(packed=packed), params)
+            revision = cursor.fetchone()[0]
+            
+            new_scores = dict(averages)
+            new_scores[OVERALL] = score
+            update_benchmark_store(cursor, stored_scores(row[2:5 + len(DIMENSION_COLUMNS)]), new_scores)
         
         conn.commit()
+        if _dashboard_changed(inserted, answered_count):
+            invalidate_dashboard()
         cursor.close()
         conn.close()
-        return True
+        return {
+            'success': True,
+            'revision': revision,
+            'score': score,
+            'level': level,
+            'answered_count': answered_count
+        }
     except Exception as e:
         conn.rollback()
         cursor.close()
         conn.close()
-        print(f"Error saving diagnostic: {e}")
-        return False
+        print(f"Error applying response changes: {e}")
+        return {'success': False, 'message': f'Error: {str(e)}'}
+
+def diagnostic_scores(responses, score):
+    """Per-dimension averages plus the overall score, as tracked by the histograms"""
+    if not responses:
+        return {}
+    scores = dict(score_responses(responses).dimension_scores)
+    if score is not None:
+        scores[OVERALL] = score
+    return scores
+
+def stored_scores(row):
+    """Scores of a diagnostic from a row of STORED_SCORES_SQL columns"""
+    if not row:
+        return {}
+    score, answered_count, pending_responses = row[:3]
+    if answered_count is None:
+        # Saved before the dimension columns existed and not backfilled yet
+        return diagnostic_scores(pending_responses, score)
+    scores = {
+        name: value for name, value in zip(DIMENSION_COLUMNS, row[3:])
+        if value is not None
+    }
+    if answered_count and score is not None:
+        scores[OVERALL] = score
+    return scores
 
-# Initialize database on import
-init_db()
+def update_benchmark_store(cursor, old_scores, new_scores):
+    """Queue moving one diagnostic from old_scores to new_scores in the
+    benchmark aggregates and histograms (folded in by the publish job)."""
+    update_benchmark_store_batch(cursor, [(old_scores, new_scores)])
+
+def update_benchmark_store_batch(cursor, changes):
+    """Queue [(old_scores, new_scores), ...] for the next benchmark publish, in one statement"""
+    dimension_changes = [
+        ({k: v for k, v in old.items() if k != OVERALL}, {k: v for k, v in new.items() if k != OVERALL})
+        for old, new in changes
+    ]
+    queue_benchmark_deltas(cursor, aggregate_delta_rows(dimension_changes), histogram_delta_rows(changes))
+
+def remove_from_benchmark(cursor, deleted_rows):
+    """Subtract deleted diagnostics (rows of STORED_SCORES_SQL) from the benchmark store"""
+    update_benchmark_store_batch(cursor, [(stored_scores(row), {}) for row in deleted_rows])
 
 def delete_user(username):
     """Delete a user by username - eliminando primero sus diagnósticos"""
@@ -250,16 +790,19 @@ def delete_user(username):
     
     try:
         # Primero eliminar todos los diagnósticos del usuario
-        cursor.execute('''
+        cursor.execute(f'''
             DELETE FROM diagnostics 
-            WHERE user_id IN (SELECT id FROM users WHERE username = %s)
+            WHERE user_id IN (SELECT id FROM users WHERE username = %s AND is_admin = FALSE)
+            RETURNING {STORED_SCORES_SQL}
         ''', (username,))
+        remove_from_benchmark(cursor, cursor.fetchall())
         
         # Luego eliminar el usuario (solo si no es admin)
         cursor.execute('DELETE FROM users WHERE username = %s AND is_admin = FALSE', (username,))
         deleted = cursor.rowcount > 0
         
         conn.commit()
+        invalidate_dashboard()
         cursor.close()
         conn.close()
         return deleted
@@ -296,9 +839,12 @@ def delete_diagnostic(diagnostic_id):
     cursor = conn.cursor()
     
     try:
-        cursor.execute('DELETE FROM diagnostics WHERE id = %s', (diagnostic_id,))
-        deleted = cursor.rowcount > 0
+        cursor.execute(f'DELETE FROM diagnostics WHERE id = %s RETURNING {STORED_SCORES_SQL}', (diagnostic_id,))
+        deleted_rows = cursor.fetchall()
+        remove_from_benchmark(cursor, deleted_rows)
+        deleted = len(deleted_rows) > 0
         conn.commit()
+        invalidate_dashboard()
         cursor.close()
         conn.close()
         return deleted
@@ -309,56 +855,119 @@ def delete_diagnostic(diagnostic_id):
         print(f"Error deleting diagnostic: {e}")
         return False
 
-def calculate_benchmark():
-    """Calculate benchmark statistics from all completed diagnostics"""
+# Largest id list accepted by the bulk deletes
+BULK_DELETE_MAX = 1000
+
+def _bulk_outcomes(requested_ids, deleted_ids, forbidden_ids=()):
+    """Per-id result of a bulk delete, in request order"""
+    deleted_ids, forbidden_ids = set(deleted_ids), set(forbidden_ids)
+    return [
+        {
+            'id': item_id,
+            'status': 'deleted' if item_id in deleted_ids
+                      else 'forbidden' if item_id in forbidden_ids
+                      else 'not_found'
+        }
+        for item_id in requested_ids
+    ]
+
+def delete_diagnostics(diagnostic_ids):
+    """Delete many diagnostics in one statement and one transaction.
+    
+    Returns {'success', 'deleted_count', 'results': [{'id', 'status'}]} with
+    status 'deleted' or 'not_found' per requested id.
+    """
+    diagnostic_ids = list(dict.fromkeys(diagnostic_ids))
     conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor = conn.cursor()
     
     try:
-        # Get all completed diagnostics with their dimension scores
-        cursor.execute('''
-            SELECT responses
-            FROM diagnostics
-            WHERE responses IS NOT NULL
-        ''')
-        
-        diagnostics = cursor.fetchall()
+        cursor.execute(f'''
+            DELETE FROM diagnostics WHERE id = ANY(%s)
+            RETURNING id, {STORED_SCORES_SQL}
+        ''', (diagnostic_ids,))
+        deleted_rows = cursor.fetchall()
+        remove_from_benchmark(cursor, [row[1:] for row in deleted_rows])
+        conn.commit()
+        invalidate_dashboard()
         cursor.close()
         conn.close()
+        return {
+            'success': True,
+            'deleted_count': len(deleted_rows),
+            'results': _bulk_outcomes(diagnostic_ids, [row[0] for row in deleted_rows])
+        }
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        print(f"Error bulk deleting diagnostics: {e}")
+        return {'success': False, 'message': f'Error: {str(e)}'}
+
+def delete_users(user_ids):
+    """Delete many non-admin users and their diagnostics in one transaction.
+    
+    Per-id status is 'deleted', 'forbidden' (admin users) or 'not_found'.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('SELECT id FROM users WHERE id = ANY(%s) AND is_admin = TRUE', (user_ids,))
+        admin_ids = [row[0] for row in cursor.fetchall()]
         
-        if not diagnostics:
-            return {
-                'total_diagnostics': 0,
-                'dimensions': {}
-            }
-        
-        # Calculate average scores per dimension
-        dimension_scores = {}
-        dimension_counts = {}
+        # Diagnostics first, to subtract their scores from the benchmark
+        cursor.execute(f'''
+            DELETE FROM diagnostics
+            WHERE user_id IN (SELECT id FROM users WHERE id = ANY(%s) AND is_admin = FALSE)
+            RETURNING {STORED_SCORES_SQL}
+        ''', (user_ids,))
+        deleted_diagnostics = cursor.fetchall()
+        remove_from_benchmark(cursor, deleted_diagnostics)
         
-        for diag in diagnostics:
-            responses = diag['responses']
-            if isinstance(responses, dict) and 'dimensions' in responses:
-                for dim_name, dim_data in responses['dimensions'].items():
-                    if 'score' in dim_data:
-                        if dim_name not in dimension_scores:
-                            dimension_scores[dim_name] = 0
-                            dimension_counts[dim_name] = 0
-                        dimension_scores[dim_name] += dim_data['score']
-                        dimension_counts[dim_name] += 1
+        cursor.execute('DELETE FROM users WHERE id = ANY(%s) AND is_admin = FALSE RETURNING id', (user_ids,))
+        deleted_ids = [row[0] for row in cursor.fetchall()]
         
-        # Calculate averages
-        benchmark = {
-            'total_diagnostics': len(diagnostics),
-            'dimensions': {}
+        conn.commit()
+        invalidate_dashboard()
+        cursor.close()
+        conn.close()
+        return {
+            'success': True,
+            'deleted_count': len(deleted_ids),
+            'deleted_diagnostics': len(deleted_diagnostics),
+            'results': _bulk_outcomes(user_ids, deleted_ids, admin_ids)
         }
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        print(f"Error bulk deleting users: {e}")
+        return {'success': False, 'message': f'Error: {str(e)}'}
+
+def calculate_benchmark():
+    """Calculate benchmark statistics from all completed diagnostics.
+
+    The aggregation runs inside PostgreSQL (see benchmark_engine); only one
+    row per dimension comes back over the wire.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        stats = fetch_dimension_stats(cursor)
+        cursor.close()
+        conn.close()
         
-        for dim_name in dimension_scores:
-            if dimension_counts[dim_name] > 0:
-                avg_score = dimension_scores[dim_name] / dimension_counts[dim_name]
-                benchmark['dimensions'][dim_name] = round(avg_score, 2)
-        
-        return benchmark
+        dimensions = stats['dimensions']
+        return {
+            'total_diagnostics': stats['total_diagnostics'],
+            'dimensions': {name: round(dim['average'], 2) for name, dim in dimensions.items()},
+            'dimension_counts': {name: dim['count'] for name, dim in dimensions.items()},
+            'dimension_minimums': {name: round(dim['minimum'], 2) for name, dim in dimensions.items()},
+            'dimension_maximums': {name: round(dim['maximum'], 2) for name, dim in dimensions.items()}
+        }
         
     except Exception as e:
         cursor.close()
@@ -370,89 +979,127 @@ def calculate_benchmark():
             'error': str(e)
         }
 
+USER_DIAGNOSTIC_SQL = f'''
+    SELECT id, responses_packed,
+           CASE WHEN responses_packed IS NULL THEN responses END AS responses,
+           catalog_version, score, level, completed_at, answered_count, revision,
+           {', '.join(DIMENSION_COLUMNS)}
+    FROM diagnostics
+    WHERE user_id = %s
+'''
+
 def get_user_diagnostic(user_id):
-    """Get the most recent diagnostic for a user"""
+    """Get the user's diagnostic (the latest version: one row per user).
+
+    The answers come back as stored: responses_packed with its
+    catalog_version, or the responses JSON when there are no packed bytes.
+    The API decodes them (response_codec.stored_responses).
+    """
     conn = get_connection()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
-    cursor.execute('''
-        SELECT id, responses, score, level, completed_at
-        FROM diagnostics
-        WHERE user_id = %s
-        ORDER BY completed_at DESC
-        LIMIT 1
-    ''', (user_id,))
+    cursor.execute(USER_DIAGNOSTIC_SQL, (user_id,))
     
     diagnostic = cursor.fetchone()
     cursor.close()
     conn.close()
     
     if diagnostic:
-        return dict(diagnostic)
+        diagnostic = dict(diagnostic)
+        dimension_scores = {name: diagnostic.pop(name) for name in DIMENSION_COLUMNS}
+        if diagnostic['answered_count'] is None:
+            # Not backfilled yet (the answers are still JSON)
+            dimension_scores = score_responses(diagnostic['responses']).dimension_scores
+        diagnostic['dimension_scores'] = {
+            name: score for name, score in dimension_scores.items() if score is not None
+        }
+        return diagnostic
     return None
 
-def get_benchmark_stats():
-    """Get benchmark statistics from benchmark_stats table"""
-    conn = get_connection()
+def read_benchmark_stats(conn):
+    """Read benchmark statistics from benchmark_stats and the score histograms.
+
+    Uses the caller's connection and lets errors propagate.
+    """
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     # Mapeo inverso: de nombres a IDs numéricos
-    NAME_TO_ID = {
-        'estrategia_cx': '1',
-        'arquitectura_cx': '2',
-        'insights_cx': '3',
-        'cultura_cambio': '4',
-        'innovacion_cx': '5',
-        'governance_cx': '6'
+    NAME_TO_ID = {name: dim_id for dim_id, name in DIMENSION_MAPPING.items()}
+    
+    # Get all benchmark stats
+    cursor.execute('''
+        SELECT dimension, avg_score, total_diagnostics
+        FROM benchmark_stats
+        ORDER BY dimension
+    ''')
+    
+    stats = cursor.fetchall()
+    cursor.close()
+    
+    # Histograms give min/max/percentiles (to 0.01) and the diagnostics count
+    histogram_cursor = conn.cursor()
+    histograms = load_histograms(histogram_cursor)
+    histogram_cursor.close()
+    
+    overall = histograms.get(OVERALL)
+    total = overall.total if overall else 0
+    
+    # Format response in the format expected by the frontend
+    dimension_averages = {}
+    dimension_minimums = {}
+    dimension_maximums = {}
+    dimension_percentiles = {}
+    
+    for stat in stats:
+        dim_name = stat['dimension']
+        # Convertir nombre a ID numérico
+        dim_id = NAME_TO_ID.get(dim_name, dim_name)
+        avg_score = float(stat['avg_score'])
+        dimension_averages[dim_id] = avg_score
+        histogram = histograms.get(dim_name)
+        if histogram and histogram.total:
+            dimension_minimums[dim_id] = histogram.minimum()
+            dimension_maximums[dim_id] = histogram.maximum()
+            dimension_percentiles[dim_id] = histogram.percentiles()
+        else:
+            dimension_minimums[dim_id] = avg_score
+            dimension_maximums[dim_id] = avg_score
+            dimension_percentiles[dim_id] = {}
+    
+    # Calculate overall average
+    overall_average = sum(dimension_averages.values()) / len(dimension_averages) if dimension_averages else 0.0
+    
+    if overall and overall.total:
+        overall_minimum = overall.minimum()
+        overall_maximum = overall.maximum()
+        overall_percentiles = overall.percentiles()
+    else:
+        overall_minimum = min(dimension_minimums.values()) if dimension_minimums else 0.0
+        overall_maximum = max(dimension_maximums.values()) if dimension_maximums else 0.0
+        overall_percentiles = {}
+    
+    return {
+        'total_diagnostics': total,
+        'dimension_averages': dimension_averages,
+        'dimension_minimums': dimension_minimums,
+        'dimension_maximums': dimension_maximums,
+        'dimension_percentiles': dimension_percentiles,
+        'overall_average': overall_average,
+        'overall_minimum': overall_minimum,
+        'overall_maximum': overall_maximum,
+        'overall_percentiles': overall_percentiles
     }
+
+def get_benchmark_stats():
+    """Get benchmark statistics from benchmark_stats and the score histograms"""
+    conn = get_connection()
     
     try:
-        # Get all benchmark stats
-        cursor.execute('''
-            SELECT dimension, avg_score, total_diagnostics
-            FROM benchmark_stats
-            ORDER BY dimension
-        ''')
-        
-        stats = cursor.fetchall()
-        
-        # Get total diagnostics count
-        cursor.execute('SELECT COUNT(*) as total FROM diagnostics WHERE responses IS NOT NULL')
-        total = cursor.fetchone()['total']
-        
-        cursor.close()
+        stats = read_benchmark_stats(conn)
         conn.close()
-        
-        # Format response in the format expected by the frontend
-        dimension_averages = {}
-        dimension_minimums = {}
-        dimension_maximums = {}
-        
-        for stat in stats:
-            dim_name = stat['dimension']
-            # Convertir nombre a ID numérico
-            dim_id = NAME_TO_ID.get(dim_name, dim_name)
-            avg_score = float(stat['avg_score'])
-            dimension_averages[dim_id] = avg_score
-            # Por ahora usamos el promedio como min/max, se puede mejorar calculando desde las respuestas
-            dimension_minimums[dim_id] = max(1.0, avg_score - 0.5)
-            dimension_maximums[dim_id] = min(5.0, avg_score + 0.5)
-        
-        # Calculate overall average
-        overall_average = sum(dimension_averages.values()) / len(dimension_averages) if dimension_averages else 0.0
-        
-        return {
-            'total_diagnostics': total,
-            'dimension_averages': dimension_averages,
-            'dimension_minimums': dimension_minimums,
-            'dimension_maximums': dimension_maximums,
-            'overall_average': overall_average,
-            'overall_minimum': min(dimension_minimums.values()) if dimension_minimums else 0.0,
-            'overall_maximum': max(dimension_maximums.values()) if dimension_maximums else 0.0
-        }
+        return stats
         
     except Exception as e:
-        cursor.close()
         conn.close()
         print(f"Error getting benchmark stats: {e}")
         return {
@@ -460,25 +1107,29 @@ def get_benchmark_stats():
             'dimension_averages': {},
             'dimension_minimums': {},
             'dimension_maximums': {},
+            'dimension_percentiles': {},
             'overall_average': 0.0,
             'overall_minimum': 0.0,
-            'overall_maximum': 0.0
+            'overall_maximum': 0.0,
+            'overall_percentiles': {}
         }
 
+def get_percentile_rank(score):
+    """Percentage of diagnostics whose overall score is below `score` (to 0.01), or None"""
+    if score is None:
+        return None
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        overall = load_histograms(cursor, OVERALL).get(OVERALL)
+        return overall.percentile_rank(score) if overall else None
+    finally:
+        cursor.close()
+        conn.close()
 
-# ==================== BENCHMARK RECALCULATION ====================
-
-from collections import defaultdict
 
-# Mapeo de preguntas a dimensiones
-DIMENSION_MAPPING = {
-    '1': 'estrategia_cx',
-    '2': 'arquitectura_cx',
-    '3': 'insights_cx',
-    '4': 'cultura_cambio',
-    '5': 'innovacion_cx',
-    '6': 'governance_cx'
-}
+# ==================== BENCHMARK RECALCULATION ====================
 
 def extract_dimension_from_key(key):
     """Extraer el número de dimensión de una clave como '1.1.1' -> '1'"""
@@ -486,22 +1137,126 @@ def extract_dimension_from_key(key):
         return key.split('.')[0]
     return None
 
-def recalculate_benchmark_stats():
-    """Recalcular estadísticas de benchmarking desde las respuestas reales"""
+def backfill_dimension_columns(batch_size=500, report_progress=None):
+    """Rellenar las columnas por dimensión y responses_packed de los diagnósticos guardados antes de existir.
+    
+    Procesa lotes de batch_size filas, cada uno en su propia transacción, con
+    FOR UPDATE SKIP LOCKED para no bloquear a los guardados concurrentes. Las
+    filas cuyas respuestas no caben en el formato binario quedan con
+    responses_packed NULL y el JSON; al resto se les borra el JSON. Se avanza
+    por id para no volver a leerlas.
+    """
     conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor = conn.cursor()
     
     try:
-        # Obtener todos los diagnósticos completos
-        cursor.execute("""
-            SELECT id, user_id, responses
-            FROM diagnostics
-            WHERE responses IS NOT NULL
-        """)
+        cursor.execute(f'SELECT COUNT(*) FROM diagnostics WHERE {BACKFILL_PENDING_SQL}')
+        pending = cursor.fetchone()[0]
+        conn.commit()
         
-        diagnostics = cursor.fetchall()
+        updated = 0
+        last_id = 0
+        while True:
+            cursor.execute(f'''
+                SELECT id, responses FROM diagnostics
+                WHERE {BACKFILL_PENDING_SQL} AND id > %s
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ''', (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            
+            values = []
+            scores = score_batch(responses for _, responses in rows)
+            for (diagnostic_id, responses), scored in zip(rows, scores):
+                values.append((diagnostic_id, scored.answered_count, *_responses_params(responses),
+                               *[scored.dimension_scores.get(name) for name in DIMENSION_COLUMNS]))
+            execute_values(cursor, f'''
+                UPDATE diagnostics d
+                SET answered_count = v.answered_count,
+                    responses = v.responses,
+                    responses_packed = v.responses_packed,
+                    catalog_version = {CURRENT_VERSION},
+                    {', '.join(f'{name} = v.{name}' for name in DIMENSION_COLUMNS)}
+                FROM (VALUES %s) AS v(id, answered_count, responses, responses_packed,
+                                      {', '.join(DIMENSION_COLUMNS)})
+                WHERE d.id = v.id
+            ''', values, template='(%s, %s::smallint, %s::jsonb, %s::bytea' + ', %s::float8' * len(DIMENSION_COLUMNS) + ')')
+            conn.commit()
+            last_id = rows[-1][0]
+            
+            updated += len(rows)
+            if report_progress and pending:
+                report_progress(min(updated / pending, 1.0), f'{updated}/{pending} diagnósticos')
         
-        if not diagnostics:
+        cursor.close()
+        conn.close()
+        return {
+            'success': True,
+            'message': f'{updated} diagnósticos actualizados',
+            'updated': updated
+        }
+        
+    except Exception as e:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        print(f"Error rellenando columnas por dimensión: {e}")
+        return {
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }
+
+def rebuild_benchmark_with_cursor(cursor):
+    """Rebuild aggregates and histograms from diagnostics and publish them.
+    
+    Runs inside the caller's transaction. Returns the dimension stats read
+    (fetch_dimension_stats); with no diagnostics, nothing is replaced.
+    """
+    # Bloquear agregados antes de leer para no perder deltas concurrentes
+    lock_benchmark_aggregates(cursor)
+    
+    if BENCHMARK_BACKEND == 'numpy':
+        from .benchmark_numpy import ResponseMatrix
+        matrix = ResponseMatrix.load(cursor)
+        stats = matrix.dimension_stats()
+    else:
+        matrix = None
+        stats = fetch_dimension_stats(cursor)
+    if not stats['total_diagnostics']:
+        return stats
+    
+    # Reemplazar agregados y publicar benchmark_stats
+    totals = {
+        name: (dim['sum'], dim['sum_squares'], dim['count'])
+        for name, dim in stats['dimensions'].items()
+    }
+    replace_benchmark_aggregates(cursor, totals)
+    if matrix is not None:
+        replace_histograms(cursor, matrix.histogram_rows())
+    else:
+        rebuild_histograms(cursor)
+    publish_benchmark_stats_with_cursor(cursor)
+    return stats
+
+def recalculate_benchmark_stats():
+    """Reconstrucción completa del benchmark desde las respuestas reales.
+    
+    Reparación solo para administradores: el guardado normal mantiene los
+    agregados de forma incremental. La agregación se ejecuta en PostgreSQL, o
+    en memoria con NumPy si BENCHMARK_BACKEND=numpy.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        stats = rebuild_benchmark_with_cursor(cursor)
+        total = stats['total_diagnostics']
+        
+        if not total:
+            conn.rollback()
             cursor.close()
             conn.close()
             return {
@@ -509,54 +1264,15 @@ def recalculate_benchmark_stats():
                 'message': 'No hay diagnósticos para calcular benchmark'
             }
         
-        # Calcular promedios por dimensión
-        dimension_scores = defaultdict(list)
-        
-        for diag in diagnostics:
-            responses = diag['responses']
-            
-            # Agrupar respuestas por dimensión
-            dimension_responses = defaultdict(list)
-            
-            for key, value in responses.items():
-                dim_id = extract_dimension_from_key(key)
-                if dim_id and dim_id in DIMENSION_MAPPING:
-                    dimension_responses[dim_id].append(value)
-            
-            # Calcular promedio por dimensión para este diagnóstico
-            for dim_id, values in dimension_responses.items():
-                if values:
-                    avg = sum(values) / len(values)
-                    dimension_scores[DIMENSION_MAPPING[dim_id]].append(avg)
-        
-        # Actualizar benchmark_stats
-        for dim_name, scores in dimension_scores.items():
-            if scores:
-                global_avg = sum(scores) / len(scores)
-                
-                # Primero intentar actualizar
-                cursor.execute("""
-                    UPDATE benchmark_stats 
-                    SET avg_score = %s, total_diagnostics = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE dimension = %s
-                """, (global_avg, len(scores), dim_name))
-                
-                # Si no se actualizó ninguna fila, insertar
-                if cursor.rowcount == 0:
-                    cursor.execute("""
-                        INSERT INTO benchmark_stats (dimension, avg_score, total_diagnostics, updated_at)
-                        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-                    """, (dim_name, global_avg, len(scores)))
-        
         conn.commit()
         cursor.close()
         conn.close()
         
         return {
             'success': True,
-            'message': f'Benchmark recalculado con {len(diagnostics)} diagnósticos',
-            'total_diagnostics': len(diagnostics),
-            'dimensions_updated': len(dimension_scores)
+            'message': f'Benchmark recalculado con {total} diagnósticos',
+            'total_diagnostics': total,
+            'dimensions_updated': len(stats['dimensions'])
         }
         
     except Exception as e:
@@ -0,0 +1,315 @@
+"""
+Pool de conexiones PostgreSQL compartido por todo el proceso.
+
+Todas las rutas de acceso a datos (database_pg, save_progress, registro de
+usuarios) piden sus conexiones aquí en lugar de abrir una nueva con
+psycopg2.connect() en cada llamada. La conexión devuelta se usa igual que una
+conexión normal de psycopg2: al llamar a close() vuelve al pool en lugar de
+cerrarse.
+
+Configuración por variables de entorno:
+    DB_POOL_MIN            conexiones abiertas al crear el pool (default 1)
+    DB_POOL_MAX            máximo de conexiones simultáneas (default 10)
+    DB_POOL_TIMEOUT        segundos máximos esperando una conexión libre (default 30)
+    DB_POOL_MAX_LIFETIME   segundos antes de reciclar una conexión (default 1800)
+    DB_POOL_MAX_IDLE       segundos de inactividad tras los que se verifica
+                           la conexión con SELECT 1 al entregarla (default 60)
+"""
+import os
+import threading
+import time
+import weakref
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeout(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera"""
+
+
+class PooledConnection:
+    """Envoltura de una conexión psycopg2 que vuelve al pool al cerrarse.
+
+    `generation` es la del pool al entregarla: tras un fork el pool del hijo
+    cambia de generación y la conexión heredada no vuelve a su lista.
+    """
+
+    def __init__(self, pool, conn, generation):
+        self._pool = pool
+        self._conn = conn
+        self._generation = generation
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn, self._generation)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._connection().cursor(*args, **kwargs)
+        # Cada cursor mantiene viva la envoltura: __del__ no devuelve la
+        # conexión al pool mientras quede un cursor que la use
+        weakref.finalize(cursor, _keep_alive, self)
+        return cursor
+
+    def _connection(self):
+        if self._conn is None:
+            raise psycopg2.InterfaceError('connection already returned to pool')
+        return self._conn
+
+    def __enter__(self):
+        # Igual que `with conn:` de psycopg2: commit o rollback al salir,
+        # sin cerrar (ni devolver) la conexión
+        self._connection().__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._connection().__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    @property
+    def raw(self):
+        """Conexión psycopg2 subyacente"""
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._connection(), name)
+
+    def __del__(self):
+        # Si el llamador olvidó cerrar, devolver la conexión igualmente
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _keep_alive(connection):
+    """Referencia de un cursor a su PooledConnection (ver PooledConnection.cursor)"""
+
+
+class ConnectionPool:
+    """Pool thread-safe y fork-safe de conexiones PostgreSQL"""
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=30.0,
+                 max_lifetime=1800.0, max_idle=60.0):
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError('DB pool size must satisfy 0 <= min <= max and max >= 1')
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self._reset()
+
+    def _reset(self, prewarm=True):
+        self._pid = os.getpid()
+        self._generation = getattr(self, '_generation', 0) + 1
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []          # [(conn, created_at, last_used)]
+        self._created = {}       # id(conn) -> created_at
+        self._in_use = 0
+        # Conexiones heredadas de un fork: se conservan sin cerrarlas para
+        # no terminar la sesión que sigue usando el proceso padre
+        self._orphans = getattr(self, '_orphans', [])
+        self._stats = {
+            'checkouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'health_check_failures': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+        if not prewarm:
+            return
+        for _ in range(self.minconn):
+            try:
+                conn = self._new_connection()
+            except psycopg2.Error as e:
+                print(f"[DB-POOL] No se pudo precalentar conexión: {e}")
+                break
+            now = time.monotonic()
+            self._idle.append((conn, now, now))
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            self._orphans.extend(c for c, _, _ in self._idle)
+            self._reset(prewarm=False)
+
+    def _new_connection(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created[id(conn)] = time.monotonic()
+            self._stats['connections_created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _check_health(self, conn, created_at, last_used):
+        """Devuelve None si la conexión es utilizable, o el contador a incrementar"""
+        now = time.monotonic()
+        if conn.closed:
+            return 'health_check_failures'
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return 'connections_recycled'
+        if self.max_idle is not None and now - last_used > self.max_idle:
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT 1')
+                cursor.close()
+                conn.rollback()
+            except psycopg2.Error:
+                return 'health_check_failures'
+        return None
+
+    def getconn(self):
+        """Obtener una conexión del pool (bloquea hasta `timeout` segundos)"""
+        self._check_fork()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            candidate = None
+            with self._cond:
+                while not self._idle and self._in_use >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f'No free database connection after {self.timeout}s')
+                    self._cond.wait(remaining)
+                # Reservar el hueco antes de soltar el lock
+                self._in_use += 1
+                if self._idle:
+                    candidate = self._idle.pop()
+
+            if candidate is None:
+                break
+            conn, created_at, last_used = candidate
+            failure = self._check_health(conn, created_at, last_used)
+            if failure is None:
+                self._record_checkout(start)
+                return PooledConnection(self, conn, self._generation)
+            with self._cond:
+                self._stats[failure] += 1
+                self._discard(conn)
+                self._in_use -= 1
+
+        try:
+            conn = self._new_connection()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        self._record_checkout(start)
+        return PooledConnection(self, conn, self._generation)
+
+    def _record_checkout(self, start):
+        waited = time.monotonic() - start
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            if waited > self._stats['wait_time_max']:
+                self._stats['wait_time_max'] = waited
+
+    def release(self, conn, generation):
+        """Devolver una conexión al pool, descartando transacciones abiertas.
+
+        Una conexión de otra generación (entregada antes de un fork) no cuenta
+        en _in_use de este pool: se guarda como huérfana sin cerrarla.
+        """
+        self._check_fork()
+        if generation != self._generation:
+            self._orphans.append(conn)
+            return
+        healthy = not conn.closed
+        if healthy:
+            try:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    healthy = False
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                healthy = False
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                created_at = self._created.get(id(conn), time.monotonic())
+                self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+
+    def stats(self):
+        """Contadores del pool para monitorización"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._in_use
+            stats['min_size'] = self.minconn
+            stats['max_size'] = self.maxconn
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = stats['wait_time_total'] / checkouts if checkouts else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool del proceso, creado perezosamente a partir de DATABASE_URL"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                dsn = os.getenv('DATABASE_URL')
+                if not dsn:
+                    raise ValueError("DATABASE_URL environment variable is required")
+                _pool = ConnectionPool(
+                    dsn,
+                    minconn=int(os.getenv('DB_POOL_MIN', '1')),
+                    maxconn=int(os.getenv('DB_POOL_MAX', '10')),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+                    max_idle=float(os.getenv('DB_POOL_MAX_IDLE', '60')),
+                )
+    return _pool
+
+
+def get_connection():
+    """Obtener una conexión del pool; close() la devuelve al pool"""
+    return get_pool().getconn()
+
+
+def get_pool_stats():
+    """Estadísticas del pool, o None si aún no se ha creado"""
+    if _pool is None:
+        return None
+    return _pool.stats()
+
+
+def _after_fork_in_child():
+    global _pool_lock
+    _pool_lock = threading.Lock()
+    if _pool is not None:
+        _pool._check_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,204 @@
+"""
+Historial append-only de los diagnósticos.
+
+diagnostics sigue teniendo una fila por usuario con la última versión (es el
+puntero que lee get_user_diagnostic con una búsqueda por user_id). Cada
+guardado añade además una fila a diagnostic_versions con su revisión:
+
+    snapshot  las respuestas completas, cada HISTORY_SNAPSHOT_INTERVAL
+              revisiones (y siempre en la primera), en responses_packed con
+              su catalog_version como en diagnostics (JSON si no caben)
+    delta     solo las respuestas que cambiaron y las claves que se quitaron
+              respecto a la revisión anterior
+
+La fila de historial se inserta desde un CTE del mismo statement que guarda el
+diagnóstico, así que el autoguardado no hace ninguna ida y vuelta más; el
+delta se calcula dentro de PostgreSQL. Reconstruir una revisión lee la última
+copia completa anterior y como mucho HISTORY_SNAPSHOT_INTERVAL - 1 deltas.
+
+Configuración por variables de entorno:
+    HISTORY_SNAPSHOT_INTERVAL  revisiones entre copias completas (default 20)
+"""
+import os
+
+from psycopg2.extras import RealDictCursor
+
+from .db_pool import get_connection
+from .response_codec import responses_json_sql, stored_responses
+
+SNAPSHOT_INTERVAL = max(1, int(os.getenv('HISTORY_SNAPSHOT_INTERVAL', '20')))
+
+# Columnas que el CTE del guardado debe devolver para append_version_sql
+RETURNING_SQL = ('id, revision, history_snapshot_revision, responses, responses_packed, catalog_version, '
+                 'score, level, answered_count')
+
+
+def create_history_table(cursor):
+    # Revisión de la última copia completa de cada diagnóstico (0: ninguna aún)
+    cursor.execute('''
+        ALTER TABLE diagnostics
+        ADD COLUMN IF NOT EXISTS history_snapshot_revision INTEGER NOT NULL DEFAULT 0
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS diagnostic_versions (
+            diagnostic_id INTEGER NOT NULL REFERENCES diagnostics(id) ON DELETE CASCADE,
+            revision INTEGER NOT NULL,
+            is_snapshot BOOLEAN NOT NULL,
+            -- Copias completas en el formato binario de diagnostics; responses
+            -- queda para los deltas y para las copias que no caben en el formato
+            responses_packed BYTEA,
+            catalog_version SMALLINT,
+            responses JSONB,
+            removed_keys TEXT[],
+            score FLOAT,
+            level VARCHAR(50),
+            answered_count SMALLINT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (diagnostic_id, revision)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS diagnostic_versions_snapshots
+        ON diagnostic_versions (diagnostic_id, revision) WHERE is_snapshot
+    ''')
+
+
+def next_snapshot_revision_sql(table):
+    """Valor de history_snapshot_revision para la revisión que se va a escribir"""
+    return f'''CASE WHEN {table}.history_snapshot_revision = 0
+                      OR {table}.revision + 1 - {table}.history_snapshot_revision >= {SNAPSHOT_INTERVAL}
+                 THEN {table}.revision + 1
+                 ELSE {table}.history_snapshot_revision END'''
+
+
+def delta_sql(new, old):
+    """Respuestas de `new` que no están o son distintas en `old` (jsonb)"""
+    return f'''(SELECT jsonb_object_agg(n.key, n.value)
+                FROM jsonb_each({new}) AS n
+                WHERE ({old} -> n.key) IS DISTINCT FROM n.value)'''
+
+
+def removed_sql(new, old):
+    """Claves de `old` que ya no están en `new` (text[])"""
+    return f'''ARRAY(SELECT k FROM jsonb_object_keys({old}) AS k WHERE NOT {new} ? k)'''
+
+
+def append_version_sql(source, saved, old=None, delta=None):
+    """INSERT de una versión por fila guardada, para usar como CTE.
+
+    source es la cláusula FROM, saved el alias con RETURNING_SQL y old la
+    expresión jsonb con las respuestas anteriores (responses_json_sql);
+    delta sustituye al cálculo desde old cuando ya se conocen los cambios
+    (guardado por deltas). El SQL no lleva llaves: algunas sentencias se
+    completan después con .format().
+    """
+    # Las respuestas guardadas como jsonb, decodificadas una vez por fila
+    new = 'saved_document.document'
+    source = f'{source} CROSS JOIN LATERAL (SELECT {responses_json_sql(saved)} AS document) AS saved_document'
+    # Copia completa cuando toca o si alguna versión no es un objeto JSON
+    if delta is None:
+        is_snapshot = (f"({saved}.revision = {saved}.history_snapshot_revision "
+                       f"OR jsonb_typeof({new}) IS DISTINCT FROM 'object' "
+                       f"OR jsonb_typeof({old}) IS DISTINCT FROM 'object')")
+        delta = delta_sql(new, old)
+        removed = f'CASE WHEN {is_snapshot} THEN NULL ELSE NULLIF({removed_sql(new, old)}, ARRAY[]::text[]) END'
+    else:
+        is_snapshot = f'({saved}.revision = {saved}.history_snapshot_revision)'
+        removed = 'NULL'
+    return f'''
+        INSERT INTO diagnostic_versions (diagnostic_id, revision, is_snapshot, responses,
+                                         responses_packed, catalog_version,
+                                         removed_keys, score, level, answered_count)
+        SELECT {saved}.id, {saved}.revision, {is_snapshot},
+               CASE WHEN NOT {is_snapshot} THEN COALESCE({delta}, jsonb_build_object())
+                    WHEN {saved}.responses_packed IS NULL THEN COALESCE({new}, 'null'::jsonb) END,
+               CASE WHEN {is_snapshot} THEN {saved}.responses_packed END,
+               {saved}.catalog_version,
+               {removed},
+               {saved}.score, {saved}.level, {saved}.answered_count
+        FROM {source}
+    '''
+
+
+# ==================== LECTURA ====================
+
+def get_diagnostic_id(user_id):
+    """Id del diagnóstico de un usuario (uno por usuario), o None"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT id FROM diagnostics WHERE user_id = %s', (user_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_diagnostic_history(diagnostic_id, limit=200):
+    """Revisiones de un diagnóstico (sin respuestas), de la más reciente a la más antigua"""
+    conn = get_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        cursor.execute('''
+            SELECT revision, is_snapshot, score, level, answered_count, created_at
+            FROM diagnostic_versions
+            WHERE diagnostic_id = %s
+            ORDER BY revision DESC
+            LIMIT %s
+        ''', (diagnostic_id, limit))
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_diagnostic_version(diagnostic_id, revision):
+    """Reconstruir las respuestas de una revisión: última copia completa + deltas.
+
+    Devuelve None si la revisión no está en el historial (p. ej. anterior a él).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT revision, is_snapshot, responses, responses_packed, catalog_version,
+                   removed_keys, score, level, answered_count, created_at
+            FROM diagnostic_versions
+            WHERE diagnostic_id = %(id)s
+              AND revision <= %(revision)s
+              AND revision >= (
+                  SELECT MAX(revision) FROM diagnostic_versions
+                  WHERE diagnostic_id = %(id)s AND is_snapshot AND revision <= %(revision)s
+              )
+            ORDER BY revision
+        ''', {'id': diagnostic_id, 'revision': revision})
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not rows or rows[-1][0] != revision:
+        return None
+
+    responses = None
+    for _, is_snapshot, stored, packed, catalog_version, removed_keys, *_ in rows:
+        if is_snapshot:
+            responses = stored_responses(packed, stored, catalog_version)
+        else:
+            responses = {**responses, **stored}
+            for key in removed_keys or ():
+                responses.pop(key, None)
+
+    *_, score, level, answered_count, created_at = rows[-1]
+    return {
+        'revision': revision,
+        'responses': responses,
+        'score': score,
+        'level': level,
+        'answered_count': answered_count,
+        'created_at': created_at
+    }
@@ -0,0 +1,195 @@
+"""
+Exportación de todos los diagnósticos con los datos de la empresa y cada respuesta.
+
+Los diagnósticos se leen con un cursor de servidor (named cursor) de
+EXPORT_ITERSIZE en EXPORT_ITERSIZE filas y se escriben según llegan, en
+trozos de unos EXPORT_CHUNK_BYTES, así que la memoria no depende del número
+de filas. Formatos:
+
+    csv     una fila por diagnóstico, con los datos de la empresa, las
+            puntuaciones y una columna por pregunta del catálogo actual
+            (vacía si no se contestó). Los textos que empiezan por =, +, -
+            o @ llevan delante un apóstrofo para que Excel no los evalúe
+            como fórmulas (los datos de empresa los escriben los clientes)
+    ndjson  un objeto JSON por línea, con las respuestas como diccionario
+            (incluidas las claves que no están en el catálogo)
+
+Opcionalmente comprimido con gzip, también en streaming.
+
+Desde el panel: GET /api/admin/diagnostics/export?format=csv|ndjson&gzip=1
+
+Desde la línea de comandos:
+
+    python -m src.export [--format csv|ndjson] [--gzip] [-o archivo]
+
+Configuración por variables de entorno:
+    EXPORT_ITERSIZE     filas por lectura del cursor de servidor (default 2000)
+    EXPORT_CHUNK_BYTES  tamaño aproximado de cada trozo escrito (default 65536)
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zlib
+
+from .db_pool import get_connection
+from .question_catalog import CURRENT_VERSION, DIMENSION_COLUMNS, QUESTION_IDS, get_catalog
+from .response_codec import decode_responses
+
+EXPORT_ITERSIZE = int(os.getenv('EXPORT_ITERSIZE', '2000'))
+EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', '65536'))
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Columnas de datos antes de las respuestas (mismo orden que EXPORT_SQL)
+METADATA_COLUMNS = [
+    'diagnostic_id', 'username', 'company_name', 'industry', 'company_size',
+    'score', 'level', 'answered_count', 'completed_at', 'catalog_version',
+    *DIMENSION_COLUMNS
+]
+CATALOG_VERSION_INDEX = METADATA_COLUMNS.index('catalog_version')
+
+# Inicio de celda que una hoja de cálculo interpreta como fórmula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Los bytes van directos a las columnas si son del catálogo actual; el resto
+# de filas se decodifica con su versión o desde el JSON
+EXPORT_SQL = f'''
+    SELECT d.id, u.username, u.company_name, u.industry, u.company_size,
+           d.score, d.level, d.answered_count, d.completed_at, d.catalog_version,
+           {', '.join(f'd.{name}' for name in DIMENSION_COLUMNS)},
+           d.responses_packed,
+           CASE WHEN d.responses_packed IS NULL THEN d.responses::text END
+    FROM diagnostics d
+    JOIN users u ON u.id = d.user_id
+    ORDER BY d.id
+'''
+
+
+def _responses(catalog_version, packed, responses_json):
+    """Diccionario de respuestas de una fila"""
+    if packed is not None:
+        return decode_responses(packed, get_catalog(catalog_version))
+    responses = json.loads(responses_json) if responses_json else {}
+    return responses if isinstance(responses, dict) else {}
+
+
+def _csv_answers(catalog_version, packed, responses_json):
+    """Respuestas en el orden de QUESTION_IDS ('' sin contestar)"""
+    if packed is not None and catalog_version == CURRENT_VERSION:
+        # Una posición por pregunta: sin pasar por el diccionario
+        return [value or '' for value in bytes(packed)]
+    responses = _responses(catalog_version, packed, responses_json)
+    return [responses.get(question_id, '') for question_id in QUESTION_IDS]
+
+
+def spreadsheet_safe(values):
+    """Valores de una fila CSV con los textos que parecen fórmulas neutralizados"""
+    return [
+        "'" + value if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) else value
+        for value in values
+    ]
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(METADATA_COLUMNS + QUESTION_IDS)
+    for row in rows:
+        *metadata, packed, responses_json = row
+        writer.writerow(spreadsheet_safe(metadata) + _csv_answers(metadata[CATALOG_VERSION_INDEX], packed, responses_json))
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows):
+    pending = []
+    size = 0
+    for row in rows:
+        *metadata, packed, responses_json = row
+        document = dict(zip(METADATA_COLUMNS, metadata))
+        document['completed_at'] = document['completed_at'] and document['completed_at'].isoformat()
+        document['responses'] = _responses(metadata[CATALOG_VERSION_INDEX], packed, responses_json)
+        line = json.dumps(document, ensure_ascii=False) + '\n'
+        pending.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield ''.join(pending)
+            pending, size = [], 0
+    yield ''.join(pending)
+
+
+def export_diagnostics(fmt='csv'):
+    """Generador de trozos de texto con todos los diagnósticos en `fmt`.
+
+    La conexión se devuelve al pool al terminar o al cerrar el generador
+    (p. ej. si el cliente corta la descarga).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Formato de exportación desconocido: {fmt}')
+
+    conn = get_connection()
+    cursor = conn.cursor(name='export_diagnostics')
+    cursor.itersize = EXPORT_ITERSIZE
+
+    try:
+        cursor.execute(EXPORT_SQL)
+        chunks = _csv_chunks(cursor) if fmt == 'csv' else _ndjson_chunks(cursor)
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+    finally:
+        cursor.close()
+        conn.rollback()
+        conn.close()
+
+
+def encode_chunks(chunks, compress=False):
+    """Trozos de texto a bytes UTF-8, comprimidos con gzip en streaming si compress"""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    # wbits=31: formato gzip (cabecera y CRC), no zlib
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_filename(fmt, compress=False):
+    return f"diagnosticos.{FORMATS[fmt][1]}{'.gz' if compress else ''}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.export', description='Exportar los diagnósticos')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--gzip', action='store_true', help='comprimir con gzip')
+    parser.add_argument('-o', '--output', help='archivo de salida (por defecto, la salida estándar)')
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        for data in encode_chunks(export_diagnostics(args.format), args.gzip):
+            output.write(data)
+            written += len(data)
+    finally:
+        if args.output:
+            output.close()
+    print(f"[EXPORT] {written} bytes escritos", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
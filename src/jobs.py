@@ -0,0 +1,312 @@
+"""
+Cola de trabajos en segundo plano respaldada por PostgreSQL.
+
+Los trabajos se guardan en la tabla jobs. Un índice único parcial garantiza un
+solo trabajo pendiente por tipo, así que las peticiones repetidas (por ejemplo,
+varios clientes que terminan el cuestionario en pocos segundos) se fusionan en
+un único trabajo. Los ejecutores reclaman trabajos con FOR UPDATE SKIP LOCKED,
+por lo que pueden convivir varios (un hilo por worker de gunicorn, o procesos
+independientes) sin ejecutar dos veces el mismo trabajo.
+
+Modos (variable de entorno JOB_RUNNER):
+    inprocess  un hilo en cada worker web (por defecto)
+    external   el web solo encola; los trabajos los ejecuta
+               `python -m src.jobs` como proceso aparte
+"""
+import os
+import sys
+import threading
+import traceback
+
+import psycopg2.extras
+from psycopg2.extras import RealDictCursor
+
+from .db_pool import get_connection
+from .single_flight import single_flight
+
+# Segundos sin actualizar tras los que un trabajo en ejecución se da por perdido
+STALE_JOB_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '900'))
+# Mientras corre, el ejecutor renueva updated_at cada HEARTBEAT_SECONDS aunque
+# el handler no informe de su progreso
+HEARTBEAT_SECONDS = max(1.0, STALE_JOB_SECONDS / 3)
+POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '5'))
+
+# True en el worker independiente (`python -m src.jobs`): no atiende peticiones
+# en otros hilos, así que sus trabajos pueden repartirse en procesos
+STANDALONE_RUNNER = False
+
+
+def create_jobs_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id SERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            payload JSONB,
+            progress FLOAT NOT NULL DEFAULT 0,
+            message TEXT,
+            result JSONB,
+            requested_count INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    # Un solo trabajo pendiente por tipo: las nuevas peticiones se fusionan en él
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS jobs_one_pending_per_kind
+        ON jobs (kind) WHERE status = 'pending'
+    ''')
+
+
+# ==================== HANDLERS ====================
+
+def _benchmark_publish(payload, report_progress):
+    from .benchmark_aggregates import publish_benchmark_stats
+    return publish_benchmark_stats()
+
+
+def _benchmark_rebuild(payload, report_progress):
+    from .database_pg import recalculate_benchmark_stats
+    # Si otro worker ya está reconstruyendo, esperar y reutilizar su resultado
+    return single_flight('benchmark_rebuild', recalculate_benchmark_stats)
+
+
+def _diagnostic_backfill(payload, report_progress):
+    from .database_pg import backfill_dimension_columns
+    return single_flight('diagnostic_backfill',
+                         lambda: backfill_dimension_columns(report_progress=report_progress))
+
+
+def _diagnostic_rescore(payload, report_progress):
+    from .rescoring import RESCORE_WORKERS, rescore_diagnostics
+    workers = RESCORE_WORKERS if STANDALONE_RUNNER else 1
+    return single_flight('diagnostic_rescore',
+                         lambda: rescore_diagnostics(workers=workers, report_progress=report_progress))
+
+
+# kind -> handler(payload, report_progress) que devuelve un dict con 'success'
+JOB_HANDLERS = {
+    'benchmark_publish': _benchmark_publish,
+    'benchmark_rebuild': _benchmark_rebuild,
+    'diagnostic_backfill': _diagnostic_backfill,
+    'diagnostic_rescore': _diagnostic_rescore,
+}
+
+
+# ==================== COLA ====================
+
+_wakeup = threading.Event()
+
+
+def enqueue_job(kind, payload=None):
+    """Encolar un trabajo, fusionándolo con el pendiente del mismo tipo si existe.
+
+    Devuelve el id del trabajo pendiente.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            INSERT INTO jobs (kind, payload)
+            VALUES (%s, %s)
+            ON CONFLICT (kind) WHERE status = 'pending' DO UPDATE
+            SET requested_count = jobs.requested_count + 1,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING id
+        ''', (kind, psycopg2.extras.Json(payload) if payload is not None else None))
+        job_id = cursor.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id):
+    """Estado de un trabajo"""
+    conn = get_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        cursor.execute('''
+            SELECT id, kind, status, payload, progress, message, result, requested_count,
+                   created_at, started_at, updated_at, finished_at
+            FROM jobs
+            WHERE id = %s
+        ''', (job_id,))
+        job = cursor.fetchone()
+        return dict(job) if job else None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_recent_jobs(kind=None, limit=20):
+    """Últimos trabajos, opcionalmente de un tipo"""
+    conn = get_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        cursor.execute('''
+            SELECT id, kind, status, progress, message, requested_count,
+                   created_at, started_at, finished_at
+            FROM jobs
+            WHERE %(kind)s IS NULL OR kind = %(kind)s
+            ORDER BY id DESC
+            LIMIT %(limit)s
+        ''', {'kind': kind, 'limit': limit})
+        return [dict(job) for job in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _claim_next_job():
+    """Reclamar el trabajo pendiente más antiguo, o None"""
+    conn = get_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        # Trabajos cuyo ejecutor murió sin terminarlos
+        cursor.execute('''
+            UPDATE jobs
+            SET status = 'failed', message = 'Trabajo abandonado por su ejecutor',
+                finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'running'
+              AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+        ''', (STALE_JOB_SECONDS,))
+        cursor.execute('''
+            UPDATE jobs
+            SET status = 'running', started_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE status = 'pending' AND kind = ANY(%s)
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, kind, payload
+        ''', (list(JOB_HANDLERS),))
+        job = cursor.fetchone()
+        conn.commit()
+        return dict(job) if job else None
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _update_job(job_id, finished=False, **fields):
+    """Actualizar campos de un trabajo y su updated_at (sin campos: solo el latido)"""
+    assignments = [f'{name} = %s' for name in fields]
+    if finished:
+        assignments.append('finished_at = CURRENT_TIMESTAMP')
+    assignments.append('updated_at = CURRENT_TIMESTAMP')
+    values = [psycopg2.extras.Json(v) if name == 'result' else v for name, v in fields.items()]
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f'''
+            UPDATE jobs
+            SET {', '.join(assignments)}
+            WHERE id = %s
+        ''', values + [job_id])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _heartbeat(job_id, stop):
+    """Renovar updated_at hasta que se active stop, para que no se dé por perdido"""
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            _update_job(job_id)
+        except Exception as e:
+            print(f"[JOBS] Error renovando el trabajo {job_id}: {e}")
+
+
+def run_job(job):
+    """Ejecutar un trabajo ya reclamado y registrar su resultado"""
+    job_id = job['id']
+
+    def report_progress(progress, message=None):
+        _update_job(job_id, progress=progress, message=message)
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job_id, stop),
+                                 name=f'job-{job_id}-heartbeat', daemon=True)
+    heartbeat.start()
+    try:
+        try:
+            result = JOB_HANDLERS[job['kind']](job['payload'], report_progress) or {}
+        finally:
+            stop.set()
+            heartbeat.join()
+        status = 'done' if result.get('success', True) else 'failed'
+        _update_job(job_id, finished=True, status=status, progress=1.0,
+                    message=result.get('message'), result=result)
+    except Exception as e:
+        traceback.print_exc()
+        _update_job(job_id, finished=True, status='failed', message=str(e))
+
+
+def run_pending_jobs():
+    """Ejecutar trabajos hasta vaciar la cola; devuelve cuántos se ejecutaron"""
+    count = 0
+    while True:
+        job = _claim_next_job()
+        if job is None:
+            return count
+        print(f"[JOBS] Ejecutando trabajo {job['id']} ({job['kind']})")
+        run_job(job)
+        count += 1
+
+
+def _runner_loop():
+    while True:
+        try:
+            run_pending_jobs()
+        except Exception as e:
+            print(f"[JOBS] Error en el ejecutor de trabajos: {e}")
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+
+
+_runner_thread = None
+
+
+def start_job_runner():
+    """Arrancar el ejecutor en un hilo de este proceso (una vez por proceso)"""
+    global _runner_thread
+    if _runner_thread is not None and _runner_thread.is_alive():
+        return
+    _runner_thread = threading.Thread(target=_runner_loop, name='job-runner', daemon=True)
+    _runner_thread.start()
+
+
+if __name__ == '__main__':
+    # Worker independiente: python -m src.jobs [--once]
+    STANDALONE_RUNNER = True
+    if '--once' in sys.argv:
+        print(f"[JOBS] {run_pending_jobs()} trabajos ejecutados")
+    else:
+        print("[JOBS] Worker de trabajos iniciado")
+        _runner_loop()
@@ -6,9 +6,12 @@ from datetime import timedelta
 from .routes.admin_sqlite import admin_bp
 from .routes.user_sqlite import user_bp
 from .routes.save_progress import save_progress_bp
+from .routes.catalog import catalog_bp
 
-# Importar inicialización de base de datos PostgreSQL
-from .database_pg import init_db
+# El esquema lo crea `python -m src.migrations` (Procfile), no los workers
+from .migrations import pending_migrations
+from .jobs import start_job_runner
+from .write_behind import start_write_behind
 
 def create_app():
     app = Flask(__name__)
@@ -32,13 +35,24 @@ def create_app():
         from flask import session
         session.permanent = True
     
-    # Inicializar base de datos PostgreSQL
-    init_db()
+    # Sin DDL al arrancar: solo avisar si el despliegue no migró
+    pending = pending_migrations()
+    if pending:
+        print(f"[MIGRATIONS] Aviso: {len(pending)} migraciones pendientes; "
+              f"ejecuta `python -m src.migrations`")
+    
+    # Ejecutor de trabajos en segundo plano (JOB_RUNNER=external para usar `python -m src.jobs`)
+    if os.environ.get('JOB_RUNNER', 'inprocess') == 'inprocess':
+        start_job_runner()
+    
+    # Autoguardado diferido (solo si AUTOSAVE_WRITE_BEHIND=1)
+    start_write_behind()
     
     # Registrar blueprints
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(user_bp, url_prefix='/api/user')
     app.register_blueprint(save_progress_bp)
+    app.register_blueprint(catalog_bp, url_prefix='/api/catalog')
     
     # Servir archivos estáticos del frontend
     @app.route('/')
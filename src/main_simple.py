@@ -6,6 +6,7 @@ from datetime import timedelta
 # Importar las rutas simplificadas
 from src.routes.simple_admin import simple_admin_bp
 from src.routes.simple_user import simple_user_bp
+from src.simple_users import init_admin
 
 def create_app():
     app = Flask(__name__, static_folder='static')
@@ -14,6 +15,9 @@ def create_app():
     app.config['SECRET_KEY'] = 'clientship-cx-diagnostic-2024-super-secret-key'
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
     
+    # Usuario admin (antes se creaba al importar simple_users)
+    init_admin()
+    
     # CORS
     CORS(app, supports_credentials=True, origins=['*'])
     
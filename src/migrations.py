@@ -0,0 +1,368 @@
+"""
+Migraciones del esquema PostgreSQL, una vez por despliegue.
+
+Los workers web no ejecutan DDL al arrancar: el Procfile corre
+`python -m src.migrations` antes de gunicorn. Cada migración de MIGRATIONS se
+aplica una sola vez y queda registrada en schema_migrations con su versión.
+Un advisory lock de sesión serializa a dos despliegues que migren a la vez;
+el segundo espera y encuentra todo aplicado.
+
+Cada migración corre en su propia transacción junto con su registro, así que
+un fallo deja aplicadas las anteriores y se reintenta desde la que falló. Las
+migraciones son idempotentes (IF NOT EXISTS, comprobaciones en el catálogo)
+para que una base de datos creada antes de este runner las pase todas sin
+cambios.
+
+Las marcadas con @non_transactional (índices sobre tablas con tráfico, con
+CREATE INDEX CONCURRENTLY) corren en autocommit: cada sentencia se confirma
+sola y la migración se registra al terminar; si falla a medias se repite
+entera.
+
+En cada ejecución, además:
+    - se registran los catálogos de preguntas (falla si una versión
+      publicada se editó: ver question_catalog)
+    - se encola el backfill si quedan diagnósticos sin columnas por dimensión
+      o con las respuestas aún en JSON
+
+Uso:
+    python -m src.migrations            aplicar las pendientes
+    python -m src.migrations --status   listar aplicadas y pendientes
+"""
+import sys
+import time
+
+from .db_pool import get_connection
+from .benchmark_aggregates import create_benchmark_tables, create_benchmark_delta_table
+from .benchmark_histograms import create_histogram_table
+from .diagnostic_history import create_history_table
+from .jobs import create_jobs_table, enqueue_job
+from .question_catalog import DIMENSION_COLUMNS, register_catalogs
+from .rescoring import create_rescore_table
+from .scoring import LEGACY_LEVELS
+from .search import SEARCH_INDEXES, create_search_column
+from .single_flight import create_single_flight_table
+
+# Advisory lock del runner (7301 diagnósticos, 7302 single flight, 7303 benchmark)
+MIGRATION_LOCK_CLASS = 7304
+
+# Diagnósticos con las respuestas en JSON: guardados antes de las columnas por
+# dimensión o de responses_packed (el backfill los reempaqueta y borra el JSON)
+# o cuyas respuestas no caben en el formato binario
+BACKFILL_PENDING_SQL = 'responses IS NOT NULL'
+
+# Índices secundarios de las consultas calientes, por nombre. authenticate_user
+# y get_user_diagnostic usan las restricciones UNIQUE (username) y
+# UNIQUE (user_id); el listado de usuarios lee primero lo más reciente y el de
+# diagnósticos va por la clave primaria.
+QUERY_INDEXES = {
+    'users_clients_recent': 'ON users (created_at DESC, id DESC) WHERE is_admin = FALSE',
+}
+
+
+# ==================== MIGRACIONES ====================
+
+def non_transactional(migration):
+    """Marcar una migración que no puede correr en una transacción (ver el docstring del módulo)"""
+    migration.transactional = False
+    return migration
+
+
+def create_index_concurrently(cursor, name, definition):
+    """CREATE INDEX CONCURRENTLY: no bloquea las escrituras mientras se construye.
+
+    Si un intento anterior falló, PostgreSQL deja el índice marcado como no
+    válido; se borra y se vuelve a construir.
+    """
+    cursor.execute('SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', (name,))
+    row = cursor.fetchone()
+    if row and row[0]:
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}')
+
+
+def create_base_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(100) NOT NULL,
+            company_name VARCHAR(200) NOT NULL,
+            contact_person VARCHAR(200),
+            email VARCHAR(200),
+            phone VARCHAR(50),
+            industry VARCHAR(100),
+            company_size VARCHAR(50),
+            notes TEXT,
+            is_admin BOOLEAN DEFAULT FALSE,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS diagnostics (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+            responses JSONB,
+            score FLOAT,
+            level VARCHAR(50),
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def cascade_user_diagnostics(cursor):
+    """Borrar un usuario borra sus diagnósticos (antes migrate_cascade_delete.py)"""
+    cursor.execute('''
+        SELECT confdeltype FROM pg_constraint WHERE conname = 'diagnostics_user_id_fkey'
+    ''')
+    row = cursor.fetchone()
+    if row and row[0] == 'c':
+        return
+    cursor.execute('ALTER TABLE diagnostics DROP CONSTRAINT IF EXISTS diagnostics_user_id_fkey')
+    cursor.execute('''
+        ALTER TABLE diagnostics
+        ADD CONSTRAINT diagnostics_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    ''')
+
+
+def ensure_unique_diagnostic_per_user(cursor):
+    """Una fila de diagnóstico por usuario (la necesita el upsert del guardado).
+
+    Conserva la fila más reciente de cada usuario y borra las demás.
+    """
+    cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = 'diagnostics_user_id_key'")
+    if cursor.fetchone():
+        return
+
+    cursor.execute('''
+        DELETE FROM diagnostics
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id
+                    ORDER BY completed_at DESC NULLS LAST, id DESC
+                ) AS rn
+                FROM diagnostics
+                WHERE user_id IS NOT NULL
+            ) ranked
+            WHERE rn > 1
+        )
+    ''')
+    if cursor.rowcount:
+        print(f"[MIGRATIONS] {cursor.rowcount} diagnósticos duplicados eliminados antes de UNIQUE (user_id)")
+
+    cursor.execute('''
+        ALTER TABLE diagnostics
+        ADD CONSTRAINT diagnostics_user_id_key UNIQUE (user_id)
+    ''')
+
+
+def add_dimension_columns(cursor):
+    """Columnas por dimensión, respuestas contestadas y revisión de cada diagnóstico"""
+    columns = ', '.join(
+        f'ADD COLUMN IF NOT EXISTS {name} DOUBLE PRECISION' for name in DIMENSION_COLUMNS
+    )
+    cursor.execute(f'ALTER TABLE diagnostics {columns}, ADD COLUMN IF NOT EXISTS answered_count SMALLINT')
+    # Sube en cada guardado; los guardados por deltas indican sobre qué revisión se aplican
+    cursor.execute('ALTER TABLE diagnostics ADD COLUMN IF NOT EXISTS revision INTEGER NOT NULL DEFAULT 0')
+
+
+def add_packed_responses_column(cursor):
+    """responses_packed: las respuestas en el formato de 69 bytes de response_codec.
+
+    NULL cuando alguna respuesta no cabe en el formato (clave desconocida,
+    valor no entero); los lectores usan entonces el JSON de responses.
+    """
+    cursor.execute('ALTER TABLE diagnostics ADD COLUMN IF NOT EXISTS responses_packed BYTEA')
+    # Filas pendientes de backfill_dimension_columns
+    cursor.execute('DROP INDEX IF EXISTS diagnostics_scores_pending')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS diagnostics_backfill_pending
+        ON diagnostics (id) WHERE {BACKFILL_PENDING_SQL}
+    ''')
+
+
+def add_catalog_version_column(cursor):
+    """Versión del catálogo de preguntas con la que se guardó cada diagnóstico.
+
+    Las filas anteriores al catálogo se contestaron con la versión 1.
+    """
+    cursor.execute('ALTER TABLE diagnostics ADD COLUMN IF NOT EXISTS catalog_version SMALLINT NOT NULL DEFAULT 1')
+
+
+def normalize_levels(cursor):
+    """Reescribir niveles guardados con su forma antigua ('básico' -> 'basico')"""
+    for legacy, level in LEGACY_LEVELS.items():
+        cursor.execute('UPDATE diagnostics SET level = %s WHERE level = %s', (level, legacy))
+
+
+@non_transactional
+def add_query_indexes(cursor):
+    """Índices de QUERY_INDEXES (los comprueba python -m src.query_plans)"""
+    for name, definition in QUERY_INDEXES.items():
+        create_index_concurrently(cursor, name, definition)
+
+
+def create_admin_user(cursor):
+    cursor.execute("SELECT id FROM users WHERE username = 'admin'")
+    if not cursor.fetchone():
+        cursor.execute('''
+            INSERT INTO users (username, password, company_name, is_admin, is_active)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', ('admin', 'clientship2024', 'Clientship', True, True))
+
+
+def listing_sort_keys_not_null(cursor):
+    """users.created_at NOT NULL: es la clave de la paginación del listado de usuarios.
+
+    Las filas sin fecha (no debería haberlas: tiene DEFAULT) se fechan en 1970
+    para que queden al final del listado. Los diagnósticos se paginan por id.
+    """
+    cursor.execute("UPDATE users SET created_at = 'epoch' WHERE created_at IS NULL")
+    cursor.execute('ALTER TABLE users ALTER COLUMN created_at SET NOT NULL')
+
+
+@non_transactional
+def create_admin_search(cursor):
+    """Columna de búsqueda (search.create_search_column) y sus índices"""
+    create_search_column(cursor)
+    for name, definition in SEARCH_INDEXES.items():
+        create_index_concurrently(cursor, name, definition)
+
+
+# (versión, nombre, función). Solo se añaden al final; nunca se editan ni reordenan.
+MIGRATIONS = [
+    (1, 'base_tables', create_base_tables),
+    (2, 'cascade_user_diagnostics', cascade_user_diagnostics),
+    (3, 'unique_diagnostic_per_user', ensure_unique_diagnostic_per_user),
+    (4, 'dimension_columns', add_dimension_columns),
+    (5, 'packed_responses', add_packed_responses_column),
+    (6, 'catalog_version', add_catalog_version_column),
+    (7, 'normalize_levels', normalize_levels),
+    (8, 'benchmark_tables', create_benchmark_tables),
+    (9, 'benchmark_histograms', create_histogram_table),
+    (10, 'jobs', create_jobs_table),
+    (11, 'single_flight', create_single_flight_table),
+    (12, 'rescore_checkpoints', create_rescore_table),
+    (13, 'diagnostic_history', create_history_table),
+    (14, 'query_indexes', add_query_indexes),
+    (15, 'admin_user', create_admin_user),
+    (16, 'listing_sort_keys_not_null', listing_sort_keys_not_null),
+    (17, 'admin_search', create_admin_search),
+    (18, 'benchmark_deltas', create_benchmark_delta_table),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ==================== RUNNER ====================
+
+def create_migrations_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INTEGER
+        )
+    ''')
+
+
+def applied_versions(cursor):
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate():
+    """Aplicar las migraciones pendientes; devuelve los nombres de las aplicadas"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    applied = []
+
+    try:
+        # Un solo runner a la vez; el lock de sesión dura entre transacciones
+        cursor.execute('SELECT pg_advisory_lock(%s, 0)', (MIGRATION_LOCK_CLASS,))
+        create_migrations_table(cursor)
+        conn.commit()
+
+        done = applied_versions(cursor)
+        for version, name, migration in MIGRATIONS:
+            if version in done:
+                continue
+            start = time.monotonic()
+            if getattr(migration, 'transactional', True):
+                migration(cursor)
+            else:
+                conn.commit()
+                conn.raw.autocommit = True
+                try:
+                    migration(cursor)
+                finally:
+                    conn.raw.autocommit = False
+            duration_ms = int((time.monotonic() - start) * 1000)
+            cursor.execute('''
+                INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)
+            ''', (version, name, duration_ms))
+            conn.commit()
+            applied.append(name)
+            print(f"[MIGRATIONS] {version:03d} {name} ({duration_ms} ms)")
+
+        # Versiones nuevas del catálogo; falla si una publicada cambió
+        register_catalogs(cursor)
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM diagnostics WHERE {BACKFILL_PENDING_SQL})')
+        backfill_pending = cursor.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        # Con la conexión rota el unlock también falla (y el lock de sesión se
+        # libera al cerrarse): no debe tapar el error de la migración
+        try:
+            cursor.execute('SELECT pg_advisory_unlock(%s, 0)', (MIGRATION_LOCK_CLASS,))
+            conn.commit()
+        except Exception as e:
+            print(f"Error liberando el lock de migraciones: {e}")
+        cursor.close()
+        conn.close()
+
+    # Filas con las respuestas aún en JSON
+    if backfill_pending:
+        enqueue_job('diagnostic_backfill')
+
+    return applied
+
+
+def pending_migrations():
+    """Migraciones sin aplicar, [(versión, nombre)]; una sola consulta, sin DDL"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        done = applied_versions(cursor) if cursor.fetchone()[0] else set()
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in done]
+
+
+if __name__ == '__main__':
+    if '--status' in sys.argv:
+        pending = pending_migrations()
+        print(f"[MIGRATIONS] Última versión: {LATEST_VERSION}, pendientes: {len(pending)}")
+        for version, name in pending:
+            print(f"  {version:03d} {name}")
+        sys.exit(0)
+
+    start = time.monotonic()
+    try:
+        applied = migrate()
+    except Exception as e:
+        print(f"[MIGRATIONS] Error aplicando migraciones: {e}")
+        sys.exit(1)
+    print(f"[MIGRATIONS] {len(applied)} migraciones aplicadas en {time.monotonic() - start:.2f}s; "
+          f"esquema en la versión {LATEST_VERSION}")
@@ -0,0 +1,92 @@
+"""
+Paginación por cursor (keyset) de los listados del panel de administración.
+
+Cada página se pide con el cursor `next` de la anterior, que codifica la clave
+de orden de su última fila: (fecha, id), o solo el id. La consulta sigue con
+`(fecha, id) < (cursor)` sobre un índice con ese mismo orden, así que cualquier
+página cuesta lo mismo que la primera, a diferencia de OFFSET, que recorre y
+descarta todas las filas anteriores. El id desempata filas con la misma fecha
+para que el orden sea estable. La clave no debe cambiar al editar la fila (una
+fecha que se actualiza movería filas entre páginas ya leídas): usuarios por
+created_at, diagnósticos por id, porque completed_at cambia en cada guardado.
+
+Sin ?limit= ni ?after= el listado se devuelve entero, sin `next`, como antes
+de paginar (es lo que pide el panel actual).
+
+El cursor es opaco para el cliente: JSON en base64 url-safe con el nombre del
+listado, de modo que un cursor de usuarios no sirve para diagnósticos.
+
+El total es aproximado (pg_class.reltuples, que actualizan ANALYZE y
+autovacuum) para no hacer COUNT(*) sobre toda la tabla en cada página.
+
+Configuración por variables de entorno:
+    ADMIN_PAGE_SIZE      filas por página con ?after= y sin ?limit= (default 50)
+    ADMIN_PAGE_SIZE_MAX  máximo permitido en ?limit= (default 500)
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+
+PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', '50'))
+PAGE_SIZE_MAX = int(os.getenv('ADMIN_PAGE_SIZE_MAX', '500'))
+
+
+class InvalidCursor(ValueError):
+    """Cursor de paginación mal formado o de otro listado"""
+
+
+def page_size(limit):
+    """?limit= acotado a [1, PAGE_SIZE_MAX]; None usa PAGE_SIZE"""
+    if limit is None:
+        return PAGE_SIZE
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+
+def encode_cursor(listing, sort_value, row_id):
+    """Cursor opaco para seguir después de la fila (sort_value, row_id); sort_value None si se ordena por id"""
+    sort_value = sort_value.isoformat() if sort_value is not None else None
+    payload = json.dumps([listing, sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(listing, token):
+    """(sort_value, row_id) de un cursor de `listing`; None si no hay cursor"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        name, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursor('Cursor de paginación no válido') from e
+    if name != listing or not isinstance(row_id, int):
+        raise InvalidCursor('Cursor de paginación no válido para este listado')
+    return sort_value, row_id
+
+
+def page_of(rows, limit, listing, sort_key=None):
+    """Recortar las limit + 1 filas leídas: (filas de la página, cursor siguiente o None)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    sort_value = last[sort_key] if sort_key else None
+    return rows, encode_cursor(listing, sort_value, last['id'])
+
+
+def estimated_count(conn, table):
+    """Filas aproximadas de una tabla según las estadísticas del planificador"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', (table,))
+        estimate = cursor.fetchone()[0]
+        if estimate < 0:
+            # Tabla nunca analizada (recién creada): el recuento exacto es barato
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            estimate = cursor.fetchone()[0]
+        return estimate
+    finally:
+        cursor.close()
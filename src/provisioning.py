@@ -0,0 +1,161 @@
+"""
+Alta masiva de clientes desde un CSV (una cohorte de empresas de una vez).
+
+El CSV lleva una fila por empresa con cabecera; solo company_name es
+obligatoria:
+
+    company_name,contact_person,email,phone,industry,company_size,notes
+
+También se aceptan las cabeceras en español (empresa, contacto, telefono,
+industria, tamano, notas) y el separador ';' de Excel en español. Si alguna
+fila no es válida (sin empresa, o un campo más largo que su columna en users)
+no se crea ningún usuario y se devuelven los errores con su número de línea.
+
+Los nombres de usuario de toda la cohorte se resuelven a la vez (ver
+database_pg.assign_usernames) y los usuarios se insertan con execute_values
+en una sola transacción. El resultado es la hoja de credenciales: usuario,
+contraseña y datos de contacto de cada empresa, en el orden del CSV.
+
+Desde el panel: POST /api/admin/users/bulk (archivo 'file' o el CSV como
+body; ?format=csv devuelve la hoja como CSV)
+
+Desde la línea de comandos:
+
+    python -m src.provisioning clientes.csv [-o credenciales.csv]
+
+Configuración por variables de entorno:
+    PROVISION_MAX  empresas máximas por CSV (default 5000)
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+
+from .database_pg import CLIENT_FIELDS, CLIENT_FIELD_LENGTHS, create_users
+from .export import spreadsheet_safe
+
+PROVISION_MAX = int(os.getenv('PROVISION_MAX', '5000'))
+
+# Cabeceras aceptadas -> campo
+HEADER_ALIASES = {
+    **{field: field for field in CLIENT_FIELDS},
+    'empresa': 'company_name',
+    'contacto': 'contact_person',
+    'telefono': 'phone',
+    'teléfono': 'phone',
+    'industria': 'industry',
+    'tamano': 'company_size',
+    'tamaño': 'company_size',
+    'notas': 'notes',
+}
+
+# Columnas de la hoja de credenciales
+CREDENTIAL_COLUMNS = ['username', 'password', 'company_name', 'contact_person', 'email', 'phone']
+
+
+class ProvisioningError(ValueError):
+    """CSV de alta no válido; errors es una lista de {'line', 'message'}"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} errores en el CSV de alta')
+        self.errors = errors
+
+
+def parse_clients_csv(text):
+    """Lista de clientes (dicts con CLIENT_FIELDS) de un CSV; ProvisioningError si no es válido"""
+    text = text.lstrip('\ufeff')
+    first_line = text.split('\n', 1)[0]
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    reader = csv.reader(io.StringIO(text), delimiter=delimiter)
+
+    header = next(reader, None)
+    if not header:
+        raise ProvisioningError([{'line': 1, 'message': 'El CSV está vacío'}])
+    fields = [HEADER_ALIASES.get(name.strip().lower()) for name in header]
+    if 'company_name' not in fields:
+        raise ProvisioningError([{'line': 1, 'message': 'Falta la columna company_name'}])
+    # Dos cabeceras para el mismo campo (email dos veces, empresa y company_name)
+    duplicated = sorted({field for field in fields if field and fields.count(field) > 1})
+    if duplicated:
+        raise ProvisioningError([
+            {'line': 1, 'message': f'Columna repetida: {field}'} for field in duplicated
+        ])
+
+    clients, errors = [], []
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        line = reader.line_num
+        client = {
+            field: value.strip()
+            for field, value in zip(fields, row)
+            if field and value.strip()
+        }
+        if not client.get('company_name'):
+            errors.append({'line': line, 'message': 'El nombre de empresa es obligatorio'})
+            continue
+        too_long = [field for field, value in client.items()
+                    if len(value) > CLIENT_FIELD_LENGTHS.get(field, len(value))]
+        if too_long:
+            errors.extend({
+                'line': line,
+                'message': f'{field} supera los {CLIENT_FIELD_LENGTHS[field]} caracteres'
+            } for field in too_long)
+            continue
+        clients.append(client)
+
+    if not clients and not errors:
+        errors.append({'line': 1, 'message': 'El CSV no tiene ninguna empresa'})
+    if len(clients) > PROVISION_MAX:
+        errors.append({'line': 1, 'message': f'Como máximo {PROVISION_MAX} empresas por CSV'})
+    if errors:
+        raise ProvisioningError(errors)
+    return clients
+
+
+def provision_clients(text):
+    """Crear los usuarios de un CSV: resultado de create_users"""
+    return create_users(parse_clients_csv(text))
+
+
+def credentials_csv(users):
+    """Hoja de credenciales en CSV (con los textos que parecen fórmulas neutralizados)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CREDENTIAL_COLUMNS)
+    for user in users:
+        writer.writerow(spreadsheet_safe([user.get(column) for column in CREDENTIAL_COLUMNS]))
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.provisioning', description='Alta masiva de clientes')
+    parser.add_argument('csv', help='CSV de empresas')
+    parser.add_argument('-o', '--output', help='hoja de credenciales (por defecto, la salida estándar)')
+    args = parser.parse_args(argv)
+
+    with open(args.csv, encoding='utf-8-sig', newline='') as source:
+        text = source.read()
+
+    try:
+        result = provision_clients(text)
+    except ProvisioningError as e:
+        for error in e.errors:
+            print(f"[PROVISION] línea {error['line']}: {error['message']}", file=sys.stderr)
+        sys.exit(1)
+    if not result['success']:
+        print(f"[PROVISION] {result['message']}", file=sys.stderr)
+        sys.exit(1)
+
+    sheet = credentials_csv(result['users'])
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            output.write(sheet)
+    else:
+        sys.stdout.write(sheet)
+    print(f"[PROVISION] {len(result['users'])} usuarios creados", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
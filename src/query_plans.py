@@ -0,0 +1,176 @@
+"""
+Comprobación de los planes de las consultas calientes.
+
+Siembra un conjunto de datos (usuarios con su diagnóstico e historial), hace
+ANALYZE y ejecuta EXPLAIN sobre cada consulta de HOT_QUERIES. Falla si alguna
+recorre users, diagnostics o diagnostic_versions con un Seq Scan, o si falta
+(o no es válido) algún índice de migrations.QUERY_INDEXES. Todo ocurre en
+una transacción que se deshace al terminar: la base de datos no cambia.
+
+Los listados del panel de administración se comprueban con su primera página
+y con una página pedida con cursor, de PLAN_CHECK_PAGE filas.
+
+Uso (contra una base de datos de desarrollo o staging):
+
+    python -m src.query_plans [filas]     código de salida 1 si hay regresión
+
+Configuración por variables de entorno:
+    PLAN_CHECK_ROWS  usuarios sembrados si no se indica [filas] (default 20000)
+    PLAN_CHECK_PAGE  filas de la primera página de los listados (default 50)
+"""
+import json
+import os
+import sys
+from datetime import datetime
+
+from .database_pg import (
+    AUTHENTICATE_USER_SQL, USERS_PAGE_SQL, DIAGNOSTICS_PAGE_SQL, USER_DIAGNOSTIC_SQL,
+    SEARCH_USERS_SQL, SEARCH_DIAGNOSTICS_SQL, USERNAMES_TAKEN_SQL, get_connection
+)
+from .migrations import QUERY_INDEXES
+from .search import like_pattern
+
+PLAN_CHECK_ROWS = int(os.getenv('PLAN_CHECK_ROWS', '20000'))
+PLAN_CHECK_PAGE = int(os.getenv('PLAN_CHECK_PAGE', '50'))
+
+# Tablas que nunca deben recorrerse enteras en una consulta caliente
+CHECKED_TABLES = {'users', 'diagnostics', 'diagnostic_versions'}
+
+def page_params(after_at=None, after_id=None):
+    return {'after_at': after_at, 'after_id': after_id, 'limit': PLAN_CHECK_PAGE + 1}
+
+
+def search_params(term):
+    return {'term': term, 'pattern': like_pattern(term), 'limit': PLAN_CHECK_PAGE}
+
+
+# nombre -> (sql, parámetros a partir del usuario de muestra (user_id, username))
+HOT_QUERIES = {
+    'authenticate_user': (AUTHENTICATE_USER_SQL, lambda user_id, username: (username, 'plancheck')),
+    'register (username)': ('SELECT id FROM users WHERE username = %s',
+                            lambda user_id, username: (username,)),
+    'assign_usernames': (USERNAMES_TAKEN_SQL,
+                         lambda user_id, username: ([username] + [f'{username}{n}' for n in range(100, 300)],)),
+    'get_user_diagnostic': (USER_DIAGNOSTIC_SQL, lambda user_id, username: (user_id,)),
+    'get_users_page': (USERS_PAGE_SQL, lambda user_id, username: page_params()),
+    'get_users_page (cursor)': (USERS_PAGE_SQL,
+                                lambda user_id, username: page_params(datetime.now(), user_id)),
+    'get_diagnostics_page': (DIAGNOSTICS_PAGE_SQL, lambda user_id, username: page_params()),
+    'get_diagnostics_page (cursor)': (DIAGNOSTICS_PAGE_SQL,
+                                      lambda user_id, username: page_params(after_id=user_id)),
+    'search_users': (SEARCH_USERS_SQL, lambda user_id, username: search_params(username)),
+    'search_diagnostics': (SEARCH_DIAGNOSTICS_SQL, lambda user_id, username: search_params(username)),
+    'diagnostic history': ('''
+        SELECT revision, is_snapshot, score, level, answered_count, created_at
+        FROM diagnostic_versions
+        WHERE diagnostic_id = (SELECT id FROM diagnostics WHERE user_id = %s)
+        ORDER BY revision DESC
+        LIMIT 200
+    ''', lambda user_id, username: (user_id,)),
+}
+
+
+def seed(cursor, rows):
+    """Usuarios, diagnósticos y revisiones de prueba; devuelve (user_id, username) de muestra"""
+    cursor.execute('''
+        INSERT INTO users (username, password, company_name, industry, company_size, created_at)
+        SELECT 'plancheck_' || i, 'plancheck', 'Empresa ' || i,
+               (ARRAY['retail', 'banca', 'salud', 'tecnologia'])[1 + i %% 4],
+               (ARRAY['pequena', 'mediana', 'grande'])[1 + i %% 3],
+               CURRENT_TIMESTAMP - make_interval(mins => i)
+        FROM generate_series(1, %s) AS i
+    ''', (rows,))
+    cursor.execute('''
+        INSERT INTO diagnostics (user_id, responses, score, level, answered_count, revision,
+                                 completed_at)
+        SELECT id, '{}'::jsonb, 3.0, 'intermedio', 0, 3, created_at
+        FROM users
+        WHERE username LIKE 'plancheck\\_%'
+    ''')
+    cursor.execute('''
+        INSERT INTO diagnostic_versions (diagnostic_id, revision, is_snapshot, responses)
+        SELECT d.id, r, r = 1, '{}'::jsonb
+        FROM diagnostics d
+        JOIN users u ON u.id = d.user_id AND u.username LIKE 'plancheck\\_%'
+        CROSS JOIN generate_series(1, 3) AS r
+    ''')
+    # Usuario de muestra en mitad del rango sembrado
+    username = f'plancheck_{rows // 2}'
+    cursor.execute('SELECT id FROM users WHERE username = %s', (username,))
+    user_id = cursor.fetchone()[0]
+    cursor.execute('ANALYZE users')
+    cursor.execute('ANALYZE diagnostics')
+    cursor.execute('ANALYZE diagnostic_versions')
+    return user_id, username
+
+
+def plan_nodes(node):
+    """Todos los nodos de un plan de EXPLAIN (FORMAT JSON)"""
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def explain(cursor, sql, params):
+    """(plan raíz, Seq Scans sobre CHECKED_TABLES, índices usados)"""
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]['Plan']
+    nodes = list(plan_nodes(root))
+    seq_scans = sorted({
+        node['Relation Name'] for node in nodes
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in CHECKED_TABLES
+    })
+    indexes = sorted({node['Index Name'] for node in nodes if 'Index Name' in node})
+    return root, seq_scans, indexes
+
+
+def missing_indexes(cursor):
+    """Índices de QUERY_INDEXES que no existen o quedaron inválidos"""
+    cursor.execute('''
+        SELECT c.relname FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = ANY(%s) AND i.indisvalid
+    ''', (list(QUERY_INDEXES),))
+    present = {row[0] for row in cursor.fetchall()}
+    return [name for name in QUERY_INDEXES if name not in present]
+
+
+def check_query_plans(rows=None):
+    """Sembrar, explicar cada consulta caliente y deshacer; devuelve la lista de fallos"""
+    rows = rows or PLAN_CHECK_ROWS
+    conn = get_connection()
+    cursor = conn.cursor()
+    failures = []
+
+    try:
+        for name in missing_indexes(cursor):
+            failures.append(f'falta el índice {name}')
+            print(f"[PLANS] FALTA  índice {name} {QUERY_INDEXES[name]}")
+
+        user_id, username = seed(cursor, rows)
+        print(f"[PLANS] {rows} usuarios sembrados")
+        for name, (sql, params) in HOT_QUERIES.items():
+            root, seq_scans, indexes = explain(cursor, sql, params(user_id, username))
+            if seq_scans:
+                failures.append(f"{name}: Seq Scan sobre {', '.join(seq_scans)}")
+            status = 'FALLO' if seq_scans else 'OK'
+            print(f"[PLANS] {status:<6} {name}: {root['Node Type']}, coste {root['Total Cost']}, "
+                  f"índices: {', '.join(indexes) or '-'}")
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check_query_plans(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    if failures:
+        print(f"[PLANS] {len(failures)} regresiones de plan:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("[PLANS] Todas las consultas calientes usan índices")
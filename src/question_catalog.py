@@ -0,0 +1,150 @@
+"""
+Catálogo versionado de preguntas del cuestionario.
+
+Cada versión vive en catalogs/questions_v<N>.json, con la misma estructura que
+usa el frontend (dimensiones → atributos → preguntas), y no se edita una vez
+desplegada: un cambio en el cuestionario es un archivo nuevo y CURRENT_VERSION
+pasa a apuntar a él.
+
+Al importar se precalculan para cada versión la posición de cada pregunta
+('1.1.1' …), la dimensión de cada posición y el rango de posiciones de cada
+dimensión. Puntuar es así una consulta a un dict o a un array, sin partir
+claves con split('.').
+
+diagnostics.catalog_version guarda la versión con la que se escribió cada
+diagnóstico (las posiciones de responses_packed dependen de ella).
+question_catalogs registra la huella de cada versión desplegada: si el archivo
+de una versión cambia después, la migración falla en lugar de mezclar en el
+benchmark respuestas de cuestionarios distintos.
+"""
+import hashlib
+import json
+import os
+import re
+
+CATALOG_DIR = os.path.join(os.path.dirname(__file__), 'catalogs')
+CURRENT_VERSION = 1
+
+_FILENAME = re.compile(r'^questions_v(\d+)\.json$')
+
+
+class CatalogMismatch(Exception):
+    """El archivo de una versión ya desplegada no coincide con su huella registrada"""
+
+
+class QuestionCatalog:
+    """Una versión del cuestionario con sus índices precalculados"""
+
+    def __init__(self, document):
+        self.version = document['version']
+        self.document = document
+        # '1' -> 'estrategia_cx'; los nombres son las columnas de diagnostics
+        self.dimension_mapping = {}
+        # Preguntas ordenadas por dimensión y, para cada posición, el índice de su dimensión
+        self.question_ids = []
+        self.question_dimensions = []
+        # 'estrategia_cx' -> (inicio, fin) de sus posiciones
+        self.dimension_slices = {}
+
+        for dimension_position, dimension in enumerate(document['dimensions']):
+            self.dimension_mapping[str(dimension['id'])] = dimension['key']
+            start = len(self.question_ids)
+            for attribute in dimension['attributes']:
+                for number in range(1, len(attribute['questions']) + 1):
+                    self.question_ids.append(f"{attribute['id']}.{number}")
+                    self.question_dimensions.append(dimension_position)
+            self.dimension_slices[dimension['key']] = (start, len(self.question_ids))
+
+        self.dimension_columns = list(self.dimension_mapping.values())
+        self.dimension_starts = [start for start, _ in self.dimension_slices.values()]
+        self.question_index = {
+            question_id: position for position, question_id in enumerate(self.question_ids)
+        }
+        self.question_dimension = {
+            question_id: self.dimension_columns[self.question_dimensions[position]]
+            for position, question_id in enumerate(self.question_ids)
+        }
+
+        canonical = json.dumps(document, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        self.fingerprint = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+        self.etag = f'catalog-v{self.version}-{self.fingerprint[:16]}'
+        self.body = json.dumps(self.payload(), ensure_ascii=False)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def dimension_for_key(self, key):
+        """Columna de la dimensión de una clave de respuesta, o None"""
+        name = self.question_dimension.get(key)
+        if name is None and isinstance(key, str) and '.' in key:
+            # Claves fuera del catálogo: se agrupan por su prefijo, como hasta ahora
+            name = self.dimension_mapping.get(key.split('.', 1)[0])
+        return name
+
+    def payload(self):
+        """Documento que sirve /api/catalog: el del archivo más la lista plana de preguntas"""
+        payload = dict(self.document)
+        payload['questions'] = [
+            {
+                'id': question_id,
+                'position': position,
+                'dimension': self.dimension_columns[self.question_dimensions[position]]
+            }
+            for position, question_id in enumerate(self.question_ids)
+        ]
+        return payload
+
+
+def _load_catalogs():
+    catalogs = {}
+    for name in sorted(os.listdir(CATALOG_DIR)):
+        match = _FILENAME.match(name)
+        if not match:
+            continue
+        with open(os.path.join(CATALOG_DIR, name), encoding='utf-8') as f:
+            catalog = QuestionCatalog(json.load(f))
+        if catalog.version != int(match.group(1)):
+            raise ValueError(f'{name} declara la versión {catalog.version}')
+        catalogs[catalog.version] = catalog
+    return catalogs
+
+
+CATALOGS = _load_catalogs()
+CATALOG = CATALOGS[CURRENT_VERSION]
+
+# Atajos de la versión actual
+DIMENSION_MAPPING = CATALOG.dimension_mapping
+DIMENSION_COLUMNS = CATALOG.dimension_columns
+QUESTION_IDS = CATALOG.question_ids
+QUESTION_INDEX = CATALOG.question_index
+
+
+def get_catalog(version=None):
+    """Catálogo de una versión (la actual por defecto), o None si no existe"""
+    return CATALOGS.get(CURRENT_VERSION if version is None else version)
+
+
+def register_catalogs(cursor):
+    """Registrar la huella de cada versión y comprobar que ninguna cambió desde que se desplegó"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS question_catalogs (
+            version INTEGER PRIMARY KEY,
+            fingerprint VARCHAR(64) NOT NULL,
+            question_count INTEGER NOT NULL,
+            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for catalog in CATALOGS.values():
+        cursor.execute('''
+            INSERT INTO question_catalogs (version, fingerprint, question_count)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (version) DO NOTHING
+        ''', (catalog.version, catalog.fingerprint, len(catalog)))
+    cursor.execute('SELECT version, fingerprint FROM question_catalogs')
+    for version, fingerprint in cursor.fetchall():
+        catalog = CATALOGS.get(version)
+        if catalog is not None and catalog.fingerprint != fingerprint:
+            raise CatalogMismatch(
+                f'El cuestionario v{version} cambió después de desplegarse; '
+                f'crea catalogs/questions_v{max(CATALOGS) + 1}.json en su lugar'
+            )
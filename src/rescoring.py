@@ -0,0 +1,263 @@
+"""
+Re-puntuación de todos los diagnósticos guardados.
+
+Cuando cambian las reglas de puntuación (niveles, catálogo de preguntas), el
+trabajo 'diagnostic_rescore' vuelve a calcular score, level, answered_count y
+las columnas por dimensión de cada diagnóstico:
+
+    1. Lee los diagnósticos por id con un cursor de servidor (named cursor),
+       de RESCORE_CHUNK_SIZE en RESCORE_CHUNK_SIZE filas.
+    2. Puntúa cada bloque (scoring.score_batch). El ejecutor independiente
+       (`python -m src.jobs`) lo reparte a un pool de RESCORE_WORKERS
+       procesos, creados desde un forkserver y no desde el proceso del
+       trabajo (que tiene el hilo de latido de jobs); el ejecutor en un hilo
+       de gunicorn puntúa en el mismo proceso.
+    3. Escribe cada bloque con un único UPDATE ... FROM (VALUES ...) y, en la
+       misma transacción, el id hasta el que se llegó (rescore_checkpoints).
+
+Si el proceso muere, la siguiente ejecución con las mismas reglas continúa
+desde el último bloque escrito. Una fila guardada mientras tanto (revision
+distinta) no se toca: ese guardado ya la puntuó con las reglas actuales. Las
+filas guardadas con un catálogo anterior se re-empaquetan con el actual.
+
+Agregados e histogramas se calcularon con las puntuaciones anteriores: el
+último bloque, el cierre del checkpoint y su reconstrucción van en la misma
+transacción, así que el benchmark publicado pasa de las puntuaciones viejas a
+las nuevas de una vez. Mientras dura la re-puntuación (o si se interrumpe,
+hasta que se reanude) el benchmark sigue siendo el anterior.
+
+Configuración por variables de entorno:
+    RESCORE_WORKERS     procesos del pool en el ejecutor independiente
+                        (default: CPUs; 1 = sin pool)
+    RESCORE_CHUNK_SIZE  diagnósticos por bloque (default 2000)
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from .db_pool import get_connection
+from .question_catalog import CATALOG, CURRENT_VERSION, DIMENSION_COLUMNS
+from .response_codec import HAS_RESPONSES_SQL, pack_responses, responses_json_sql
+from .scoring import MATURITY_LEVELS, LOWEST_LEVEL, score_batch
+
+RESCORE_WORKERS = int(os.getenv('RESCORE_WORKERS', '0')) or os.cpu_count() or 1
+RESCORE_CHUNK_SIZE = int(os.getenv('RESCORE_CHUNK_SIZE', '2000'))
+
+# Los bytes solo se puntúan directamente si están en las posiciones del catálogo actual
+READ_SQL = f'''
+    SELECT id, revision,
+           CASE WHEN catalog_version = {CURRENT_VERSION} THEN responses_packed END,
+           CASE WHEN responses_packed IS NULL OR catalog_version <> {CURRENT_VERSION}
+                THEN {responses_json_sql('diagnostics')}::text END
+    FROM diagnostics
+    WHERE {HAS_RESPONSES_SQL} AND id > %s
+    ORDER BY id
+'''
+
+WRITE_SQL = f'''
+    UPDATE diagnostics d
+    SET score = v.score,
+        level = v.level,
+        answered_count = v.answered_count,
+        {', '.join(f'{name} = v.{name}' for name in DIMENSION_COLUMNS)},
+        responses = CASE WHEN v.repack THEN v.responses END,
+        responses_packed = CASE WHEN v.repack THEN v.responses_packed ELSE d.responses_packed END,
+        catalog_version = {CURRENT_VERSION}
+    FROM (VALUES %s) AS v(id, revision, score, level, answered_count,
+                          {', '.join(DIMENSION_COLUMNS)}, responses, responses_packed, repack)
+    WHERE d.id = v.id AND d.revision = v.revision
+'''
+
+WRITE_TEMPLATE = (
+    '(%s, %s, %s::float8, %s, %s::smallint'
+    + ', %s::float8' * len(DIMENSION_COLUMNS)
+    + ', %s::jsonb, %s::bytea, %s)'
+)
+
+
+def create_rescore_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rescore_checkpoints (
+            id SERIAL PRIMARY KEY,
+            rules VARCHAR(64) NOT NULL,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            rescored INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+
+
+def rules_fingerprint():
+    """Huella de las reglas de puntuación: solo se reanuda un checkpoint con las mismas"""
+    rules = json.dumps([CATALOG.fingerprint, MATURITY_LEVELS, LOWEST_LEVEL])
+    return hashlib.sha256(rules.encode('utf-8')).hexdigest()
+
+
+def _score_chunk(rows):
+    """Puntuar un bloque (en el proceso del trabajo o en uno del pool): filas listas para WRITE_SQL"""
+    documents = [packed if packed is not None else json.loads(responses)
+                 for _, _, packed, responses in rows]
+    values = []
+    scores = score_batch(documents)
+    for (diagnostic_id, revision, packed, _), document, scored in zip(rows, documents, scores):
+        # Re-empaquetar con el catálogo actual; el JSON solo queda si no cabe
+        repack = packed is None
+        repacked = pack_responses(document) if repack else None
+        values.append((
+            diagnostic_id, revision, scored.score, scored.level, scored.answered_count,
+            *[scored.dimension_scores.get(name) for name in DIMENSION_COLUMNS],
+            json.dumps(document) if repack and repacked is None else None,
+            repacked,
+            repack
+        ))
+    return values
+
+
+def _open_checkpoint(cursor, rules):
+    """Checkpoint sin terminar con estas reglas, o uno nuevo: (id, last_id, rescored, skipped)"""
+    cursor.execute('''
+        SELECT id, last_id, rescored, skipped FROM rescore_checkpoints
+        WHERE rules = %s AND finished_at IS NULL
+        ORDER BY id DESC
+        LIMIT 1
+        FOR UPDATE
+    ''', (rules,))
+    row = cursor.fetchone()
+    if row:
+        return row
+    cursor.execute('''
+        INSERT INTO rescore_checkpoints (rules) VALUES (%s)
+        RETURNING id, last_id, rescored, skipped
+    ''', (rules,))
+    return cursor.fetchone()
+
+
+def _write_chunk(cursor, checkpoint_id, values):
+    """Escribir un bloque y avanzar el checkpoint (en la transacción del llamador)"""
+    rows = [
+        value[:-2] + (psycopg2.Binary(value[-2]) if value[-2] is not None else None, value[-1])
+        for value in values
+    ]
+    execute_values(cursor, WRITE_SQL, rows, template=WRITE_TEMPLATE, page_size=len(rows))
+    written = cursor.rowcount
+    cursor.execute('''
+        UPDATE rescore_checkpoints
+        SET last_id = %s, rescored = rescored + %s, skipped = skipped + %s,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    ''', (values[-1][0], written, len(values) - written, checkpoint_id))
+    return written
+
+
+def rescore_diagnostics(chunk_size=None, workers=1, report_progress=None):
+    """Re-puntuar todos los diagnósticos con las reglas actuales, reanudando si se interrumpió.
+
+    workers > 1 puntúa en un pool de procesos; lo usa el ejecutor de
+    `python -m src.jobs`, el de los workers web puntúa en su propio proceso.
+    """
+    from .database_pg import rebuild_benchmark_with_cursor
+
+    chunk_size = chunk_size or RESCORE_CHUNK_SIZE
+    rules = rules_fingerprint()
+    start = time.monotonic()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    reader_conn = None
+    pool = None
+
+    try:
+        checkpoint_id, last_id, rescored, skipped = _open_checkpoint(cursor, rules)
+        cursor.execute(f'SELECT COUNT(*) FROM diagnostics WHERE {HAS_RESPONSES_SQL} AND id > %s',
+                       (last_id,))
+        remaining = cursor.fetchone()[0]
+        conn.commit()
+        if last_id:
+            print(f"[RESCORE] Reanudando desde el diagnóstico {last_id} ({remaining} pendientes)")
+
+        # Lectura en streaming por una conexión aparte; las escrituras van por `conn`
+        reader_conn = get_connection()
+        reader = reader_conn.cursor(name='rescore_diagnostics')
+        reader.itersize = chunk_size
+        reader.execute(READ_SQL, (last_id,))
+
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context('forkserver'))
+        in_flight = deque()
+        processed = 0
+
+        def write_next(commit=True):
+            nonlocal rescored, skipped, processed
+            values = in_flight.popleft()
+            values = values.result() if pool else values
+            written = _write_chunk(cursor, checkpoint_id, values)
+            rescored += written
+            skipped += len(values) - written
+            processed += len(values)
+            if commit:
+                conn.commit()
+                if report_progress and remaining:
+                    report_progress(min(processed / remaining, 1.0),
+                                    f'{processed}/{remaining} diagnósticos')
+
+        while True:
+            rows = reader.fetchmany(chunk_size)
+            if not rows:
+                break
+            if pool:
+                # memoryview no se puede enviar al pool
+                rows = [(diagnostic_id, revision, bytes(packed) if packed is not None else None, responses)
+                        for diagnostic_id, revision, packed, responses in rows]
+            in_flight.append(pool.submit(_score_chunk, rows) if pool else _score_chunk(rows))
+            # Dos bloques por proceso en vuelo: el pool no se queda sin trabajo
+            # mientras se escribe, y la memoria no crece con la tabla
+            if len(in_flight) > 2 * workers:
+                write_next()
+        while len(in_flight) > 1:
+            write_next()
+
+        # Último bloque, fin del checkpoint y benchmark con las nuevas puntuaciones
+        if in_flight:
+            write_next(commit=False)
+        cursor.execute('''
+            UPDATE rescore_checkpoints SET finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s
+        ''', (checkpoint_id,))
+        rebuild_benchmark_with_cursor(cursor)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error re-puntuando diagnósticos: {e}")
+        return {
+            'success': False,
+            'message': f'Error: {str(e)}'
+        }
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        if reader_conn is not None:
+            reader_conn.rollback()
+            reader_conn.close()
+        cursor.close()
+        conn.close()
+
+    elapsed = time.monotonic() - start
+    return {
+        'success': True,
+        'message': f'{rescored} diagnósticos re-puntuados en {elapsed:.1f}s',
+        'rescored': rescored,
+        'skipped': skipped,
+        'seconds': round(elapsed, 2)
+    }
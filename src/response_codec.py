@@ -0,0 +1,128 @@
+"""
+Codificación binaria compacta de las respuestas del cuestionario.
+
+Con un catálogo de preguntas fijo (question_catalog), las 69 respuestas caben
+en 69 bytes: el byte i es la respuesta a la pregunta de la posición i y 0
+significa sin responder. Es el formato de diagnostics.responses_packed (BYTEA);
+las posiciones son las de la versión del catálogo con la que se guardó la fila
+(diagnostics.catalog_version).
+
+Las lecturas para puntuar decodifican directamente a enteros (o a una matriz
+NumPy, ver benchmark_numpy) sin pasar por JSON; el diccionario
+{'1.1.1': 4, ...} solo se construye en el borde de la API. La columna JSON
+diagnostics.responses solo se escribe cuando las respuestas no caben en el
+formato (claves fuera del catálogo o valores que no son enteros 1..255); las
+filas anteriores conservan las dos columnas hasta que se vuelven a guardar o
+las reempaqueta el backfill.
+"""
+from .question_catalog import CATALOG, CATALOGS, get_catalog
+
+PACKED_SIZE = len(CATALOG)
+UNANSWERED = 0
+MAX_ANSWER = 255
+
+
+def _position(key, value, catalog=CATALOG):
+    """Posición de la pregunta en el vector, o None si la respuesta no cabe en el formato"""
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_ANSWER:
+        return None
+    return catalog.question_index.get(key)
+
+
+def encode_responses(responses, catalog=CATALOG):
+    """Empaquetar {'1.1.1': 4, ...} en un byte por pregunta del catálogo.
+
+    Devuelve (bytes, claves no codificables): las claves fuera del catálogo o
+    con valores que no son enteros 1..255 no caben en el formato.
+    """
+    packed = bytearray(len(catalog))
+    skipped = []
+    for key, value in responses.items():
+        position = _position(key, value, catalog)
+        if position is None:
+            skipped.append(key)
+            continue
+        packed[position] = value
+    return bytes(packed), skipped
+
+
+def pack_responses(responses, catalog=CATALOG):
+    """Bytes para responses_packed, o None si alguna respuesta no cabe en el formato"""
+    if not isinstance(responses, dict):
+        return None
+    packed, skipped = encode_responses(responses, catalog)
+    return None if skipped else packed
+
+
+def decode_responses(packed, catalog=CATALOG):
+    """Diccionario {'1.1.1': 4, ...} (solo para respuestas de la API)"""
+    question_ids = catalog.question_ids
+    return {
+        question_ids[position]: value
+        for position, value in enumerate(bytes(packed))
+        if value != UNANSWERED
+    }
+
+
+def stored_responses(packed, responses, catalog_version):
+    """Respuestas de una fila de diagnostics: decodificadas si hay bytes, si no el JSON"""
+    if packed is None:
+        return responses
+    return decode_responses(packed, get_catalog(catalog_version))
+
+
+def packed_scores(packed, catalog=CATALOG):
+    """Puntuación media, promedios por dimensión y número de respuestas sin decodificar a dict"""
+    packed = bytes(packed)
+    averages = {}
+    total = answered = 0
+    for name, (start, end) in catalog.dimension_slices.items():
+        values = [value for value in packed[start:end] if value != UNANSWERED]
+        if values:
+            averages[name] = sum(values) / len(values)
+            total += sum(values)
+            answered += len(values)
+    score = total / answered if answered else None
+    return score, averages, answered
+
+
+def set_bytes_sql(column, changes, catalog=CATALOG):
+    """Expresión SQL que escribe en `column` las respuestas de changes con set_byte.
+
+    Posiciones y valores son enteros validados, así que van literales en el
+    SQL. Devuelve None si algún cambio no cabe en el formato.
+    """
+    sql = column
+    for key, value in changes.items():
+        position = _position(key, value, catalog)
+        if position is None:
+            return None
+        sql = f'set_byte({sql}, {position:d}, {value:d})'
+    return sql
+
+
+# Filas de diagnostics que tienen respuestas guardadas en alguno de los formatos
+HAS_RESPONSES_SQL = '(responses_packed IS NOT NULL OR responses IS NOT NULL)'
+
+
+def responses_json_sql(table):
+    """Expresión jsonb con las respuestas de una fila de `table` (diagnostics o un CTE
+    con sus columnas responses, responses_packed y catalog_version).
+
+    Decodifica los bytes con las posiciones de su versión del catálogo, o
+    devuelve el JSON si la fila no tiene bytes. Para lecturas que necesitan el
+    documento dentro de PostgreSQL (historial, guardado por deltas); el SQL no
+    lleva llaves porque algunas sentencias se completan con .format().
+    """
+    by_version = []
+    for version, catalog in sorted(CATALOGS.items()):
+        ids = ', '.join("'" + key.replace("'", "''") + "'" for key in catalog.question_ids)
+        by_version.append(
+            f"WHEN {version:d} THEN ("
+            f"SELECT COALESCE(jsonb_object_agg(q.id, get_byte({table}.responses_packed, q.pos::int - 1)), "
+            f"jsonb_build_object()) "
+            f"FROM unnest(ARRAY[{ids}]::text[]) WITH ORDINALITY AS q(id, pos) "
+            f"WHERE get_byte({table}.responses_packed, q.pos::int - 1) <> {UNANSWERED:d})"
+        )
+    return (f"(CASE WHEN {table}.responses_packed IS NULL THEN {table}.responses "
+            f"ELSE CASE {table}.catalog_version {' '.join(by_version)} END END)")
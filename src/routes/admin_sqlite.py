@@ -1,12 +1,28 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, current_app
 from ..database_pg import (
-    authenticate_user, create_user, get_all_users, 
-    get_all_diagnostics, get_stats, delete_user,
-    reset_password, delete_diagnostic, calculate_benchmark
+    authenticate_user, create_user, get_users_page,
+    get_diagnostics_page, search_users, search_diagnostics, delete_user, delete_users,
+    delete_diagnostics, BULK_DELETE_MAX,
+    reset_password, delete_diagnostic
 )
+from ..dashboard import get_dashboard_stats
+from ..export import FORMATS as EXPORT_FORMATS, export_diagnostics, encode_chunks, export_filename
+from ..db_pool import get_pool_stats
+from ..diagnostic_history import get_diagnostic_history, get_diagnostic_version
+from ..pagination import InvalidCursor
+from ..provisioning import ProvisioningError, provision_clients, credentials_csv
+from ..jobs import enqueue_job, get_job, get_recent_jobs
+from ..single_flight import get_single_flight_stats
+from ..write_behind import get_write_behind_stats
 
 admin_bp = Blueprint('admin', __name__)
 
+def require_admin():
+    """Respuesta 401 si no hay sesión de administrador, o None"""
+    if not session.get('admin_logged_in'):
+        return jsonify({'error': 'No autorizado'}), 401
+    return None
+
 @admin_bp.route('/login', methods=['POST'])
 def admin_login():
     """Login de administrador"""
@@ -41,22 +57,73 @@ def admin_logout():
     session.pop('admin_username', None)
     return jsonify({'success': True, 'message': 'Logout exitoso'})
 
+@admin_bp.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    """Estadísticas del dashboard (una consulta, en caché unos segundos)"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        return jsonify({'stats': get_dashboard_stats()})
+    except Exception as e:
+        print(f"Error getting dashboard: {e}")
+        return jsonify({'error': 'Error obteniendo estadísticas'}), 500
+
 @admin_bp.route('/stats', methods=['GET'])
-def get_dashboard_stats():
-    """Obtener estadísticas del dashboard"""
+def get_stats():
+    """Obtener estadísticas del dashboard (mismo contenido que /dashboard, sin envolver)"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
     try:
-        stats = get_stats()
-        return jsonify(stats)
+        return jsonify(get_dashboard_stats())
     except Exception as e:
         print(f"Error getting stats: {e}")
         return jsonify({'error': 'Error obteniendo estadísticas'}), 500
 
+@admin_bp.route('/db-pool', methods=['GET'])
+def get_db_pool_stats():
+    """Obtener métricas del pool de conexiones de este worker"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    stats = get_pool_stats()
+    if stats is None:
+        return jsonify({'error': 'Pool no inicializado'}), 404
+    return jsonify(stats)
+
+@admin_bp.route('/single-flight', methods=['GET'])
+def get_single_flight_metrics():
+    """Tiempos de espera y retención de los locks de mantenimiento en este worker"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    return jsonify(get_single_flight_stats())
+
+@admin_bp.route('/write-behind', methods=['GET'])
+def get_write_behind_metrics():
+    """Métricas del autoguardado diferido en este worker"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    return jsonify(get_write_behind_stats())
+
 @admin_bp.route('/users', methods=['GET'])
 def list_users():
-    """Listar todos los usuarios"""
+    """Listar usuarios (todos, o por páginas con ?limit= y ?after=<cursor next>) o buscarlos (?search=)"""
     try:
-        users = get_all_users()
-        return jsonify({'users': users})
+        limit = request.args.get('limit', type=int)
+        search = request.args.get('search', '').strip()
+        if search:
+            return jsonify(search_users(search, limit))
+        return jsonify(get_users_page(limit, request.args.get('after')))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error listing users: {e}")
         return jsonify({'error': 'Error obteniendo usuarios'}), 500
@@ -94,11 +161,89 @@ def create_new_user():
         print(f"Error creating user: {e}")
         return jsonify({'error': 'Error interno'}), 500
 
+@admin_bp.route('/users/bulk', methods=['POST'])
+def bulk_create_users():
+    """Alta masiva desde un CSV (archivo 'file' o body). ?format=csv devuelve la hoja de credenciales"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        upload = request.files.get('file')
+        raw = upload.read() if upload else request.get_data()
+        try:
+            text = raw.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return jsonify({'error': 'El CSV debe estar en UTF-8'}), 400
+        
+        try:
+            result = provision_clients(text)
+        except ProvisioningError as e:
+            return jsonify({'error': str(e), 'errors': e.errors}), 400
+        if not result['success']:
+            return jsonify({'error': result['message']}), 500
+        
+        if request.args.get('format') == 'csv':
+            response = current_app.response_class(credentials_csv(result['users']), mimetype='text/csv')
+            response.headers['Content-Disposition'] = 'attachment; filename="credenciales.csv"'
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        return jsonify({
+            'success': True,
+            'message': f"{len(result['users'])} usuarios creados",
+            'created_count': len(result['users']),
+            'users': result['users']
+        })
+    except Exception as e:
+        print(f"Error bulk creating users: {e}")
+        return jsonify({'error': 'Error interno'}), 500
+
+def _bulk_ids(field):
+    """Lista de ids enteros del campo `field` del body, o (None, error)"""
+    ids = (request.get_json(silent=True) or {}).get(field)
+    if not isinstance(ids, list) or not ids:
+        return None, f'{field} debe ser una lista de ids no vacía'
+    if not all(isinstance(item_id, int) and not isinstance(item_id, bool) for item_id in ids):
+        return None, f'{field} solo puede contener ids enteros'
+    if len(ids) > BULK_DELETE_MAX:
+        return None, f'Como máximo {BULK_DELETE_MAX} ids por petición'
+    return ids, None
+
+def _enqueue_benchmark_publish():
+    """Una publicación del benchmark para todo el borrado (suma los deltas que restan lo borrado)"""
+    try:
+        enqueue_job('benchmark_publish')
+    except Exception as e:
+        print(f"Error enqueuing benchmark publish: {e}")
+
+@admin_bp.route('/users/bulk-delete', methods=['POST'])
+def bulk_delete_users():
+    """Eliminar varios usuarios y sus diagnósticos. Body: {"user_ids": [...]}"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        user_ids, error = _bulk_ids('user_ids')
+        if error:
+            return jsonify({'error': error}), 400
+        
+        result = delete_users(user_ids)
+        if not result['success']:
+            return jsonify({'error': result['message']}), 500
+        if result['deleted_diagnostics']:
+            _enqueue_benchmark_publish()
+        return jsonify(result)
+    except Exception as e:
+        print(f"Error bulk deleting users: {e}")
+        return jsonify({'error': 'Error interno'}), 500
+
 @admin_bp.route('/users/<username>', methods=['DELETE'])
 def delete_user_endpoint(username):
     """Eliminar usuario"""
     try:
         if delete_user(username):
+            _enqueue_benchmark_publish()
             return jsonify({'success': True, 'message': 'Usuario eliminado'})
         else:
             return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -125,19 +270,68 @@ def reset_user_password(username):
 
 @admin_bp.route('/diagnostics', methods=['GET'])
 def list_diagnostics():
-    """Listar todos los diagnósticos"""
+    """Listar diagnósticos (todos, o por páginas con ?limit= y ?after=<cursor next>) o buscarlos (?search=)"""
     try:
-        diagnostics = get_all_diagnostics()
-        return jsonify({'diagnostics': diagnostics})
+        limit = request.args.get('limit', type=int)
+        search = request.args.get('search', '').strip()
+        if search:
+            return jsonify(search_diagnostics(search, limit))
+        return jsonify(get_diagnostics_page(limit, request.args.get('after')))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error listing diagnostics: {e}")
         return jsonify({'error': 'Error obteniendo diagnósticos'}), 500
 
+@admin_bp.route('/diagnostics/export', methods=['GET'])
+def export_diagnostics_endpoint():
+    """Descargar todos los diagnósticos en streaming (?format=csv|ndjson, ?gzip=1)"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Formato no soportado: {fmt}'}), 400
+    compress = request.args.get('gzip') in ('1', 'true')
+    
+    mimetype = 'application/gzip' if compress else EXPORT_FORMATS[fmt][0]
+    response = current_app.response_class(
+        encode_chunks(export_diagnostics(fmt), compress),
+        mimetype=mimetype
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@admin_bp.route('/diagnostics/bulk-delete', methods=['POST'])
+def bulk_delete_diagnostics():
+    """Eliminar varios diagnósticos. Body: {"diagnostic_ids": [...]}"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        diagnostic_ids, error = _bulk_ids('diagnostic_ids')
+        if error:
+            return jsonify({'error': error}), 400
+        
+        result = delete_diagnostics(diagnostic_ids)
+        if not result['success']:
+            return jsonify({'error': result['message']}), 500
+        if result['deleted_count']:
+            _enqueue_benchmark_publish()
+        return jsonify(result)
+    except Exception as e:
+        print(f"Error bulk deleting diagnostics: {e}")
+        return jsonify({'error': 'Error interno'}), 500
+
 @admin_bp.route('/diagnostics/<int:diagnostic_id>', methods=['DELETE'])
 def delete_diagnostic_endpoint(diagnostic_id):
     """Eliminar diagnóstico"""
     try:
         if delete_diagnostic(diagnostic_id):
+            _enqueue_benchmark_publish()
             return jsonify({'success': True, 'message': 'Diagnóstico eliminado'})
         else:
             return jsonify({'error': 'Diagnóstico no encontrado'}), 404
@@ -145,19 +339,117 @@ def delete_diagnostic_endpoint(diagnostic_id):
         print(f"Error deleting diagnostic: {e}")
         return jsonify({'error': 'Error interno'}), 500
 
+@admin_bp.route('/diagnostics/<int:diagnostic_id>/versions', methods=['GET'])
+def list_diagnostic_versions(diagnostic_id):
+    """Listar las revisiones guardadas de un diagnóstico"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        limit = min(request.args.get('limit', 200, type=int), 1000)
+        return jsonify({'versions': get_diagnostic_history(diagnostic_id, limit)})
+    except Exception as e:
+        print(f"Error listing diagnostic versions: {e}")
+        return jsonify({'error': 'Error obteniendo historial'}), 500
+
+@admin_bp.route('/diagnostics/<int:diagnostic_id>/versions/<int:revision>', methods=['GET'])
+def get_diagnostic_version_endpoint(diagnostic_id, revision):
+    """Reconstruir una revisión de un diagnóstico"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        version = get_diagnostic_version(diagnostic_id, revision)
+        if version is None:
+            return jsonify({'error': 'Versión no encontrada'}), 404
+        return jsonify({'version': version})
+    except Exception as e:
+        print(f"Error getting diagnostic version: {e}")
+        return jsonify({'error': 'Error obteniendo versión'}), 500
+
 @admin_bp.route('/recalculate-benchmark', methods=['POST'])
 def recalculate_benchmark_route():
-    """Recalcular estadísticas de benchmark"""
+    """Encolar la reconstrucción completa del benchmark (reparación de los agregados incrementales)"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
     try:
-        benchmark = calculate_benchmark()
-        if 'error' in benchmark:
-            return jsonify({'error': f'Error al recalcular benchmark: {benchmark["error"]}'}), 500
-        
+        job_id = enqueue_job('benchmark_rebuild')
         return jsonify({
             'success': True,
-            'message': f'Benchmark recalculado con {benchmark["total_diagnostics"]} diagnósticos',
-            'benchmark': benchmark
-        })
+            'job_id': job_id,
+            'message': 'Recálculo del benchmark en cola'
+        }), 202
     except Exception as e:
         print(f"Error recalculating benchmark: {e}")
         return jsonify({'error': f'Error al recalcular benchmark: {str(e)}'}), 500
+
+@admin_bp.route('/diagnostics/backfill-scores', methods=['POST'])
+def backfill_scores_route():
+    """Encolar el relleno de las columnas por dimensión de diagnósticos antiguos"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        job_id = enqueue_job('diagnostic_backfill')
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'message': 'Relleno de puntuaciones por dimensión en cola'
+        }), 202
+    except Exception as e:
+        print(f"Error enqueuing backfill: {e}")
+        return jsonify({'error': f'Error al encolar el relleno: {str(e)}'}), 500
+
+@admin_bp.route('/diagnostics/rescore', methods=['POST'])
+def rescore_diagnostics_route():
+    """Encolar la re-puntuación de todos los diagnósticos con las reglas actuales"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        job_id = enqueue_job('diagnostic_rescore')
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'message': 'Re-puntuación de diagnósticos en cola'
+        }), 202
+    except Exception as e:
+        print(f"Error enqueuing rescore: {e}")
+        return jsonify({'error': f'Error al encolar la re-puntuación: {str(e)}'}), 500
+
+@admin_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Listar los últimos trabajos en segundo plano"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        kind = request.args.get('kind') or None
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        return jsonify({'jobs': get_recent_jobs(kind, limit)})
+    except Exception as e:
+        print(f"Error listing jobs: {e}")
+        return jsonify({'error': 'Error obteniendo trabajos'}), 500
+
+@admin_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Estado y progreso de un trabajo"""
+    auth_check = require_admin()
+    if auth_check:
+        return auth_check
+    
+    try:
+        job = get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Trabajo no encontrado'}), 404
+        return jsonify(job)
+    except Exception as e:
+        print(f"Error getting job: {e}")
+        return jsonify({'error': 'Error obteniendo trabajo'}), 500
@@ -0,0 +1,26 @@
+"""
+Catálogo de preguntas del cuestionario (versión actual o ?version=N)
+"""
+from flask import Blueprint, request, jsonify, current_app
+
+from ..question_catalog import get_catalog, CURRENT_VERSION
+
+catalog_bp = Blueprint('catalog', __name__)
+
+@catalog_bp.route('', methods=['GET'])
+def get_question_catalog():
+    """Obtener el catálogo (con ETag por versión y contenido)"""
+    version = request.args.get('version', CURRENT_VERSION, type=int)
+    catalog = get_catalog(version)
+    if catalog is None:
+        return jsonify({'error': f'Versión de catálogo desconocida: {version}'}), 404
+
+    # Cada versión es inmutable: el navegador solo revalida
+    if request.if_none_match.contains(catalog.etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(catalog.body, mimetype='application/json')
+
+    response.set_etag(catalog.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from src.models.diagnostic import db, DiagnosticResult, BenchmarkStats
+from src.scoring import score_responses
 from datetime import datetime, date
 import json
 import statistics
@@ -13,7 +14,7 @@ def submit_diagnostic():
         data = request.get_json()
         
         # Validar datos requeridos
-        required_fields = ['companyInfo', 'responses', 'dimensionStats', 'overallScore', 'maturityLevel']
+        required_fields = ['companyInfo', 'responses', 'dimensionStats']
         for field in required_fields:
             if field not in data:
                 return jsonify({'error': f'Campo requerido: {field}'}), 400
@@ -21,8 +22,13 @@ def submit_diagnostic():
         company_info = data['companyInfo']
         responses = data['responses']
         dimension_stats = data['dimensionStats']
-        overall_score = data['overallScore']
-        maturity_level = data['maturityLevel']
+        
+        # Puntuación y nivel calculados en el servidor (overallScore/maturityLevel se ignoran)
+        scored = score_responses(responses)
+        if scored.score is None:
+            return jsonify({'error': 'Campo requerido: responses'}), 400
+        overall_score = scored.score
+        maturity_level = scored.level
         
         # Crear nuevo registro de diagnóstico
         diagnostic = DiagnosticResult(
@@ -2,17 +2,14 @@
 Endpoint simple y robusto para guardar progreso del cuestionario
 """
 from flask import Blueprint, request, jsonify, session
-import psycopg2
-import psycopg2.extras
-import os
-import json
 
-save_progress_bp = Blueprint('save_progress', __name__)
+from ..database_pg import save_diagnostic
+from .. import write_behind
+from ..question_catalog import CATALOG
+from ..scoring import coerce_responses, score_responses
+from .user_sqlite import enqueue_benchmark_publish
 
-def get_connection():
-    """Get a PostgreSQL database connection"""
-    DATABASE_URL = os.getenv('DATABASE_URL')
-    return psycopg2.connect(DATABASE_URL)
+save_progress_bp = Blueprint('save_progress', __name__)
 
 @save_progress_bp.route('/api/save-progress', methods=['POST'])
 def save_progress():
@@ -24,57 +21,33 @@ def save_progress():
             return jsonify({'error': 'No autenticado'}), 401
         
         # Obtener datos del request
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         responses = data.get('responses', {})
         
         if not responses:
             return jsonify({'error': 'No hay respuestas para guardar'}), 400
         
-        # Calcular score y level
-        total_score = sum(responses.values())
-        answered_count = len(responses)
-        overall_score = total_score / answered_count if answered_count > 0 else 0
-        
-        # Determinar nivel
-        if overall_score >= 4.5:
-            level = 'optimizado'
-        elif overall_score >= 3.5:
-            level = 'avanzado'
-        elif overall_score >= 2.5:
-            level = 'intermedio'
-        elif overall_score >= 1.5:
-            level = 'básico'
-        else:
-            level = 'inicial'
+        # Claves str y valores enteros, igual que /api/user/save-responses
+        try:
+            responses = coerce_responses(responses)
+        except ValueError:
+            return jsonify({'error': 'Las respuestas deben ser números enteros del 1 al 5'}), 400
         
-        # Conectar a la base de datos
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Verificar si ya existe un diagnóstico para este usuario
-        cursor.execute('SELECT id FROM diagnostics WHERE user_id = %s', (user_id,))
-        existing = cursor.fetchone()
-        
-        # Convertir responses a JSON string
-        responses_json = json.dumps(responses)
+        # Calcular score y level
+        scored = score_responses(responses)
+        overall_score, level, answered_count = scored.score, scored.level, scored.answered_count
         
-        if existing:
-            # UPDATE
-            cursor.execute('''
-                UPDATE diagnostics 
-                SET responses = %s, score = %s, level = %s, completed_at = CURRENT_TIMESTAMP
-                WHERE user_id = %s
-            ''', (responses_json, overall_score, level, user_id))
-        else:
-            # INSERT
-            cursor.execute('''
-                INSERT INTO diagnostics (user_id, responses, score, level)
-                VALUES (%s, %s, %s, %s)
-            ''', (user_id, responses_json, overall_score, level))
+        if write_behind.is_enabled():
+            # Se escribe en el próximo volcado por lotes (ya mismo si está completo)
+            write_behind.buffer_save(user_id, responses, overall_score, level)
+            if answered_count >= len(CATALOG):
+                write_behind.flush_user(user_id)
+        # Guardar con un único INSERT ... ON CONFLICT (user_id) DO UPDATE
+        elif not save_diagnostic(user_id, responses, overall_score, level):
+            return jsonify({'error': 'Error guardando progreso'}), 500
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        if answered_count >= len(CATALOG):
+            enqueue_benchmark_publish()
         
         return jsonify({
             'success': True,
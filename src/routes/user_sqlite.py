@@ -1,5 +1,17 @@
-from flask import Blueprint, request, jsonify, session
-from ..database_pg import authenticate_user, save_diagnostic, calculate_benchmark, get_user_diagnostic, get_benchmark_stats
+from flask import Blueprint, request, jsonify, session, current_app
+from ..database_pg import (
+    authenticate_user, save_diagnostic, calculate_benchmark, get_user_diagnostic,
+    get_percentile_rank, apply_response_changes
+)
+from ..dashboard import invalidate_dashboard
+from ..db_pool import get_connection
+from ..jobs import enqueue_job
+from .. import write_behind
+from ..question_catalog import CATALOG
+from ..response_codec import stored_responses
+from ..scoring import coerce_responses, score_responses
+from ..diagnostic_history import get_diagnostic_id, get_diagnostic_history, get_diagnostic_version
+from ..benchmark_cache import get_benchmark_version, get_benchmark_body, benchmark_etag
 
 user_bp = Blueprint('user', __name__)
 
@@ -68,13 +80,8 @@ def register():
         if not username or not password:
             return jsonify({'success': False, 'message': 'Username y password requeridos'}), 400
         
-        # Importar aquí para evitar problemas circulares
-        from werkzeug.security import generate_password_hash
-        import psycopg2
-        import os
-        
-        # Conectar a la base de datos
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        # Obtener conexión del pool compartido
+        conn = get_connection()
         cur = conn.cursor()
         
         # Verificar si el usuario ya existe
@@ -93,6 +100,7 @@ def register():
         
         user_id = cur.fetchone()[0]
         conn.commit()
+        invalidate_dashboard()
         cur.close()
         conn.close()
         
@@ -110,6 +118,14 @@ def register():
 @user_bp.route('/logout', methods=['POST'])
 def logout():
     """Logout de usuario"""
+    # Escribir ya el autoguardado pendiente del usuario
+    user_id = session.get('user_data', {}).get('id')
+    if user_id:
+        try:
+            write_behind.flush_user(user_id)
+        except Exception as e:
+            print(f"[LOGOUT] Error volcando autoguardado pendiente: {e}")
+    
     # Limpiar completamente la sesión
     session.clear()
     
@@ -143,12 +159,17 @@ def save_user_diagnostic():
         if user_data.get('username') == 'demo':
             return jsonify({'success': True, 'message': 'Diagnóstico demo no guardado'})
         
-        # Usar los parámetros correctos de save_diagnostic
+        # Puntuación y nivel se calculan en el servidor, no se toman del cliente
+        try:
+            responses = coerce_responses(data.get('responses', {}))
+        except ValueError:
+            return jsonify({'error': 'Las respuestas deben ser números enteros del 1 al 5'}), 400
+        scored = score_responses(responses)
         success = save_diagnostic(
             user_id=user_data.get('id'),
-            responses=data.get('responses', {}),
-            score=data.get('overall_score', 0),
-            level=data.get('level', 'inicial')
+            responses=responses,
+            score=scored.score,
+            level=scored.level
         )
         
         if success:
@@ -165,18 +186,23 @@ def save_user_diagnostic():
 
 @user_bp.route('/benchmark-stats', methods=['GET'])
 def get_benchmark():
-    """Obtener estadísticas de benchmark"""
+    """Obtener estadísticas de benchmark (con ETag por versión del benchmark)"""
     try:
-        benchmark = get_benchmark_stats()
-        
-        if not benchmark or benchmark.get('total_diagnostics', 0) == 0:
-            # Si no hay datos, retornar N/A
-            return jsonify({
-                'dimensiones': [],
-                'total_diagnostics': 0
-            })
+        version = get_benchmark_version()
+        etag = benchmark_etag(version)
         
-        return jsonify(benchmark)
+        # El navegador ya tiene esta versión: 304 sin leer ni serializar estadísticas
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(
+                get_benchmark_body(version),
+                mimetype='application/json'
+            )
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         print(f"Error getting benchmark stats: {e}")
         return jsonify({'error': 'Error obteniendo estadísticas'}), 500
@@ -194,87 +220,118 @@ def get_my_diagnostic():
         if not user_id or user_data.get('username') == 'demo':
             return jsonify({'diagnostic': None})
         
+        # Leer lo último que guardó el usuario aunque siga en el buffer
+        write_behind.flush_user(user_id)
         diagnostic = get_user_diagnostic(user_id)
+        if diagnostic:
+            # El JSON de las respuestas solo se construye aquí
+            diagnostic['responses'] = stored_responses(
+                diagnostic.pop('responses_packed'), diagnostic['responses'], diagnostic['catalog_version']
+            )
+            diagnostic['percentile_rank'] = get_percentile_rank(diagnostic['score'])
         return jsonify({'diagnostic': diagnostic})
         
     except Exception as e:
         print(f"Error getting user diagnostic: {e}")
         return jsonify({'error': 'Error obteniendo diagnóstico'}), 500
 
+@user_bp.route('/my-diagnostic/history', methods=['GET'])
+def get_my_diagnostic_history():
+    """Listar las revisiones guardadas del diagnóstico del usuario"""
+    try:
+        if not session.get('user_logged_in'):
+            return jsonify({'error': 'No autorizado'}), 401
+        
+        user_data = session.get('user_data', {})
+        user_id = user_data.get('id')
+        
+        if not user_id or user_data.get('username') == 'demo':
+            return jsonify({'versions': []})
+        
+        write_behind.flush_user(user_id)
+        diagnostic_id = get_diagnostic_id(user_id)
+        versions = get_diagnostic_history(diagnostic_id) if diagnostic_id else []
+        return jsonify({'versions': versions})
+        
+    except Exception as e:
+        print(f"Error getting diagnostic history: {e}")
+        return jsonify({'error': 'Error obteniendo historial'}), 500
+
+@user_bp.route('/my-diagnostic/versions/<int:revision>', methods=['GET'])
+def get_my_diagnostic_version(revision):
+    """Obtener una revisión anterior del diagnóstico del usuario"""
+    try:
+        if not session.get('user_logged_in'):
+            return jsonify({'error': 'No autorizado'}), 401
+        
+        user_data = session.get('user_data', {})
+        user_id = user_data.get('id')
+        
+        if not user_id or user_data.get('username') == 'demo':
+            return jsonify({'error': 'Versión no encontrada'}), 404
+        
+        write_behind.flush_user(user_id)
+        diagnostic_id = get_diagnostic_id(user_id)
+        version = get_diagnostic_version(diagnostic_id, revision) if diagnostic_id else None
+        if version is None:
+            return jsonify({'error': 'Versión no encontrada'}), 404
+        return jsonify({'version': version})
+        
+    except Exception as e:
+        print(f"Error getting diagnostic version: {e}")
+        return jsonify({'error': 'Error obteniendo versión'}), 500
+
 @user_bp.route('/save-responses', methods=['POST'])
 def save_responses():
     """Guardar respuestas del cuestionario de forma incremental"""
     try:
-        print(f"[SAVE-RESPONSES] Request received")
-        print(f"[SAVE-RESPONSES] Session logged in: {session.get('user_logged_in')}")
-        print(f"[SAVE-RESPONSES] Session user_id: {session.get('user_id')}")
-        
         if not session.get('user_logged_in'):
-            print(f"[SAVE-RESPONSES] ERROR: User not logged in")
             return jsonify({'error': 'No autorizado - sesión no válida'}), 401
         
         user_data = session.get('user_data', {})
         user_id = user_data.get('id')
         username = user_data.get('username')
         
-        print(f"[SAVE-RESPONSES] User ID: {user_id}, Username: {username}")
-        
         # Si es usuario demo, no guardar en BD
         if not user_id or username == 'demo':
-            print(f"[SAVE-RESPONSES] Demo user - not saving to DB")
             return jsonify({'success': True, 'message': 'Demo user - not saved'})
         
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         responses = data.get('responses', {})
         
-        print(f"[SAVE-RESPONSES] Responses count: {len(responses)}")
-        
         if not responses:
-            print(f"[SAVE-RESPONSES] No responses to save")
             return jsonify({'success': True, 'message': 'No responses to save'})
         
-        # Convertir claves a strings para JSONB (PostgreSQL maneja mejor strings como claves)
-        str_responses = {str(k): int(v) for k, v in responses.items()}
-        
-        # Calcular score promedio
-        total_score = sum(str_responses.values())
-        avg_score = total_score / len(str_responses)
-        
-        # Determinar nivel de madurez
-        if avg_score >= 4.5:
-            level = 'optimizado'
-        elif avg_score >= 3.5:
-            level = 'avanzado'
-        elif avg_score >= 2.5:
-            level = 'intermedio'
-        elif avg_score >= 1.5:
-            level = 'basico'
-        else:
-            level = 'inicial'
-        
-        print(f"[SAVE-RESPONSES] Saving to DB - User: {user_id}, Score: {avg_score:.2f}, Level: {level}")
+        # Claves str (JSONB) y valores enteros, igual que el PATCH
+        try:
+            str_responses = coerce_responses(responses)
+        except ValueError:
+            return jsonify({'error': 'Las respuestas deben ser números enteros del 1 al 5'}), 400
+        
+        # Score promedio y nivel de madurez
+        scored = score_responses(str_responses)
+        avg_score, level = scored.score, scored.level
+        
+        if write_behind.is_enabled():
+            # Autoguardado diferido: se escribe en el próximo volcado por lotes,
+            # o ya mismo si el cuestionario está completo
+            write_behind.buffer_save(user_id, str_responses, avg_score, level)
+            if len(str_responses) >= len(CATALOG):
+                write_behind.flush_user(user_id)
+                enqueue_benchmark_publish()
+            return jsonify({'success': True, 'message': 'Respuestas guardadas correctamente'})
         
-        # Guardar usando la función de database_pg (ya importada arriba)
-        result = save_diagnostic(user_id, str_responses, avg_score, level)
+        revision = save_diagnostic(user_id, str_responses, avg_score, level)
         
-        if result:
-            print(f"[SAVE-RESPONSES] Successfully saved to database")
-            
-            # Si el cuestionario está 100% completo (69 preguntas), recalcular benchmark automáticamente
-            if len(str_responses) >= 69:
-                print(f"[SAVE-RESPONSES] Cuestionario completo (100%) - Recalculando benchmark...")
-                try:
-                    from ..database_pg import recalculate_benchmark_stats
-                    benchmark_result = recalculate_benchmark_stats()
-                    if benchmark_result['success']:
-                        print(f"[SAVE-RESPONSES] Benchmark recalculado exitosamente")
-                    else:
-                        print(f"[SAVE-RESPONSES] Error recalculando benchmark: {benchmark_result.get('message')}")
-                except Exception as e:
-                    print(f"[SAVE-RESPONSES] Error recalculando benchmark: {e}")
-                    # No fallar el guardado si falla el recálculo
+        if revision:
+            if len(str_responses) >= len(CATALOG):
+                enqueue_benchmark_publish()
             
-            return jsonify({'success': True, 'message': 'Respuestas guardadas correctamente'})
+            return jsonify({
+                'success': True,
+                'message': 'Respuestas guardadas correctamente',
+                'revision': revision
+            })
         else:
             return jsonify({'error': 'Error guardando en base de datos'}), 500
         
@@ -283,3 +340,80 @@ def save_responses():
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'Error: {str(e)}'}), 500
+
+def enqueue_benchmark_publish():
+    """Encolar la publicación del benchmark tras completar el cuestionario.
+    
+    La publicación suma a los agregados los deltas anotados por los
+    guardados; varias finalizaciones seguidas se fusionan en un solo trabajo.
+    """
+    try:
+        enqueue_job('benchmark_publish')
+    except Exception as e:
+        # No fallar el guardado si falla la publicación
+        print(f"[SAVE-RESPONSES] Error encolando publicación del benchmark: {e}")
+
+@user_bp.route('/save-responses', methods=['PATCH'])
+def patch_responses():
+    """Autoguardado por diferencias.
+    
+    Body: {"base_revision": <revisión sobre la que se editó>, "changes": {"1.1.1": 4, ...}}.
+    Solo viajan las respuestas cambiadas; el servidor las fusiona con las
+    guardadas. Si la revisión ya no es la actual responde 409 con la revisión
+    y las respuestas vigentes para que el cliente reconcilie y reintente.
+    """
+    try:
+        if not session.get('user_logged_in'):
+            return jsonify({'error': 'No autorizado - sesión no válida'}), 401
+        
+        user_data = session.get('user_data', {})
+        user_id = user_data.get('id')
+        
+        # Si es usuario demo, no guardar en BD
+        if not user_id or user_data.get('username') == 'demo':
+            return jsonify({'success': True, 'message': 'Demo user - not saved'})
+        
+        data = request.get_json(silent=True) or {}
+        base_revision = data.get('base_revision')
+        changes = data.get('changes')
+        
+        if (not isinstance(base_revision, int) or isinstance(base_revision, bool)
+                or not isinstance(changes, dict)):
+            return jsonify({'error': 'Se requieren base_revision (entero) y changes (objeto)'}), 400
+        
+        try:
+            changes = coerce_responses(changes)
+        except ValueError:
+            return jsonify({'error': 'Las respuestas deben ser números enteros del 1 al 5'}), 400
+        
+        if not changes:
+            return jsonify({'success': True, 'revision': base_revision, 'message': 'Sin cambios'})
+        
+        # Un guardado completo pendiente en el buffer va antes que este delta
+        write_behind.flush_user(user_id)
+        
+        result = apply_response_changes(user_id, base_revision, changes)
+        
+        if result.get('conflict'):
+            return jsonify({
+                'error': 'Revisión desactualizada',
+                'revision': result['revision'],
+                'responses': result['responses']
+            }), 409
+        if not result['success']:
+            return jsonify({'error': 'Error guardando en base de datos'}), 500
+        
+        if result['answered_count'] >= len(CATALOG):
+            enqueue_benchmark_publish()
+        
+        return jsonify({
+            'success': True,
+            'revision': result['revision'],
+            'score': round(result['score'], 2),
+            'level': result['level'],
+            'answered': result['answered_count']
+        })
+        
+    except Exception as e:
+        print(f"Error en patch_responses: {e}")
+        return jsonify({'error': f'Error: {str(e)}'}), 500
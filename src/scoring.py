@@ -0,0 +1,127 @@
+"""
+Puntuación de diagnósticos, compartida por todas las rutas de guardado.
+
+score_responses recorre las respuestas una sola vez y devuelve la puntuación
+general (media de todas las respuestas), el nivel de madurez, el número de
+respuestas y el promedio de cada dimensión. La dimensión de cada clave sale
+del índice precalculado del catálogo (question_catalog), sin partir claves.
+
+score_batch puntúa muchos diagnósticos de una vez para reconstrucciones y
+backfills; acepta diccionarios, su JSON o los bytes de responses_packed (que
+se puntúan sin construir el diccionario).
+
+Los niveles se guardan en diagnostics.level sin tildes ('basico'); los rangos
+que muestra el frontend son los de maturityLevels en el catálogo.
+"""
+import json
+from collections import namedtuple
+
+from .question_catalog import CATALOG
+from .response_codec import packed_scores
+
+# Puntuación mínima de cada nivel, de mayor a menor
+MATURITY_LEVELS = [
+    (4.5, 'optimizado'),
+    (3.5, 'avanzado'),
+    (2.5, 'intermedio'),
+    (1.5, 'basico'),
+]
+LOWEST_LEVEL = 'inicial'
+
+# Escala de cada respuesta del cuestionario
+MIN_ANSWER = 1
+MAX_ANSWER = 5
+
+# Forma antigua de algunos niveles ya guardados -> nivel canónico
+LEGACY_LEVELS = {'básico': 'basico'}
+
+DiagnosticScore = namedtuple(
+    'DiagnosticScore', ['score', 'level', 'answered_count', 'dimension_scores']
+)
+
+EMPTY_SCORE = DiagnosticScore(None, None, 0, {})
+
+
+def maturity_level(score):
+    """Nivel de madurez para una puntuación media"""
+    for minimum, level in MATURITY_LEVELS:
+        if score >= minimum:
+            return level
+    return LOWEST_LEVEL
+
+
+def coerce_responses(responses):
+    """Respuestas de la API como {'1.1.1': 4, ...} con claves str y valores int.
+
+    Acepta enteros, cadenas de dígitos y floats enteros (4.0) entre MIN_ANSWER
+    y MAX_ANSWER; cualquier otro valor (booleanos, 3.5, 'a', null, 0, 9) lanza
+    ValueError.
+    """
+    if not isinstance(responses, dict):
+        raise ValueError('Las respuestas deben ser un objeto')
+    coerced = {}
+    for key, value in responses.items():
+        if isinstance(value, bool):
+            raise ValueError(f'Respuesta no numérica en {key}')
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        try:
+            number = int(value) if isinstance(value, (int, str)) else None
+        except ValueError:
+            number = None
+        if number is None:
+            raise ValueError(f'Respuesta no numérica en {key}')
+        if not MIN_ANSWER <= number <= MAX_ANSWER:
+            raise ValueError(f'Respuesta fuera de rango en {key}')
+        coerced[str(key)] = number
+    return coerced
+
+
+def score_responses(responses, catalog=CATALOG):
+    """Puntuar un diagnóstico {'1.1.1': 4, ...} en una sola pasada"""
+    if isinstance(responses, str):
+        responses = json.loads(responses)
+    if not isinstance(responses, dict) or not responses:
+        return EMPTY_SCORE
+
+    # Una pasada agrupando por dimensión; las claves fuera del catálogo (raras)
+    # caen en dimension_for_key
+    question_dimension = catalog.question_dimension.get
+    dimension_for_key = catalog.dimension_for_key
+    groups = {}
+    for key, value in responses.items():
+        name = question_dimension(key) or dimension_for_key(key)
+        if name:
+            values = groups.get(name)
+            if values is None:
+                groups[name] = [value]
+            else:
+                values.append(value)
+
+    score = sum(responses.values()) / len(responses)
+    return DiagnosticScore(
+        score,
+        maturity_level(score),
+        len(responses),
+        {name: sum(values) / len(values) for name, values in groups.items()}
+    )
+
+
+def score_packed(packed, catalog=CATALOG):
+    """Puntuar los bytes de responses_packed sin decodificarlos a diccionario"""
+    score, averages, answered_count = packed_scores(packed, catalog)
+    if not answered_count:
+        return EMPTY_SCORE
+    return DiagnosticScore(score, maturity_level(score), answered_count, averages)
+
+
+def score_batch(documents, catalog=CATALOG):
+    """Puntuar muchos diagnósticos: lista de DiagnosticScore en el mismo orden"""
+    scores = []
+    append = scores.append
+    for document in documents:
+        if isinstance(document, (bytes, memoryview)):
+            append(score_packed(document, catalog))
+        else:
+            append(score_responses(document, catalog))
+    return scores
@@ -0,0 +1,74 @@
+"""
+Búsqueda del panel de administración (usuarios y diagnósticos).
+
+users.search_text es una columna generada con username, empresa, contacto y
+email en minúsculas y sin tildes ('Compañía Peñalolén' -> 'compania
+penalolen'), con un índice GIN de pg_trgm. El término se normaliza igual en
+Python y se busca como subcadena (LIKE '%term%') o por similitud de palabra
+(term <% search_text, tolera erratas); ambas condiciones usan el índice.
+
+Los resultados se ordenan por word_similarity y se cortan en SEARCH_LIMIT.
+Los términos de menos de SEARCH_MIN_LENGTH caracteres no tienen trigramas
+que buscar en el índice: el listado se devuelve sin filtrar.
+
+La normalización usa translate() y no la extensión unaccent porque una
+columna generada necesita una expresión IMMUTABLE. Se quitan las tildes antes
+de pasar a minúsculas, mayúsculas incluidas: lower() de PostgreSQL sobre
+letras no ASCII depende del locale de la base de datos, sobre ASCII no.
+
+Configuración por variables de entorno:
+    SEARCH_LIMIT  resultados máximos por búsqueda (default 50)
+"""
+import os
+
+SEARCH_LIMIT = int(os.getenv('SEARCH_LIMIT', '50'))
+SEARCH_MIN_LENGTH = 3
+
+# Letras con tilde y su forma sin ella (mismo orden)
+ACCENTED = 'áàäâãéèëêíìïîóòöôõúùüûñçÁÀÄÂÃÉÈËÊÍÌÏÎÓÒÖÔÕÚÙÜÛÑÇ'
+PLAIN = 'aaaaaeeeeiiiiooooouuuuncAAAAAEEEEIIIIOOOOOUUUUNC'
+
+_PLAIN_TABLE = str.maketrans(ACCENTED, PLAIN)
+
+# Campos de users que entran en la búsqueda
+SEARCH_FIELDS = ('username', 'company_name', 'contact_person', 'email')
+
+# Índices de la búsqueda; la migración los construye con CREATE INDEX CONCURRENTLY
+SEARCH_INDEXES = {
+    'users_search_trgm': 'ON users USING gin (search_text gin_trgm_ops)',
+}
+
+
+def search_text_sql(fields=SEARCH_FIELDS):
+    """Expresión IMMUTABLE de users.search_text"""
+    joined = " || ' ' || ".join(f"coalesce({field}, '')" for field in fields)
+    return f"lower(translate({joined}, '{ACCENTED}', '{PLAIN}'))"
+
+
+def normalize_search(term):
+    """Término de búsqueda normalizado como search_text, o None si es demasiado corto"""
+    term = ' '.join((term or '').translate(_PLAIN_TABLE).lower().split())
+    return term if len(term) >= SEARCH_MIN_LENGTH else None
+
+
+def like_pattern(term):
+    """Patrón LIKE de subcadena, con los comodines del término escapados"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_limit(limit):
+    """?limit= acotado a [1, SEARCH_LIMIT]"""
+    if limit is None:
+        return SEARCH_LIMIT
+    return max(1, min(limit, SEARCH_LIMIT))
+
+
+def create_search_column(cursor):
+    """Migración: pg_trgm y users.search_text (el índice GIN está en SEARCH_INDEXES)"""
+    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    cursor.execute(f'''
+        ALTER TABLE users
+        ADD COLUMN IF NOT EXISTS search_text TEXT
+        GENERATED ALWAYS AS ({search_text_sql()}) STORED
+    ''')
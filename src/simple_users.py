@@ -164,7 +164,6 @@ def reset_password(username):
         print(f"Error resetting password: {e}")
         return None
 
-# Inicializar usuario admin al importar
 def init_admin():
     """Inicializar usuario admin"""
     try:
@@ -211,6 +210,3 @@ def get_user_stats():
             'total_diagnostics': 0,
             'completion_rate': 0
         }
-
-# Inicializar admin al importar el módulo
-init_admin()
@@ -0,0 +1,185 @@
+"""
+Ejecución única entre workers para operaciones de mantenimiento costosas.
+
+single_flight(name, func) toma un advisory lock de sesión de PostgreSQL asociado
+a `name`. Si nadie lo tiene, este proceso ejecuta func() y guarda el resultado
+en single_flight_results. Si otro worker (u otro proceso) ya está ejecutando la
+misma operación, el llamador espera a que termine y devuelve el resultado que
+guardó el ganador en lugar de repetir el cálculo. Solo si el ganador falló sin
+dejar resultado, el llamador ejecuta func() por su cuenta.
+
+Los resultados deben ser serializables a JSON.
+
+Configuración por variables de entorno:
+    SINGLE_FLIGHT_TIMEOUT  segundos máximos esperando al ganador (default 600)
+"""
+import os
+import threading
+import time
+import zlib
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+
+from .db_pool import get_connection
+
+# Primer entero de la clave del advisory lock; el segundo se deriva del nombre
+SINGLE_FLIGHT_LOCK_CLASS = 7302
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '600'))
+
+
+class SingleFlightTimeout(Exception):
+    """El ganador no terminó dentro del tiempo de espera"""
+
+
+def create_single_flight_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS single_flight_results (
+            name VARCHAR(100) PRIMARY KEY,
+            result JSONB,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+
+
+def _lock_key(name):
+    """Par de enteros del advisory lock para `name` (crc32 llevado a int4 con signo)"""
+    objid = zlib.crc32(name.encode('utf-8'))
+    if objid >= 2 ** 31:
+        objid -= 2 ** 32
+    return SINGLE_FLIGHT_LOCK_CLASS, objid
+
+
+# ==================== MÉTRICAS ====================
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _new_stats():
+    return {
+        'calls': 0,
+        'executions': 0,
+        'shared_results': 0,
+        'contended': 0,
+        'timeouts': 0,
+        'errors': 0,
+        'wait_time_total': 0.0,
+        'wait_time_max': 0.0,
+        'hold_time_total': 0.0,
+        'hold_time_max': 0.0,
+    }
+
+
+def _record(name, waited=None, held=None, **counters):
+    with _stats_lock:
+        stats = _stats.setdefault(name, _new_stats())
+        for counter, increment in counters.items():
+            stats[counter] += increment
+        if waited is not None:
+            stats['wait_time_total'] += waited
+            stats['wait_time_max'] = max(stats['wait_time_max'], waited)
+        if held is not None:
+            stats['hold_time_total'] += held
+            stats['hold_time_max'] = max(stats['hold_time_max'], held)
+
+
+def get_single_flight_stats():
+    """Métricas de este worker por operación (tiempos en segundos)"""
+    with _stats_lock:
+        snapshot = {name: dict(stats) for name, stats in _stats.items()}
+    for stats in snapshot.values():
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['calls'] if stats['calls'] else 0.0
+        held = stats['executions'] + stats['shared_results']
+        stats['hold_time_avg'] = stats['hold_time_total'] / held if held else 0.0
+    return snapshot
+
+
+# ==================== EJECUCIÓN ====================
+
+def _wait_for_lock(conn, cursor, key, timeout):
+    """Bloquear hasta obtener el lock o agotar timeout"""
+    try:
+        cursor.execute('SET LOCAL lock_timeout = %s', (f'{int(timeout * 1000)}ms',))
+        cursor.execute('SELECT pg_advisory_lock(%s, %s)', key)
+        conn.commit()
+        return True
+    except psycopg2.errors.LockNotAvailable:
+        conn.rollback()
+        return False
+
+
+def single_flight(name, func, timeout=None):
+    """Ejecutar func() una sola vez a la vez entre todos los workers.
+
+    Devuelve el resultado de func() o, si otro worker la estaba ejecutando,
+    el resultado que este dejó al terminar.
+    """
+    timeout = SINGLE_FLIGHT_TIMEOUT if timeout is None else timeout
+    key = _lock_key(name)
+    start = time.monotonic()
+
+    # Conexión dedicada al lock: el lock de sesión vive mientras ella siga abierta
+    conn = get_connection()
+    cursor = conn.cursor()
+    locked = False
+
+    try:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s), clock_timestamp()::timestamp', key)
+        locked, requested_at = cursor.fetchone()
+        conn.commit()
+
+        if not locked:
+            _record(name, contended=1)
+            locked = _wait_for_lock(conn, cursor, key, timeout)
+            if not locked:
+                _record(name, calls=1, timeouts=1, waited=time.monotonic() - start)
+                raise SingleFlightTimeout(f'{name}: otro proceso no terminó en {timeout:.0f}s')
+
+            # ¿El ganador terminó después de que llegáramos? Entonces su resultado sirve
+            cursor.execute('''
+                SELECT result FROM single_flight_results
+                WHERE name = %s AND finished_at >= %s
+            ''', (name, requested_at))
+            row = cursor.fetchone()
+            conn.commit()
+            if row is not None:
+                acquired = time.monotonic()
+                _record(name, calls=1, shared_results=1, waited=acquired - start,
+                        held=time.monotonic() - acquired)
+                return row[0]
+
+        acquired = time.monotonic()
+        try:
+            result = func()
+        except Exception:
+            _record(name, calls=1, errors=1, waited=acquired - start,
+                    held=time.monotonic() - acquired)
+            raise
+
+        cursor.execute('''
+            INSERT INTO single_flight_results (name, result, started_at, finished_at)
+            VALUES (%s, %s, %s, clock_timestamp())
+            ON CONFLICT (name) DO UPDATE
+            SET result = EXCLUDED.result,
+                started_at = EXCLUDED.started_at,
+                finished_at = EXCLUDED.finished_at
+        ''', (name, psycopg2.extras.Json(result), requested_at))
+        conn.commit()
+        _record(name, calls=1, executions=1, waited=acquired - start,
+                held=time.monotonic() - acquired)
+        return result
+    finally:
+        if locked:
+            try:
+                conn.rollback()
+                cursor.execute('SELECT pg_advisory_unlock(%s, %s)', key)
+                conn.commit()
+            except psycopg2.Error as e:
+                # Cerrar la conexión libera el lock; el pool la descarta
+                print(f"[SINGLE-FLIGHT] No se pudo liberar el lock de {name}: {e}")
+                conn.raw.close()
+        cursor.close()
+        conn.close()
@@ -0,0 +1,221 @@
+"""
+Autoguardado diferido (write-behind) del cuestionario.
+
+Con AUTOSAVE_WRITE_BEHIND=1, save-responses y save-progress no escriben en
+PostgreSQL en cada llamada: guardan en memoria la última versión de las
+respuestas de cada usuario (las anteriores se descartan) y un hilo las vuelca
+cada AUTOSAVE_FLUSH_INTERVAL segundos con un único upsert por lotes
+(database_pg.save_diagnostics_batch). Así un pico de autoguardados cuesta un
+commit por intervalo en lugar de uno por petición.
+
+Se fuerza el volcado de un usuario al completar el cuestionario, al cerrar
+sesión y antes de leer su diagnóstico, y el de todos al terminar el worker.
+Cada guardado lleva la hora en que llegó; el upsert no sustituye una fila más
+reciente, así que los volcados de distintos workers no retroceden.
+
+Configuración por variables de entorno:
+    AUTOSAVE_WRITE_BEHIND    1 para activar (default desactivado)
+    AUTOSAVE_FLUSH_INTERVAL  segundos entre volcados (default 5)
+    AUTOSAVE_SPOOL_DIR       directorio local donde se guarda también cada
+                             guardado pendiente para recuperarlo si el
+                             proceso muere antes del volcado (opcional)
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from .database_pg import save_diagnostics_batch
+
+WRITE_BEHIND_ENABLED = os.getenv('AUTOSAVE_WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+FLUSH_INTERVAL = float(os.getenv('AUTOSAVE_FLUSH_INTERVAL', '5'))
+SPOOL_DIR = os.getenv('AUTOSAVE_SPOOL_DIR') or None
+
+_lock = threading.Lock()
+# Un volcado a la vez: flush_user espera al periódico si este ya se llevó al usuario
+_flush_lock = threading.Lock()
+# user_id -> (responses, score, level, saved_at)
+_pending = {}
+_stats = {
+    'buffered_saves': 0,
+    'coalesced_saves': 0,
+    'flushes': 0,
+    'rows_flushed': 0,
+    'flush_errors': 0,
+    'last_flush_seconds': 0.0,
+}
+
+
+def is_enabled():
+    return WRITE_BEHIND_ENABLED
+
+
+# ==================== SPOOL ====================
+
+def _spool_path(user_id):
+    return os.path.join(SPOOL_DIR, f'{user_id}.json')
+
+
+def _spool_write(user_id, save):
+    responses, score, level, saved_at = save
+    path = _spool_path(user_id)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'user_id': user_id,
+            'responses': responses,
+            'score': score,
+            'level': level,
+            'saved_at': saved_at.isoformat()
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _spool_remove(user_id, saved_at):
+    """Borrar el archivo del usuario si sigue siendo el guardado que se volcó"""
+    path = _spool_path(user_id)
+    try:
+        with open(path) as f:
+            if json.load(f)['saved_at'] != saved_at.isoformat():
+                return
+        os.remove(path)
+    except (OSError, ValueError, KeyError):
+        pass
+
+
+def _spool_recover():
+    """Cargar los guardados que quedaron sin volcar (p. ej. tras una caída)"""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    recovered = 0
+    for name in os.listdir(SPOOL_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(SPOOL_DIR, name)) as f:
+                data = json.load(f)
+            save = (data['responses'], data['score'], data['level'],
+                    datetime.fromisoformat(data['saved_at']))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WRITE-BEHIND] Spool ilegible {name}: {e}")
+            continue
+        with _lock:
+            current = _pending.get(data['user_id'])
+            if current is None or current[3] < save[3]:
+                _pending[data['user_id']] = save
+                recovered += 1
+    if recovered:
+        print(f"[WRITE-BEHIND] {recovered} guardados recuperados del spool")
+
+
+# ==================== BUFFER ====================
+
+def buffer_save(user_id, responses, score, level):
+    """Dejar pendiente el guardado de un usuario, sustituyendo al anterior"""
+    save = (responses, score, level, datetime.now(timezone.utc))
+    with _lock:
+        if user_id in _pending:
+            _stats['coalesced_saves'] += 1
+        _pending[user_id] = save
+        _stats['buffered_saves'] += 1
+    if SPOOL_DIR:
+        _spool_write(user_id, save)
+
+
+def _flush(user_ids=None):
+    """Volcar los guardados pendientes (todos o los de user_ids) en un solo lote"""
+    with _flush_lock:
+        return _flush_locked(user_ids)
+
+
+def _flush_locked(user_ids):
+    with _lock:
+        if user_ids is None:
+            user_ids = list(_pending)
+        batch = {user_id: _pending.pop(user_id) for user_id in user_ids if user_id in _pending}
+    if not batch:
+        return 0
+
+    start = time.monotonic()
+    try:
+        written = save_diagnostics_batch([
+            (user_id, responses, score, level, saved_at)
+            for user_id, (responses, score, level, saved_at) in batch.items()
+        ])
+    except Exception:
+        # Devolver al buffer lo que no se escribió, salvo si ya hay algo más nuevo
+        with _lock:
+            for user_id, save in batch.items():
+                _pending.setdefault(user_id, save)
+            _stats['flush_errors'] += 1
+        raise
+
+    with _lock:
+        _stats['flushes'] += 1
+        _stats['rows_flushed'] += len(batch)
+        _stats['last_flush_seconds'] = time.monotonic() - start
+    if SPOOL_DIR:
+        for user_id, (_, _, _, saved_at) in batch.items():
+            _spool_remove(user_id, saved_at)
+    return written
+
+
+def flush():
+    """Volcar todos los guardados pendientes; devuelve las filas escritas"""
+    return _flush()
+
+
+def flush_user(user_id):
+    """Volcar ya el guardado pendiente de un usuario (completar, logout, lectura)"""
+    if not WRITE_BEHIND_ENABLED:
+        return 0
+    return _flush([user_id])
+
+
+def get_write_behind_stats():
+    """Métricas de este worker"""
+    with _lock:
+        stats = dict(_stats)
+        stats['pending'] = len(_pending)
+    stats['enabled'] = WRITE_BEHIND_ENABLED
+    stats['flush_interval'] = FLUSH_INTERVAL
+    return stats
+
+
+# ==================== VOLCADO PERIÓDICO ====================
+
+_flusher_thread = None
+_stop = threading.Event()
+
+
+def _flusher_loop():
+    while not _stop.wait(FLUSH_INTERVAL):
+        try:
+            flush()
+        except Exception as e:
+            print(f"[WRITE-BEHIND] Error volcando guardados: {e}")
+
+
+def _flush_at_exit():
+    _stop.set()
+    try:
+        flush()
+    except Exception as e:
+        print(f"[WRITE-BEHIND] Error en el volcado final: {e}")
+
+
+def start_write_behind():
+    """Arrancar el volcado periódico en este proceso (una vez por proceso)"""
+    global _flusher_thread
+    if not WRITE_BEHIND_ENABLED:
+        return
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        return
+    if SPOOL_DIR:
+        _spool_recover()
+    _flusher_thread = threading.Thread(target=_flusher_loop, name='write-behind', daemon=True)
+    _flusher_thread.start()
+    atexit.register(_flush_at_exit)
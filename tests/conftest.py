@@ -0,0 +1,6 @@
+import os
+import sys
+
+# database_pg exige DATABASE_URL al importarse; estas pruebas no abren conexiones
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/cx_diagnostic_test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
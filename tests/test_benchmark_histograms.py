@@ -0,0 +1,95 @@
+import pytest
+
+from src import database_pg
+from src.benchmark_histograms import (
+    BENCHMARK_PERCENTILES, NUM_BUCKETS, OVERALL, ScoreHistogram, bucket_score, score_bucket
+)
+
+
+def histogram_of(scores):
+    counts = {}
+    for score in scores:
+        counts[score_bucket(score)] = counts.get(score_bucket(score), 0) + 1
+    return ScoreHistogram(counts)
+
+
+def test_score_bucket_bounds():
+    assert score_bucket(1.0) == 0
+    assert score_bucket(5.0) == NUM_BUCKETS - 1
+    assert score_bucket(0.2) == 0
+    assert score_bucket(7.0) == NUM_BUCKETS - 1
+    assert bucket_score(score_bucket(3.456)) == 3.46
+
+
+def test_empty_histogram():
+    histogram = ScoreHistogram()
+    assert histogram.minimum() is None
+    assert histogram.maximum() is None
+    assert histogram.percentile(50) is None
+    assert histogram.percentile_rank(3.0) is None
+
+
+def test_percentile_nearest_rank():
+    histogram = histogram_of([1.0, 2.0, 3.0, 4.0, 5.0, 2.5, 3.5, 4.5, 1.5, 4.25])
+    # Ordenadas: 1.0 1.5 2.0 2.5 3.0 3.5 4.0 4.25 4.5 5.0
+    assert histogram.percentile(0) == 1.0
+    assert histogram.percentile(10) == 1.0
+    assert histogram.percentile(50) == 3.0
+    assert histogram.percentile(75) == 4.25
+    assert histogram.percentile(100) == 5.0
+    assert histogram.minimum() == 1.0 and histogram.maximum() == 5.0
+
+
+def test_percentiles_uses_the_published_set():
+    histogram = histogram_of([2.0, 3.0, 4.0])
+    assert list(histogram.percentiles()) == list(BENCHMARK_PERCENTILES)
+    assert histogram.percentiles((50,)) == {50: 3.0}
+
+
+def test_percentile_rank_counts_lower_buckets_only():
+    histogram = histogram_of([1.0, 2.0, 3.0, 3.0, 4.0])
+    assert histogram.percentile_rank(1.0) == 0.0
+    assert histogram.percentile_rank(3.0) == 40.0
+    assert histogram.percentile_rank(3.004) == 40.0
+    assert histogram.percentile_rank(3.01) == 80.0
+    assert histogram.percentile_rank(5.0) == 100.0
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        self.result = self.rows['histograms' if 'benchmark_histograms' in sql else 'stats']
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self.rows)
+
+
+def test_read_benchmark_stats_publishes_percentiles():
+    histograms = [(OVERALL, score_bucket(score), 1) for score in (2.0, 3.0, 4.0)]
+    histograms += [('estrategia_cx', score_bucket(score), 1) for score in (1.5, 4.5)]
+    conn = FakeConnection({
+        'stats': [{'dimension': 'estrategia_cx', 'avg_score': 3.0, 'total_diagnostics': 2}],
+        'histograms': histograms,
+    })
+
+    stats = database_pg.read_benchmark_stats(conn)
+
+    dim_id = next(dim_id for dim_id, name in database_pg.DIMENSION_MAPPING.items() if name == 'estrategia_cx')
+    assert stats['total_diagnostics'] == 3
+    assert stats['overall_percentiles'][50] == 3.0
+    assert stats['dimension_percentiles'][dim_id] == pytest.approx(
+        {10: 1.5, 25: 1.5, 50: 1.5, 75: 4.5, 90: 4.5}
+    )
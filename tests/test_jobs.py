@@ -0,0 +1,33 @@
+import time
+
+from src import jobs
+
+
+def run(monkeypatch, handler):
+    updates = []
+    monkeypatch.setattr(jobs, 'HEARTBEAT_SECONDS', 0.01)
+    monkeypatch.setattr(jobs, '_update_job', lambda job_id, finished=False, **fields: updates.append(
+        (job_id, finished, fields)))
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'test_job', handler)
+    jobs.run_job({'id': 5, 'kind': 'test_job', 'payload': None})
+    return updates
+
+
+def test_heartbeat_while_a_silent_handler_runs(monkeypatch):
+    updates = run(monkeypatch, lambda payload, report_progress: time.sleep(0.1) or {'success': True})
+
+    heartbeats = [update for update in updates if update == (5, False, {})]
+    assert len(heartbeats) >= 2
+    # El latido se detiene antes de registrar el resultado
+    assert updates[-1][1] and updates[-1][2]['status'] == 'done'
+
+
+def test_failed_handler_stops_the_heartbeat(monkeypatch):
+    def fail(payload, report_progress):
+        raise RuntimeError('boom')
+
+    updates = run(monkeypatch, fail)
+    assert updates[-1] == (5, True, {'status': 'failed', 'message': 'boom'})
+    count = len(updates)
+    time.sleep(0.05)
+    assert len(updates) == count
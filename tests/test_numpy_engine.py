@@ -0,0 +1,95 @@
+"""
+El motor NumPy (BENCHMARK_BACKEND=numpy) debe dar lo mismo que la agregación
+en PostgreSQL. Sin base de datos, la consulta de benchmark_engine se reproduce
+en Python sobre las puntuaciones por dimensión que el guardado escribe en
+diagnostics (scoring), y su resultado pasa por el mismo rows_to_dimension_stats.
+"""
+import json
+import random
+from collections import Counter, defaultdict
+
+import pytest
+
+from src.benchmark_engine import rows_to_dimension_stats
+from src.benchmark_histograms import OVERALL, score_bucket
+from src.benchmark_numpy import ResponseMatrix
+from src.question_catalog import DIMENSION_COLUMNS, DIMENSION_MAPPING, QUESTION_IDS
+from src.response_codec import pack_responses
+from src.scoring import score_batch
+
+DIMENSION_IDS = {name: dim_id for dim_id, name in DIMENSION_MAPPING.items()}
+
+
+def generate_documents(count, seed=7):
+    rng = random.Random(seed)
+    documents = []
+    for _ in range(count):
+        answered = QUESTION_IDS if rng.random() < 0.7 else rng.sample(QUESTION_IDS, rng.randint(1, 20))
+        documents.append({question_id: rng.randint(1, 5) for question_id in answered})
+    return documents
+
+
+def sql_dimension_stats(documents):
+    """Lo que devuelve dimension_stats_sql() sobre las columnas por dimensión guardadas"""
+    per_dimension = defaultdict(list)
+    diagnostics = set()
+    for diagnostic_id, scored in enumerate(score_batch(documents)):
+        for name in DIMENSION_COLUMNS:
+            score = scored.dimension_scores.get(name)
+            if score is not None:
+                per_dimension[DIMENSION_IDS[name]].append(score)
+                diagnostics.add(diagnostic_id)
+    rows = [
+        (dim_id, len(scores), sum(scores) / len(scores), min(scores), max(scores),
+         sum(scores), sum(score * score for score in scores), len(diagnostics))
+        for dim_id, scores in sorted(per_dimension.items())
+    ]
+    return rows_to_dimension_stats(rows)
+
+
+def matrix_rows(documents):
+    """Filas de ResponseMatrix.load: la mitad con bytes, la mitad con JSON"""
+    rows = []
+    for diagnostic_id, (document, scored) in enumerate(zip(documents, score_batch(documents))):
+        stored = pack_responses(document) if diagnostic_id % 2 else json.dumps(document)
+        rows.append((diagnostic_id, stored, scored.score, None, None))
+    return rows
+
+
+@pytest.fixture(scope='module')
+def documents():
+    return generate_documents(500)
+
+
+def test_dimension_stats_match_sql(documents):
+    expected = sql_dimension_stats(documents)
+    actual = ResponseMatrix.from_rows(matrix_rows(documents)).dimension_stats()
+
+    assert actual['total_diagnostics'] == expected['total_diagnostics']
+    assert set(actual['dimensions']) == set(expected['dimensions'])
+    for name, stats in expected['dimensions'].items():
+        assert actual['dimensions'][name]['count'] == stats['count']
+        for key in ('average', 'minimum', 'maximum', 'sum', 'sum_squares'):
+            assert actual['dimensions'][name][key] == pytest.approx(stats[key], rel=1e-6), (name, key)
+
+
+def test_histogram_rows_match_score_bucket(documents):
+    expected = Counter()
+    for scored in score_batch(documents):
+        for name, score in scored.dimension_scores.items():
+            expected[(name, score_bucket(score))] += 1
+        expected[(OVERALL, score_bucket(scored.score))] += 1
+
+    rows = ResponseMatrix.from_rows(matrix_rows(documents)).histogram_rows()
+    assert {(name, bucket): count for name, bucket, count in rows} == dict(expected)
+
+
+def test_packed_and_json_rows_load_identically():
+    document = {'1.1.1': 4, '2.2.2': 1, '6.1.1': 5}
+    matrix = ResponseMatrix.from_rows([
+        (1, pack_responses(document), None, None, None),
+        (2, json.dumps(document), None, None, None),
+        (3, document, None, None, None),
+    ])
+    assert (matrix.values[0] == matrix.values[1]).sum() == 3
+    assert matrix.dimension_stats()['dimensions']['estrategia_cx']['count'] == 3
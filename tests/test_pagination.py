@@ -0,0 +1,72 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from src.pagination import (
+    PAGE_SIZE, PAGE_SIZE_MAX, InvalidCursor, decode_cursor, encode_cursor, page_of, page_size
+)
+
+
+def test_page_size_bounds():
+    assert page_size(None) == PAGE_SIZE
+    assert page_size(0) == 1
+    assert page_size(-5) == 1
+    assert page_size(10) == 10
+    assert page_size(PAGE_SIZE_MAX + 1) == PAGE_SIZE_MAX
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 3, 1, 12, 30, 5, 123456)
+    token = encode_cursor('users', created_at, 42)
+    assert '=' not in token
+    assert decode_cursor('users', token) == (created_at, 42)
+
+
+def test_cursor_without_sort_value():
+    token = encode_cursor('diagnostics', None, 7)
+    assert decode_cursor('diagnostics', token) == (None, 7)
+
+
+def test_no_cursor():
+    assert decode_cursor('users', None) is None
+    assert decode_cursor('users', '') is None
+
+
+def test_cursor_of_another_listing_is_rejected():
+    token = encode_cursor('users', datetime(2024, 1, 1), 1)
+    with pytest.raises(InvalidCursor):
+        decode_cursor('diagnostics', token)
+
+
+@pytest.mark.parametrize('token', ['not-base64!', 'e30', 'WyJ1c2VycyIsIm5vdC1hLWRhdGUiLDFd'])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor('users', token)
+
+
+def test_cursor_with_non_integer_id_is_rejected():
+    payload = json.dumps(['users', '2024-01-01T00:00:00', '1']).encode('utf-8')
+    token = base64.urlsafe_b64encode(payload).decode('ascii')
+    with pytest.raises(InvalidCursor):
+        decode_cursor('users', token)
+
+
+def test_page_of_last_page():
+    rows = [{'id': 3}, {'id': 2}]
+    assert page_of(rows, 2, 'diagnostics') == (rows, None)
+
+
+def test_page_of_cuts_the_extra_row():
+    rows = [{'id': i, 'created_at': datetime(2024, 1, i)} for i in (5, 4, 3)]
+    page, token = page_of(rows, 2, 'users', 'created_at')
+    assert [row['id'] for row in page] == [5, 4]
+    assert decode_cursor('users', token) == (datetime(2024, 1, 4), 4)
+
+
+def test_page_of_by_id():
+    rows = [{'id': i} for i in (9, 8, 7)]
+    page, token = page_of(rows, 2, 'diagnostics')
+    assert len(page) == 2
+    assert decode_cursor('diagnostics', token) == (None, 8)
@@ -0,0 +1,92 @@
+import csv
+import io
+
+import pytest
+
+from src.provisioning import ProvisioningError, credentials_csv, parse_clients_csv
+
+
+def errors_of(text):
+    with pytest.raises(ProvisioningError) as excinfo:
+        parse_clients_csv(text)
+    return excinfo.value.errors
+
+
+def test_english_headers():
+    clients = parse_clients_csv(
+        'company_name,contact_person,email\n'
+        'Acme,Ana Pérez,ana@acme.cl\n'
+        'Beta,,\n'
+    )
+    assert clients == [
+        {'company_name': 'Acme', 'contact_person': 'Ana Pérez', 'email': 'ana@acme.cl'},
+        {'company_name': 'Beta'},
+    ]
+
+
+def test_spanish_headers_semicolon_and_bom():
+    clients = parse_clients_csv('\ufeffEmpresa;Teléfono;Tamaño;Notas\nCompañía Uno;+56 9 1234;pyme;x\n')
+    assert clients == [
+        {'company_name': 'Compañía Uno', 'phone': '+56 9 1234', 'company_size': 'pyme', 'notes': 'x'}
+    ]
+
+
+def test_unknown_columns_and_blank_rows_are_ignored():
+    clients = parse_clients_csv('empresa,color\nAcme,rojo\n,\n\nBeta,azul\n')
+    assert clients == [{'company_name': 'Acme'}, {'company_name': 'Beta'}]
+
+
+def test_empty_csv():
+    assert errors_of('') == [{'line': 1, 'message': 'El CSV está vacío'}]
+
+
+def test_missing_company_column():
+    assert errors_of('email\na@b.cl\n') == [{'line': 1, 'message': 'Falta la columna company_name'}]
+
+
+def test_no_companies():
+    assert errors_of('company_name\n') == [{'line': 1, 'message': 'El CSV no tiene ninguna empresa'}]
+
+
+def test_rows_without_company_report_their_line():
+    errors = errors_of('company_name,email\nAcme,a@acme.cl\n,b@beta.cl\nGamma,\n,c@c.cl\n')
+    assert [error['line'] for error in errors] == [3, 5]
+
+
+def test_fields_longer_than_their_column_report_their_line():
+    errors = errors_of(
+        'company_name,email,phone,notes\n'
+        f'Acme,a@acme.cl,{"1" * 50},{"x" * 5000}\n'
+        f'{"B" * 201},b@beta.cl,,\n'
+        f'Gamma,{"g" * 201}@gamma.cl,{"9" * 51},\n'
+    )
+    assert errors == [
+        {'line': 3, 'message': 'company_name supera los 200 caracteres'},
+        {'line': 4, 'message': 'email supera los 200 caracteres'},
+        {'line': 4, 'message': 'phone supera los 50 caracteres'},
+    ]
+
+
+@pytest.mark.parametrize('header, field', [
+    ('company_name,email,Email', 'email'),
+    ('empresa,company_name', 'company_name'),
+    ('empresa,telefono,teléfono', 'phone'),
+])
+def test_duplicate_mapped_headers_are_rejected(header, field):
+    assert errors_of(f'{header}\nAcme,x,y\n') == [{'line': 1, 'message': f'Columna repetida: {field}'}]
+
+
+def test_too_many_companies(monkeypatch):
+    monkeypatch.setattr('src.provisioning.PROVISION_MAX', 2)
+    errors = errors_of('company_name\nA\nB\nC\n')
+    assert errors == [{'line': 1, 'message': 'Como máximo 2 empresas por CSV'}]
+
+
+def test_credentials_csv_neutralizes_formulas():
+    sheet = credentials_csv([{
+        'username': 'acme', 'password': 'cx123', 'company_name': '=HYPERLINK("http://x")',
+        'contact_person': '@Ana', 'email': None, 'phone': '+56 9 1234', 'user_id': 7
+    }])
+    rows = list(csv.reader(io.StringIO(sheet)))
+    assert rows[0] == ['username', 'password', 'company_name', 'contact_person', 'email', 'phone']
+    assert rows[1] == ['acme', 'cx123', '\'=HYPERLINK("http://x")', "'@Ana", '', "'+56 9 1234"]
@@ -0,0 +1,90 @@
+import pytest
+
+from src import database_pg, rescoring
+from src.response_codec import pack_responses
+from src.scoring import score_responses
+
+DOCUMENTS = [{'1.1.1': 1 + i % 5, '2.1.1': 1 + (i * 3) % 5, '6.1.3': 1 + (i * 7) % 5} for i in range(7)]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+
+    def execute(self, sql, params=None):
+        self.conn.log.append(' '.join(sql.split())[:40])
+        if 'FROM rescore_checkpoints' in sql:
+            self.row = (1, 0, 0, 0)
+        elif 'SELECT COUNT(*)' in sql:
+            self.row = (len(self.conn.rows),)
+
+    def fetchone(self):
+        return self.row
+
+    def fetchmany(self, size):
+        rows, self.conn.rows = self.conn.rows[:size], self.conn.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append('commit')
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def run(monkeypatch):
+    def run(workers):
+        log = []
+        rows = [(i + 1, 3, memoryview(pack_responses(document)), None) for i, document in enumerate(DOCUMENTS)]
+        monkeypatch.setattr(rescoring, 'get_connection', lambda: FakeConnection(rows, log))
+        written = []
+
+        def write_chunk(cursor, checkpoint_id, values):
+            written.extend(values)
+            log.append('write')
+            return len(values)
+
+        monkeypatch.setattr(rescoring, '_write_chunk', write_chunk)
+        monkeypatch.setattr(database_pg, 'rebuild_benchmark_with_cursor', lambda cursor: log.append('rebuild'))
+        result = rescoring.rescore_diagnostics(chunk_size=2, workers=workers)
+        return result, written, log
+    return run
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_rescore_scores_every_row_in_order(run, workers):
+    result, written, _ = run(workers)
+
+    assert result['success'] and result['rescored'] == len(DOCUMENTS)
+    assert [value[0] for value in written] == list(range(1, len(DOCUMENTS) + 1))
+    for value, document in zip(written, DOCUMENTS):
+        assert value[2] == pytest.approx(score_responses(document).score)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_last_chunk_commits_with_the_benchmark_rebuild(run, workers):
+    _, _, log = run(workers)
+
+    steps = [step for step in log if step in ('write', 'commit', 'rebuild')]
+    # Bloques de 2, 2, 2 y 1: los tres primeros se confirman solos y el
+    # último con la reconstrucción del benchmark
+    assert steps[-3:] == ['write', 'rebuild', 'commit']
+    assert steps.count('write') == 4
+    assert steps.count('commit') == 5
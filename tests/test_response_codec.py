@@ -0,0 +1,79 @@
+import pytest
+
+from src.question_catalog import CATALOG, QUESTION_IDS
+from src.response_codec import (
+    PACKED_SIZE, decode_responses, encode_responses, pack_responses, packed_scores,
+    responses_json_sql, set_bytes_sql, stored_responses
+)
+from src.scoring import score_responses
+
+
+def test_pack_decode_round_trip():
+    responses = {question_id: position % 5 + 1 for position, question_id in enumerate(QUESTION_IDS)}
+    packed = pack_responses(responses)
+    assert len(packed) == PACKED_SIZE == len(CATALOG)
+    assert decode_responses(packed) == responses
+
+
+def test_unanswered_questions_are_zero_bytes():
+    packed = pack_responses({'1.1.2': 4})
+    assert packed[CATALOG.question_index['1.1.2']] == 4
+    assert packed.count(0) == PACKED_SIZE - 1
+    assert decode_responses(packed) == {'1.1.2': 4}
+
+
+@pytest.mark.parametrize('responses', [
+    {'9.9.9': 3},
+    {'1.1.1': 0},
+    {'1.1.1': 256},
+    {'1.1.1': True},
+    {'1.1.1': 3.0},
+    {'1.1.1': '3'},
+])
+def test_pack_rejects_what_does_not_fit(responses):
+    assert pack_responses(responses) is None
+
+
+def test_pack_rejects_non_dict():
+    assert pack_responses(None) is None
+    assert pack_responses([1, 2]) is None
+
+
+def test_encode_reports_skipped_keys():
+    packed, skipped = encode_responses({'1.1.1': 2, 'extra': 3, '1.1.2': 999})
+    assert sorted(skipped) == ['1.1.2', 'extra']
+    assert decode_responses(packed) == {'1.1.1': 2}
+
+
+def test_packed_scores_match_score_responses():
+    responses = {'1.1.1': 5, '1.1.2': 2, '2.1.1': 3, '6.1.1': 1}
+    score, averages, answered = packed_scores(pack_responses(responses))
+    scored = score_responses(responses)
+    assert answered == scored.answered_count == 4
+    assert score == pytest.approx(scored.score)
+    assert averages == pytest.approx(scored.dimension_scores)
+
+
+def test_packed_scores_empty():
+    assert packed_scores(bytes(PACKED_SIZE)) == (None, {}, 0)
+
+
+def test_set_bytes_sql():
+    sql = set_bytes_sql('responses_packed', {'1.1.1': 4, '1.1.2': 5})
+    assert sql == 'set_byte(set_byte(responses_packed, 0, 4), 1, 5)'
+    assert set_bytes_sql('responses_packed', {'1.1.1': 4, 'extra': 1}) is None
+    assert set_bytes_sql('responses_packed', {'1.1.1': 0}) is None
+
+
+def test_stored_responses_prefers_packed_bytes():
+    packed = pack_responses({'1.1.1': 3})
+    assert stored_responses(packed, None, CATALOG.version) == {'1.1.1': 3}
+    assert stored_responses(memoryview(packed), None, CATALOG.version) == {'1.1.1': 3}
+    assert stored_responses(None, {'extra': 7}, CATALOG.version) == {'extra': 7}
+
+
+def test_responses_json_sql_has_no_braces():
+    # Se inserta en sentencias que luego pasan por str.format()
+    sql = responses_json_sql('saved')
+    assert '{' not in sql and '}' not in sql
+    assert 'saved.responses_packed' in sql and 'saved.catalog_version' in sql
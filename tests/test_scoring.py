@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from src.response_codec import pack_responses
+from src.scoring import (
+    EMPTY_SCORE, LOWEST_LEVEL, coerce_responses, maturity_level, score_batch, score_responses
+)
+
+
+def test_coerce_responses_accepts_integral_values():
+    assert coerce_responses({'1.1.1': 4, '1.1.2': '3', '1.1.3': 2.0, 5: 1}) == {
+        '1.1.1': 4, '1.1.2': 3, '1.1.3': 2, '5': 1
+    }
+
+
+@pytest.mark.parametrize('value', [True, 3.5, 'a', None, [1]])
+def test_coerce_responses_rejects_non_integers(value):
+    with pytest.raises(ValueError):
+        coerce_responses({'1.1.1': value})
+
+
+@pytest.mark.parametrize('value', [0, -1, 6, 999, '0', 6.0])
+def test_coerce_responses_rejects_answers_outside_the_scale(value):
+    with pytest.raises(ValueError):
+        coerce_responses({'1.1.1': value})
+
+
+def test_coerce_responses_rejects_non_dict():
+    with pytest.raises(ValueError):
+        coerce_responses([1, 2, 3])
+
+
+@pytest.mark.parametrize('score, level', [
+    (5.0, 'optimizado'),
+    (4.5, 'optimizado'),
+    (4.49, 'avanzado'),
+    (3.5, 'avanzado'),
+    (2.5, 'intermedio'),
+    (1.5, 'basico'),
+    (1.49, LOWEST_LEVEL),
+])
+def test_maturity_level_thresholds(score, level):
+    assert maturity_level(score) == level
+
+
+def test_score_responses():
+    scored = score_responses({'1.1.1': 4, '1.1.2': 2, '2.1.1': 3})
+    assert scored.score == pytest.approx(3.0)
+    assert scored.level == 'intermedio'
+    assert scored.answered_count == 3
+    assert scored.dimension_scores == {'estrategia_cx': 3.0, 'arquitectura_cx': 3.0}
+
+
+def test_score_responses_keys_outside_the_catalog():
+    # Cuentan en la media general; la dimensión sale del prefijo de la clave
+    scored = score_responses({'1.9.9': 5, 'notes': 1})
+    assert scored.answered_count == 2
+    assert scored.dimension_scores == {'estrategia_cx': 5.0}
+
+
+@pytest.mark.parametrize('responses', [None, {}, [], '{}'])
+def test_score_responses_empty(responses):
+    assert score_responses(responses) == EMPTY_SCORE
+
+
+def test_score_batch_accepts_every_stored_format():
+    responses = {'1.1.1': 5, '3.2.1': 2, '6.1.3': 4}
+    packed = pack_responses(responses)
+    expected = score_responses(responses)
+    for scored in score_batch([responses, json.dumps(responses), packed, memoryview(packed)]):
+        assert scored.score == pytest.approx(expected.score)
+        assert scored.level == expected.level
+        assert scored.answered_count == expected.answered_count
+        assert scored.dimension_scores == pytest.approx(expected.dimension_scores)
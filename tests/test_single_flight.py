@@ -0,0 +1,123 @@
+from datetime import datetime
+
+import psycopg2.errors
+import pytest
+
+from src import single_flight as sf
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+
+    def execute(self, sql, params=None):
+        self.conn.queries.append(' '.join(sql.split()))
+        self.row = None
+        if 'pg_try_advisory_lock' in sql:
+            self.row = (self.conn.free, datetime(2024, 1, 1))
+        elif 'SELECT pg_advisory_lock' in sql and self.conn.lock_timeout:
+            raise psycopg2.errors.LockNotAvailable()
+        elif 'SELECT result FROM single_flight_results' in sql:
+            self.row = self.conn.shared_result
+        elif 'INSERT INTO single_flight_results' in sql:
+            self.conn.stored = params[1].adapted
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Conexión que simula el advisory lock: libre, ocupado o sin liberarse a tiempo"""
+
+    def __init__(self, free=True, shared_result=None, lock_timeout=False):
+        self.free = free
+        self.shared_result = shared_result
+        self.lock_timeout = lock_timeout
+        self.queries = []
+        self.stored = None
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    def install(**kwargs):
+        conn = FakeConnection(**kwargs)
+        monkeypatch.setattr(sf, 'get_connection', lambda: conn)
+        return conn
+    return install
+
+
+def test_lock_key_is_a_stable_signed_int4():
+    assert sf._lock_key('benchmark_rebuild') == sf._lock_key('benchmark_rebuild')
+    assert sf._lock_key('benchmark_rebuild') != sf._lock_key('diagnostic_backfill')
+    for name in ('benchmark_rebuild', 'diagnostic_backfill', 'x' * 100):
+        lock_class, objid = sf._lock_key(name)
+        assert lock_class == sf.SINGLE_FLIGHT_LOCK_CLASS
+        assert -2 ** 31 <= objid < 2 ** 31
+
+
+def test_winner_runs_and_stores_the_result(connect):
+    conn = connect(free=True)
+    calls = []
+    result = sf.single_flight('test_winner', lambda: calls.append(1) or {'ok': True})
+
+    assert result == {'ok': True}
+    assert calls == [1]
+    assert conn.stored == {'ok': True}
+    assert any('pg_advisory_unlock' in query for query in conn.queries)
+    assert conn.closed
+    stats = sf.get_single_flight_stats()['test_winner']
+    assert stats['calls'] == 1 and stats['executions'] == 1
+
+
+def test_waiter_reuses_the_winners_result(connect):
+    conn = connect(free=False, shared_result=({'total': 3},))
+    result = sf.single_flight('test_waiter', lambda: pytest.fail('func() no debería ejecutarse'))
+
+    assert result == {'total': 3}
+    assert conn.stored is None
+    stats = sf.get_single_flight_stats()['test_waiter']
+    assert stats['contended'] == 1 and stats['shared_results'] == 1 and stats['executions'] == 0
+
+
+def test_waiter_runs_when_the_winner_left_no_result(connect):
+    conn = connect(free=False, shared_result=None)
+    assert sf.single_flight('test_failed_winner', lambda: 'mine') == 'mine'
+    assert conn.stored == 'mine'
+
+
+def test_timeout_waiting_for_the_winner(connect):
+    conn = connect(free=False, lock_timeout=True)
+    with pytest.raises(sf.SingleFlightTimeout):
+        sf.single_flight('test_timeout', lambda: pytest.fail('func() no debería ejecutarse'), timeout=1)
+
+    assert not any('pg_advisory_unlock' in query for query in conn.queries)
+    assert sf.get_single_flight_stats()['test_timeout']['timeouts'] == 1
+
+
+def test_errors_propagate_and_release_the_lock(connect):
+    conn = connect(free=True)
+
+    def fail():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        sf.single_flight('test_error', fail)
+    assert any('pg_advisory_unlock' in query for query in conn.queries)
+    assert sf.get_single_flight_stats()['test_error']['errors'] == 1